@@ -0,0 +1,166 @@
+"""Asyncio request engine running many partitions cooperatively in one event loop.
+
+Streams keep building `requests.PreparedRequest` objects with `prepare_request`
+and parsing `requests.Response` objects with `parse_response`; the engine only
+replaces the transport, sending requests through a pooled aiohttp session and
+converting the replies back to `requests.Response`. Partitions are coroutines
+pushing records to an asyncio queue, drained by a plain generator so the SDK's
+synchronous sync loop stays unchanged.
+"""
+
+import asyncio
+from datetime import timedelta
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Iterator, List, Optional
+
+import aiohttp
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from tap_shopify_beta.record_queue import estimate_record_size
+
+# connections kept open to the shop, shared by every partition of the engine
+DEFAULT_MAX_CONNECTIONS = 100
+# memory budget of the records emitted by producers and not consumed yet
+DEFAULT_QUEUE_BYTES = 256 * 1024 * 1024
+
+Producer = Callable[[Callable[[Any], Awaitable[None]]], Awaitable[None]]
+
+
+class _Finished:
+    """Marker put on the queue by a producer once it is done."""
+
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+
+class AsyncRequestEngine:
+    """Send prepared requests and run record producers on a private event loop."""
+
+    def __init__(
+        self,
+        max_connections: int = DEFAULT_MAX_CONNECTIONS,
+        timeout: Optional[float] = None,
+        max_bytes: int = DEFAULT_QUEUE_BYTES,
+        size_of: Callable[[Any], int] = estimate_record_size,
+    ):
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self.queued_bytes = 0
+        self.peak_bytes = 0
+        self._room: Optional[asyncio.Event] = None
+        self._loop = asyncio.new_event_loop()
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        # the session has to be created inside the running loop
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections, ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self._session
+
+    async def send(self, prepared_request: requests.PreparedRequest) -> requests.Response:
+        """Send a prepared request and return its reply as a `requests.Response`.
+
+        Transport errors are raised as `requests.exceptions.ConnectionError` so the
+        streams' existing backoff settings apply to both engines.
+        """
+        session = await self._get_session()
+        started = perf_counter()
+        try:
+            async with session.request(
+                prepared_request.method,
+                prepared_request.url,
+                data=prepared_request.body,
+                headers=dict(prepared_request.headers),
+            ) as reply:
+                content = await reply.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            raise requests.exceptions.ConnectionError(e, request=prepared_request)
+
+        response = requests.Response()
+        response.status_code = reply.status
+        response.reason = reply.reason
+        response.headers = CaseInsensitiveDict(reply.headers)
+        response.url = str(reply.url)
+        response._content = content
+        response.request = prepared_request
+        response.elapsed = timedelta(seconds=perf_counter() - started)
+        return response
+
+    async def run_in_thread(self, func: Callable, *args) -> Any:
+        """Run blocking work, e.g. parsing with overflow requests, off the event loop."""
+        return await asyncio.get_event_loop().run_in_executor(None, func, *args)
+
+    def iter_records(self, producers: List[Producer]) -> Iterator[Any]:
+        """Run all producers concurrently and yield the records they emit.
+
+        Each producer is a coroutine function receiving an async `emit` callback.
+        The loop only runs while the caller asks for the next record, so a slow
+        consumer holds every producer back once the records waiting for it
+        exceed `max_bytes`. The first producer error cancels the others and is
+        raised to the caller.
+        """
+        if not producers:
+            return
+        queue, tasks = self._loop.run_until_complete(self._start(producers))
+        finished = 0
+        try:
+            while finished < len(producers):
+                item = self._loop.run_until_complete(self._get(queue))
+                if isinstance(item, _Finished):
+                    if item.error is not None:
+                        raise item.error
+                    finished += 1
+                else:
+                    yield item
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._loop.run_until_complete(
+                asyncio.gather(*tasks, return_exceptions=True)
+            )
+
+    async def _get(self, queue: asyncio.Queue) -> Any:
+        item, size = await queue.get()
+        self.queued_bytes -= size
+        self._room.set()
+        return item
+
+    async def _start(self, producers: List[Producer]):
+        queue = asyncio.Queue()
+        self._room = asyncio.Event()
+
+        async def emit(record: Any) -> None:
+            size = self.size_of(record)
+            # an empty queue always takes a record, however big
+            while self.queued_bytes and self.queued_bytes + size > self.max_bytes:
+                self._room.clear()
+                await self._room.wait()
+            self.queued_bytes += size
+            self.peak_bytes = max(self.peak_bytes, self.queued_bytes)
+            await queue.put((record, size))
+
+        async def run(producer: Producer) -> None:
+            try:
+                await producer(emit)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await queue.put((_Finished(e), 0))
+            else:
+                await queue.put((_Finished(), 0))
+
+        tasks = [self._loop.create_task(run(producer)) for producer in producers]
+        return queue, tasks
+
+    def close(self) -> None:
+        """Close the HTTP session and the event loop."""
+        if self._session is not None:
+            self._loop.run_until_complete(self._session.close())
+            self._session = None
+        self._loop.close()
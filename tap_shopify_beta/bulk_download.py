@@ -0,0 +1,114 @@
+"""Download of bulk operation results to a local spool file.
+
+A bulk result can weigh several GB. Downloading it to disk before parsing
+it means a dropped connection only costs a Range request resuming where the
+file stopped instead of the whole operation, and the download never waits
+for the targets consuming the records.
+"""
+
+import base64
+import hashlib
+import logging
+import mmap
+import os
+from time import sleep
+from typing import Iterator, Optional
+
+import requests
+
+# bytes written to the spool file at once
+CHUNK_SIZE = 1024 * 1024
+# seconds to connect to the storage and between two chunks of the result
+DOWNLOAD_TIMEOUT = (30, 300)
+# consecutive attempts that did not download a single byte before giving up
+MAX_STALLED_ATTEMPTS = 5
+
+RETRIABLE_ERRORS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.ChunkedEncodingError,
+    requests.exceptions.Timeout,
+)
+
+
+class IncompleteDownload(requests.RequestException, ValueError):
+    """Downloaded bulk result does not match the size or checksum of the file."""
+
+
+def get_md5(headers: dict) -> Optional[str]:
+    """Return the base64 MD5 of the whole object from a cloud storage `x-goog-hash` header."""
+    for value in (headers.get("x-goog-hash") or "").split(","):
+        name, _, digest = value.strip().partition("=")
+        if name == "md5":
+            return digest
+    return None
+
+
+def file_md5(path: str) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return base64.b64encode(digest.digest()).decode("ascii")
+
+
+def download_to_spool(
+    url: str,
+    path: str,
+    expected_size: Optional[int] = None,
+    session: Optional[requests.Session] = None,
+    logger: logging.Logger = logging.getLogger(__name__),
+) -> int:
+    """Download ``url`` to ``path``, resuming with Range requests after connection errors.
+
+    The file is checked against ``expected_size`` and against the MD5 sent by the
+    storage, when there is one. Returns the size of the file.
+    """
+    session = session or requests.Session()
+    md5 = None
+    stalled = 0
+    while True:
+        downloaded = os.path.getsize(path) if os.path.exists(path) else 0
+        if expected_size is not None and downloaded >= expected_size:
+            break
+        headers = {"Range": f"bytes={downloaded}-"} if downloaded else {}
+        try:
+            with session.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+                if response.status_code == 416:
+                    # nothing left past what is already on disk
+                    break
+                response.raise_for_status()
+                md5 = get_md5(response.headers) or md5
+                # a server ignoring the range sends the whole file again
+                mode = "ab" if response.status_code == 206 else "wb"
+                with open(path, mode) as f:
+                    for chunk in response.iter_content(CHUNK_SIZE):
+                        f.write(chunk)
+            break
+        except RETRIABLE_ERRORS as e:
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            stalled = 0 if size > downloaded else stalled + 1
+            if stalled >= MAX_STALLED_ATTEMPTS:
+                raise
+            logger.warning(f"Bulk result download interrupted after {size} bytes ({e}), resuming")
+            sleep(min(2 ** stalled, 60))
+
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    if expected_size is not None and size != expected_size:
+        raise IncompleteDownload(f"Downloaded {size} bytes of a {expected_size} bytes bulk result")
+    if md5 and file_md5(path) != md5:
+        raise IncompleteDownload(f"Checksum of the downloaded bulk result does not match {md5}")
+    return size
+
+
+def iter_spooled_lines(path: str, use_mmap: bool = False) -> Iterator[bytes]:
+    """Yield the non-empty lines of a spooled JSONL file, read through a memory map if asked."""
+    with open(path, "rb") as f:
+        if use_mmap and os.path.getsize(path):
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                for line in iter(mapped.readline, b""):
+                    if line.strip():
+                        yield line
+            return
+        for line in f:
+            if line.strip():
+                yield line
@@ -0,0 +1,109 @@
+"""Process-wide limit of the bulk query operations running at once for a shop.
+
+Bulk operations are tracked by their own id, so streams synced in parallel
+can each have one in flight. Shopify caps how many bulk queries run at once
+for an app and shop, so streams take a slot before starting an operation and
+give it back as soon as Shopify completes it, while they download the result.
+Operations are polled on a `PollSchedule` adapting to how long they run.
+"""
+
+import threading
+from typing import Dict, Optional, Tuple
+
+# bulk query operations Shopify runs at once for an app and shop on the tap's API version
+DEFAULT_MAX_OPERATIONS = 1
+# shortest and longest delays between two status polls of an operation, in seconds
+MIN_POLL_INTERVAL = 1.0
+MAX_POLL_INTERVAL = 30.0
+# share of the time an operation has been running waited before polling it again
+POLL_BACKOFF = 0.2
+
+
+class BulkOperationSlots:
+    """Thread-safe counter of the bulk operations running for a shop."""
+
+    def __init__(self, max_operations: int = DEFAULT_MAX_OPERATIONS):
+        self.max_operations = max_operations
+        self.running = 0
+        self._condition = threading.Condition()
+
+    def resize(self, max_operations: int) -> None:
+        """Change how many operations may run at once, waking up waiting streams."""
+        with self._condition:
+            self.max_operations = max(max_operations, 1)
+            self._condition.notify_all()
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a free slot, returning False if none freed up within ``timeout`` seconds."""
+        with self._condition:
+            if not self._condition.wait_for(
+                lambda: self.running < self.max_operations, timeout
+            ):
+                return False
+            self.running += 1
+            return True
+
+    def release(self) -> None:
+        with self._condition:
+            self.running -= 1
+            self._condition.notify()
+
+    def __enter__(self) -> "BulkOperationSlots":
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.release()
+
+
+_slots: Dict[str, BulkOperationSlots] = {}
+_registry_lock = threading.Lock()
+
+
+def get_bulk_operation_slots(shop: str) -> BulkOperationSlots:
+    """Return the bulk operation slots shared by every stream of ``shop``."""
+    with _registry_lock:
+        if shop not in _slots:
+            _slots[shop] = BulkOperationSlots()
+        return _slots[shop]
+
+
+class PollSchedule:
+    """Delays between the status polls of a bulk operation.
+
+    Short operations are polled every second and long ones less and less
+    often, up to ``max_interval``. Once the object count grows, its growth
+    rate predicts when an operation expecting about ``expected_objects``
+    objects completes, and a count that stops growing means the result file
+    is being written, both bring the next poll forward.
+    """
+
+    def __init__(
+        self,
+        expected_objects: Optional[int] = None,
+        min_interval: float = MIN_POLL_INTERVAL,
+        max_interval: float = MAX_POLL_INTERVAL,
+    ):
+        self.expected_objects = expected_objects
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.polls = 0
+        self._rate = 0.0
+        self._last: Optional[Tuple[float, int]] = None
+
+    def next_delay(self, elapsed: float, object_count: int) -> float:
+        """Return how long to wait after a poll made ``elapsed`` seconds into the operation."""
+        self.polls += 1
+        delay = max(elapsed * POLL_BACKOFF, self.min_interval)
+        if self._last is not None and elapsed > self._last[0]:
+            last_elapsed, last_count = self._last
+            rate = (object_count - last_count) / (elapsed - last_elapsed)
+            if rate <= 0 < self._rate:
+                # objects stopped coming in, the result file is being written
+                delay = min(delay, self.min_interval * 2)
+            elif rate > 0 and self.expected_objects and object_count < self.expected_objects:
+                predicted = (self.expected_objects - object_count) / rate
+                delay = min(delay, max(predicted, self.min_interval))
+            self._rate = rate
+        self._last = (elapsed, object_count)
+        return min(delay, self.max_interval)
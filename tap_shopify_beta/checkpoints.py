@@ -0,0 +1,124 @@
+"""Progress of concurrent partitions, saved in the stream state to resume a sync.
+
+Records of concurrent partitions come out interleaved, so the replication key
+bookmark can only move once the whole sync is done. Each partition's range,
+last cursor and last replication value are saved in the stream state instead,
+so an interrupted sync resumes every partition where it stopped rather than
+from the start of the window.
+
+Workers report progress with a `PartitionProgress` marker queued right after
+the records of a page, so a checkpoint is only saved once the sync loop wrote
+every record before it. Splits change ranges, not progress, and are recorded
+right away: the saved ranges always cover every record not written yet.
+"""
+
+import threading
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional
+
+
+class PartitionProgress(NamedTuple):
+    """Marker queued by a worker once the records of a page are queued."""
+
+    partition_id: str
+    cursor: Optional[str]
+    replication_value: Optional[str]
+    finished: bool = False
+
+
+class PartitionCheckpoints:
+    """Thread-safe ranges and progress of the partitions of a concurrent sync.
+
+    ``bookmark`` is the starting timestamp the window was planned from, saved
+    checkpoints only apply to a sync starting from the same one.
+    """
+
+    def __init__(self, bookmark: datetime, window_end: datetime):
+        self.bookmark = bookmark
+        self.window_end = window_end
+        self._partitions: Dict[str, dict] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._partitions)
+
+    def _register(self, context: dict) -> None:
+        partition_id = str(self._next_id)
+        self._next_id += 1
+        context["partition_id"] = partition_id
+        self._partitions[partition_id] = {
+            "start_date": context["date_range"]["start_date"],
+            "end_date": context["date_range"]["end_date"],
+            "cursor": None,
+            "replication_value": None,
+        }
+
+    def add(self, context: dict) -> None:
+        """Track a date range partition, tagging its context with a partition id."""
+        with self._lock:
+            self._register(context)
+
+    def split(self, context: dict, new_context: dict) -> None:
+        """Move the end of a partition to the start of the range split off it."""
+        with self._lock:
+            partition = self._partitions.get(context.get("partition_id"))
+            if partition is not None:
+                partition["end_date"] = new_context["date_range"]["start_date"]
+            new_context.pop("cursor", None)
+            self._register(new_context)
+
+    def advance(self, progress: PartitionProgress) -> None:
+        """Save the progress of a partition whose records up to it have been written."""
+        with self._lock:
+            if progress.finished:
+                self._partitions.pop(progress.partition_id, None)
+                return
+            partition = self._partitions.get(progress.partition_id)
+            if partition is None:
+                return
+            partition["cursor"] = progress.cursor
+            if progress.replication_value is not None:
+                partition["replication_value"] = progress.replication_value
+
+    def pending(self) -> List[dict]:
+        """Return the partitions not fully synced yet, with their progress."""
+        with self._lock:
+            return [
+                {"partition_id": partition_id, **partition}
+                for partition_id, partition in self._partitions.items()
+            ]
+
+    def to_dict(self) -> dict:
+        """Return the checkpoints in a JSON serializable form."""
+        with self._lock:
+            return {
+                "bookmark": self.bookmark.isoformat(),
+                "window_end": self.window_end.isoformat(),
+                "next_id": self._next_id,
+                "partitions": {
+                    partition_id: {
+                        **partition,
+                        "start_date": partition["start_date"].isoformat(),
+                        "end_date": partition["end_date"].isoformat(),
+                    }
+                    for partition_id, partition in self._partitions.items()
+                },
+            }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PartitionCheckpoints":
+        """Load checkpoints saved by `to_dict`."""
+        checkpoints = cls(
+            datetime.fromisoformat(data["bookmark"]),
+            datetime.fromisoformat(data["window_end"]),
+        )
+        checkpoints._next_id = data["next_id"]
+        for partition_id, partition in data["partitions"].items():
+            checkpoints._partitions[partition_id] = {
+                **partition,
+                "start_date": datetime.fromisoformat(partition["start_date"]),
+                "end_date": datetime.fromisoformat(partition["end_date"]),
+            }
+        return checkpoints
@@ -9,16 +9,26 @@ from hotglue_singer_sdk.authenticators import APIKeyAuthenticator
 from backports.cached_property import cached_property
 from hotglue_singer_sdk.streams import GraphQLStream
 from tap_shopify_beta.auth import ShopifyAuthenticator
+from tap_shopify_beta.cost_budget import GraphQLCostBudget, get_cost_budget
+from tap_shopify_beta.query_cost import estimate_node_cost, estimate_selection_cost, plan_alias_batch
+from tap_shopify_beta import telemetry
+from tap_shopify_beta.async_engine import AsyncRequestEngine
+from tap_shopify_beta.scheduler import SerializedSyncMixin
 from hotglue_singer_sdk.exceptions import RetriableAPIError
 import psutil
 import os
 import http.client
 import re
 
-class shopifyStream(GraphQLStream):
+class shopifyStream(SerializedSyncMixin, GraphQLStream):
     """shopify stream class."""
 
     query_name = None
+    api_version = "2024-07"
+    # points reserved for requests we can't estimate yet, refunded once Shopify reports the cost
+    default_request_cost = 50
+    # smallest page of a connection continued alongside others in one aliased query
+    overflow_min_page_size = 50
 
     def get_shop_name(self) -> str:
         """Return the shop name, configurable via tap settings."""
@@ -31,7 +41,130 @@ class shopifyStream(GraphQLStream):
     def url_base(self) -> str:
         """Return the API URL root, configurable via tap settings."""
         shop = self.get_shop_name()
-        return f"https://{shop}.myshopify.com/admin/api/2024-07/graphql.json"
+        return f"https://{shop}.myshopify.com/admin/api/{self.api_version}/graphql.json"
+
+    @property
+    def cost_budget(self) -> GraphQLCostBudget:
+        """Return the GraphQL cost budget shared by all streams of this shop."""
+        return get_cost_budget(self.get_shop_name())
+
+    def estimate_request_cost(self, prepared_request: requests.PreparedRequest) -> float:
+        """Return the points to reserve from the cost budget before sending a request."""
+        return getattr(prepared_request, "estimated_cost", None) or self.default_request_cost
+
+    def get_response_json(self, response: requests.Response) -> Any:
+        """Return the decoded body of a response, decoding it only once."""
+        return telemetry.decode_response_json(response)
+
+    def get_response_cost(self, response: Optional[requests.Response]) -> dict:
+        """Return `extensions.cost` from a GraphQL response, if any."""
+        if response is None:
+            return {}
+        try:
+            response_json = self.get_response_json(response)
+        except ValueError:
+            return {}
+        if not isinstance(response_json, dict):
+            return {}
+        return response_json.get("extensions", {}).get("cost") or {}
+
+    def get_throttle_status(self, response: Optional[requests.Response]) -> Optional[dict]:
+        """Return `extensions.cost.throttleStatus` from a GraphQL response, if any."""
+        return self.get_response_cost(response).get("throttleStatus")
+
+    def _request(
+        self, prepared_request: requests.PreparedRequest, context: Optional[dict]
+    ) -> requests.Response:
+        """Send a request once the shared cost budget has room for it."""
+        cost = self.estimate_request_cost(prepared_request)
+        budget_wait = self.cost_budget.reserve(cost)
+        response = None
+        succeeded = False
+        try:
+            response = super()._request(prepared_request, context)
+            succeeded = True
+        except RetriableAPIError as e:
+            response = e.response
+            raise
+        finally:
+            self.finish_request(prepared_request, response, context, cost, budget_wait, succeeded)
+        return response
+
+    async def _request_async(
+        self,
+        engine: AsyncRequestEngine,
+        prepared_request: requests.PreparedRequest,
+        context: Optional[dict],
+    ) -> requests.Response:
+        """Send a request through the async engine once the shared cost budget has room for it."""
+        cost = self.estimate_request_cost(prepared_request)
+        budget_wait = await self.cost_budget.reserve_async(cost)
+        response = None
+        succeeded = False
+        try:
+            response = await engine.send(prepared_request)
+            self.validate_response(response)
+            succeeded = True
+        except RetriableAPIError as e:
+            response = e.response
+            raise
+        finally:
+            self.finish_request(prepared_request, response, context, cost, budget_wait, succeeded)
+        return response
+
+    def finish_request(
+        self,
+        prepared_request: requests.PreparedRequest,
+        response: Optional[requests.Response],
+        context: Optional[dict],
+        cost: float,
+        budget_wait: float,
+        succeeded: bool,
+    ) -> None:
+        """Settle the budget reservation of a request and collect its metrics."""
+        self.cost_budget.settle(cost, self.get_throttle_status(response))
+        if telemetry.is_enabled(self.config):
+            self.track_request(prepared_request, response, context, budget_wait, succeeded)
+
+    def track_request(
+        self,
+        prepared_request: requests.PreparedRequest,
+        response: Optional[requests.Response],
+        context: Optional[dict],
+        budget_wait: float,
+        succeeded: bool,
+    ) -> None:
+        """Collect the metrics of a request.
+
+        Metrics of successful page requests, flagged with `counts_records`, are kept
+        on the response until its records are counted by `write_request_metrics`.
+        Every other request, e.g. probes, counts and status polls, is written now.
+        """
+        cost = self.get_response_cost(response)
+        metrics = telemetry.build_request_metrics(
+            self.name,
+            context,
+            response,
+            page_size=getattr(prepared_request, "requested_nodes", None),
+            budget_wait=budget_wait,
+        )
+        metrics["requested_cost"] = cost.get("requestedQueryCost")
+        metrics["actual_cost"] = cost.get("actualQueryCost")
+        metrics["available_points"] = (cost.get("throttleStatus") or {}).get(
+            "currentlyAvailable"
+        )
+        if succeeded and getattr(prepared_request, "counts_records", False):
+            response.request_metrics = metrics
+        else:
+            telemetry.write_request_metrics(self, metrics)
+
+    def write_request_metrics(self, response: requests.Response, records: int) -> None:
+        """Write the metrics of a parsed response, if telemetry is enabled."""
+        metrics = getattr(response, "request_metrics", None)
+        if metrics is None:
+            return
+        metrics["records"] = records
+        telemetry.write_request_metrics(self, metrics)
 
     @property
     def authenticator(self) -> ShopifyAuthenticator:
@@ -70,13 +203,11 @@ class shopifyStream(GraphQLStream):
             if key == "lineItems":
                 # Handle lineItems pagination
                 if hasattr(self, 'first_line_item'):
-                    after = self.after_line_item if hasattr(self, "after_line_item") else None
                     query = self.get_field_query(
                         key,
                         value["properties"],
                         is_paginated=True,
                         page_size=self.first_line_item,
-                        after=after,
                     )
                 else:
                     query = self.get_field_query(key, value["properties"])
@@ -183,49 +314,61 @@ class shopifyStream(GraphQLStream):
                 parts.append(key)
         return " ".join(parts)
 
-    def _fetch_paginated_connection(
+    def _fetch_paginated_connections(
         self,
-        record: dict,
+        records: list,
         field_name: str,
         resource_type: Optional[str] = None,
         page_size: int = 250,
         default_fields: str = "id",
-    ) -> list:
-        """Fetch all nodes from a paginated connection field via the node interface."""
-        resource_gid = record["id"]
-        if resource_type is None:
-            resource_type = resource_gid.split("/")[-2]
-
-        connection = record.get(field_name, {})
-        all_edges = list(connection.get("edges", []))
-        has_next = connection.get("pageInfo", {}).get("hasNextPage", False)
-
-        if not has_next:
-            return [e["node"] for e in all_edges]
-
-        self.logger.info(f"Fetching additional {field_name} pages for {resource_gid}")
-        decorated_request = self.request_decorator(self._request)
-
-        field_schema = (
-            self.schema.get("properties", {})
-            .get(field_name, {})
-            .get("items", {})
-            .get("properties", {})
-        )
-        node_fields = (
-            self._build_schema_fields_query(field_schema) if field_schema else default_fields
-        )
+    ) -> None:
+        """Replace a paginated connection field of records by all of its nodes.
 
-        while has_next:
-            after_cursor = all_edges[-1]["cursor"]
-            query = (
-                f'query {{ node(id: "{resource_gid}") {{'
-                f' ... on {resource_type} {{'
-                f' {field_name}(first: {page_size}, after: "{after_cursor}") {{'
-                f' edges {{ cursor node {{ {node_fields} }} }}'
-                f' pageInfo {{ hasNextPage }}'
-                f' }} }} }} }}'
+        Records whose first page has more nodes are continued together, with
+        one aliased `node(id:)` per record in each query, packed to fit the
+        single query cost limit, until every connection is exhausted.
+        """
+        connections = {}
+        for record in records:
+            connection = record.get(field_name)
+            if isinstance(connection, dict):
+                connections[record["id"]] = {
+                    "edges": list(connection.get("edges", [])),
+                    "has_next": connection.get("pageInfo", {}).get("hasNextPage", False),
+                }
+
+        pending = [gid for gid, connection in connections.items() if connection["has_next"]]
+        if pending:
+            self.logger.info(f"Fetching additional {field_name} pages for {len(pending)} records")
+            field_schema = (
+                self.schema.get("properties", {})
+                .get(field_name, {})
+                .get("items", {})
+                .get("properties", {})
+            )
+            node_fields = (
+                self._build_schema_fields_query(field_schema) if field_schema else default_fields
+            )
+            node_cost = estimate_node_cost(node_fields)
+            decorated_request = self.request_decorator(self._request)
+
+        while pending:
+            aliases, alias_page_size = plan_alias_batch(
+                len(pending), node_cost, page_size, self.overflow_min_page_size
             )
+            batch, pending = pending[:aliases], pending[aliases:]
+            query_blocks = []
+            for i, resource_gid in enumerate(batch):
+                after_cursor = connections[resource_gid]["edges"][-1]["cursor"]
+                query_blocks.append(
+                    f'r{i}: node(id: "{resource_gid}") {{'
+                    f' ... on {resource_type or resource_gid.split("/")[-2]} {{'
+                    f' {field_name}(first: {alias_page_size}, after: "{after_cursor}") {{'
+                    f' edges {{ cursor node {{ {node_fields} }} }}'
+                    f' pageInfo {{ hasNextPage }}'
+                    f' }} }} }}'
+                )
+            query = f"query {{ {' '.join(query_blocks)} }}"
             headers = {**self.http_headers, **(self.authenticator.auth_headers or {})}
             prepared = self.requests_session.prepare_request(
                 requests.Request(
@@ -235,26 +378,48 @@ class shopifyStream(GraphQLStream):
                     json={"query": query},
                 )
             )
+            prepared.requested_nodes = alias_page_size * len(batch)
+            prepared.counts_records = True
+            prepared.estimated_cost = estimate_selection_cost(" ".join(query_blocks))
             resp = decorated_request(prepared, {})
-            node_data = resp.json().get("data", {}).get("node", {})
-            page = node_data.get(field_name, {})
-            all_edges.extend(page.get("edges", []))
-            has_next = page.get("pageInfo", {}).get("hasNextPage", False)
+            data = self.get_response_json(resp).get("data") or {}
+            fetched = 0
+            missing = []
+            for i, resource_gid in enumerate(batch):
+                node = data.get(f"r{i}")
+                if node is None:
+                    # deleted since its first page was read, or not accessible to the app
+                    missing.append(resource_gid)
+                    continue
+                page = node.get(field_name) or {}
+                edges = page.get("edges", [])
+                fetched += len(edges)
+                connections[resource_gid]["edges"].extend(edges)
+                if edges and page.get("pageInfo", {}).get("hasNextPage", False):
+                    pending.append(resource_gid)
+            if missing:
+                self.logger.warning(
+                    f"Could not fetch more {field_name} of {len(missing)} records, "
+                    f"their node is null: {', '.join(missing)}"
+                )
+            self.write_request_metrics(resp, fetched)
 
-        return [e["node"] for e in all_edges]
+        for record in records:
+            if record["id"] in connections:
+                record[field_name] = [e["node"] for e in connections[record["id"]]["edges"]]
 
-    def _fetch_all_metafields(self, record: dict) -> list:
-        """Fetch all metafields for a record, paginating through additional pages via the node interface."""
-        return self._fetch_paginated_connection(
-            record,
+    def _fetch_all_metafields(self, records: list) -> None:
+        """Fetch all metafields of records, paginating through additional pages via the node interface."""
+        self._fetch_paginated_connections(
+            records,
             "metafields",
             default_fields="id key namespace value type",
         )
 
-    def _fetch_all_refund_line_items(self, record: dict) -> list:
-        """Fetch all refund line items, paginating through additional pages via the node interface."""
-        return self._fetch_paginated_connection(
-            record,
+    def _fetch_all_refund_line_items(self, records: list) -> None:
+        """Fetch all refund line items of records, paginating through additional pages via the node interface."""
+        self._fetch_paginated_connections(
+            records,
             "refundLineItems",
             resource_type="Refund",
             default_fields="id quantity restockType",
@@ -1,17 +1,26 @@
 """GraphQL client handling, including shopify-betaStream base class."""
 
+import copy
+import os
+import tempfile
 from datetime import datetime, timedelta, timezone
 from pendulum import parse
-from time import sleep
-from typing import Any, Iterable, cast
+from time import monotonic, sleep
+from typing import Any, Iterable, Optional, cast
 
 import requests
-import simplejson
+from backports.cached_property import cached_property
 from hotglue_singer_sdk.helpers.jsonpath import extract_jsonpath
 
+from tap_shopify_beta.bulk_download import download_to_spool, iter_spooled_lines
+from tap_shopify_beta.bulk_operations import (
+    BulkOperationSlots,
+    PollSchedule,
+    get_bulk_operation_slots,
+)
+from tap_shopify_beta.bulk_parser import iter_bulk_records
 from tap_shopify_beta.client import shopifyStream
 from tap_shopify_beta.shopify_dates import to_shopify_utc
-import re
 
 
 class InvalidOperation(requests.RequestException, ValueError):
@@ -27,6 +36,28 @@ class shopifyBulkStream(shopifyStream):
 
     start_date = None
     end_date = None
+    # statuses of bulk operations that will never complete
+    failed_statuses = ("FAILED", "CANCELED", "EXPIRED")
+    # objects the next operation is expected to hold, from the previous one
+    expected_object_count = None
+    # window of the first operation, the next ones are sized from the previous one
+    bulk_window = timedelta(days=1)
+    # objects and Shopify-side seconds an operation is sized for
+    bulk_target_objects = 100000
+    bulk_target_seconds = 600
+    # most a window grows or shrinks from one operation to the next
+    bulk_max_window_factor = 4
+    # bounds of the window, overridden by bulk_min_window_hours and bulk_max_window_days
+    bulk_min_window = timedelta(hours=1)
+    bulk_max_window = timedelta(days=30)
+
+    @cached_property
+    def bulk_operation_slots(self) -> BulkOperationSlots:
+        """Return the bulk operation slots shared by every stream of this shop."""
+        slots = get_bulk_operation_slots(self.get_shop_name())
+        if self.config.get("bulk_max_operations"):
+            slots.resize(self.config["bulk_max_operations"])
+        return slots
 
     @property
     def query(self) -> str:
@@ -85,7 +116,7 @@ class shopifyBulkStream(shopifyStream):
             self.start_date = self.start_date or self.get_starting_timestamp({})
             if self.start_date:
                 date = to_shopify_utc(self.start_date)
-                self.end_date = self.start_date + timedelta(days=1)
+                self.end_date = self.start_date + self.bulk_window
                 config_end_date = self.config.get("end_date")
                 if config_end_date and self.end_date > parse(config_end_date):
                     self.end_date = parse(config_end_date)
@@ -94,20 +125,22 @@ class shopifyBulkStream(shopifyStream):
             return query
         return ""
 
-    def get_operation_status(self):
+    def get_operation_status(self, operation_id):
 
         query = """
-            query {
-                currentBulkOperation {
-                    id
-                    status
-                    errorCode
-                    createdAt
-                    completedAt
-                    objectCount
-                    fileSize
-                    url
-                    partialDataUrl
+            query($id: ID!) {
+                node(id: $id) {
+                    ... on BulkOperation {
+                        id
+                        status
+                        errorCode
+                        createdAt
+                        completedAt
+                        objectCount
+                        fileSize
+                        url
+                        partialDataUrl
+                    }
                 }
             }
         """
@@ -124,7 +157,7 @@ class shopifyBulkStream(shopifyStream):
                     method=self.rest_method,
                     url=self.get_url({}),
                     headers=headers,
-                    json=dict(query=query, variables={}),
+                    json=dict(query=query, variables={"id": operation_id}),
                 ),
             ),
         )
@@ -134,34 +167,39 @@ class shopifyBulkStream(shopifyStream):
 
         return response
 
-    def check_status(self, operation_id, sleep_time=20, timeout=7200):
+    def check_status(self, operation_id, timeout=7200):
+        """Wait for a bulk operation to complete and return the URL of its result."""
+        return self.wait_for_operation(operation_id, timeout)["url"]
 
-        status_jsonpath = "$.data.currentBulkOperation"
-        start = datetime.now().timestamp()
+    def wait_for_operation(self, operation_id, timeout=7200, schedule: Optional[PollSchedule] = None) -> dict:
+        """Wait for a bulk operation to complete and return its status."""
+        status_jsonpath = "$.data.node"
+        schedule = schedule or PollSchedule(expected_objects=self.expected_object_count)
+        start = monotonic()
 
-        while datetime.now().timestamp() < (start + timeout):
-            status_response = self.get_operation_status()
+        while monotonic() < start + timeout:
+            status_response = self.get_operation_status(operation_id)
             status = next(
-                extract_jsonpath(status_jsonpath, input=status_response.json())
+                extract_jsonpath(status_jsonpath, input=status_response.json()), None
             )
-            if status["id"] != operation_id:
-                raise InvalidOperation(
-                    "The current job was not triggered by the process, check if other service is using the Bulk API"
-                )
-            if status["status"] == "FAILED":
-                raise InvalidOperation(f"Job failed: {status['errorCode']}")
+            if not status:
+                raise InvalidOperation(f"Bulk operation {operation_id} not found")
+            if status["status"] in self.failed_statuses:
+                raise InvalidOperation(f"Job {status['status'].lower()}: {status['errorCode']}")
+            object_count = int(status.get("objectCount") or 0)
+            elapsed = monotonic() - start
             if status["status"] == "COMPLETED":
-                return status["url"]
-            sleep(sleep_time)
+                self.expected_object_count = object_count
+                self.logger.info(
+                    f"Bulk operation {operation_id} completed with {object_count} objects "
+                    f"in {elapsed:.0f}s, {schedule.polls + 1} polls"
+                )
+                return status
+            sleep(schedule.next_delay(elapsed, object_count))
         raise OperationFailed("Job Timeout")
     
-    def get_line_type(self, id):
-        match = re.search(r"gid://shopify/([^/]+)/", id)
-        if match:
-            return match.group(1)
-
-    def parse_response(self, response: requests.Response) -> Iterable[dict]:
-        """Parse the response and return an iterator of result rows."""
+    def get_operation_id(self, response: requests.Response) -> str:
+        """Return the id of the bulk operation started by a bulkOperationRunQuery response."""
         operation_id_jsonpath = "$.data.bulkOperationRunQuery.bulkOperation.id"
         request_response = response.json()
         operation_id =  next(
@@ -170,41 +208,109 @@ class shopifyBulkStream(shopifyStream):
 
         if not operation_id:
             raise Exception(response.json())
+        return operation_id
+
+    def run_bulk_operation(
+        self, prepared_request: requests.PreparedRequest, context: Optional[dict]
+    ) -> requests.Response:
+        """Start a bulk operation and wait for Shopify to complete it.
+
+        One of the shop's bulk slots is held from the start of the operation until
+        it completes, the result is downloaded after giving it back. The completed
+        operation is kept on the returned response.
+        """
+        decorated_request = self.request_decorator(self._request)
+        with self.bulk_operation_slots:
+            response = decorated_request(prepared_request, context)
+            operation_id = self.get_operation_id(response)
+            self.logger.info(f"Started bulk operation {operation_id} for stream {self.name}")
+            response.bulk_operation = self.wait_for_operation(operation_id)
+        self.write_request_metrics(response, int(response.bulk_operation.get("objectCount") or 0))
+        return response
+
+    def request_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Run a bulk operation per window and yield the records of its result."""
+        next_page_token = None
+        finished = False
 
-        url = self.check_status(operation_id)
+        while not finished:
+            prepared_request = self.prepare_request(context, next_page_token=next_page_token)
+            response = self.run_bulk_operation(prepared_request, context)
+            yield from self.parse_response(response)
+            previous_token = copy.deepcopy(next_page_token)
+            next_page_token = self.get_next_page_token(response, previous_token)
+            if next_page_token and next_page_token == previous_token:
+                raise RuntimeError("Pagination loop detected")
+            finished = not next_page_token
+
+    def parse_response(self, response: requests.Response) -> Iterable[dict]:
+        """Parse the response and return an iterator of result rows."""
+        operation = getattr(response, "bulk_operation", None)
+        if operation is None:
+            operation = self.wait_for_operation(self.get_operation_id(response))
+        url = operation.get("url")
 
         if url:
-            output = requests.get(url, stream=True)
-
-            parent_line = None
-            for line in output.iter_lines():
-                line = simplejson.loads(line)
-                if hasattr(self, "bulk_process_fields"):
-                    if parent_line and not line.get("__parentId"):
-                        yield parent_line
-                        parent_line = None
-                    if not parent_line and not line.get("__parentId"):
-                        parent_line = line
-                    if line.get("__parentId"):
-                        line_type = self.get_line_type(line["id"])
-                        if line_type in self.bulk_process_fields:
-                            line_field_name = self.bulk_process_fields[line_type]
-                            if not parent_line.get(line_field_name):
-                                parent_line[line_field_name] = {"edges": [{"node": line}]}
-                            else:
-                                parent_line[line_field_name]["edges"].append({"node": line}) 
-                            continue
-                else:
-                    yield line
-            # yield final record
-            if parent_line:
-                yield parent_line
+            yield from self.parse_bulk_lines(self.iter_bulk_result(url, operation.get("fileSize")))
+
+    def iter_bulk_result(self, url: str, file_size: Optional[str] = None) -> Iterable[bytes]:
+        """Download a bulk result to a spool file and yield its lines, removing the file after."""
+        fd, path = tempfile.mkstemp(
+            prefix=f"{self.name}-", suffix=".jsonl", dir=self.config.get("bulk_spool_dir")
+        )
+        os.close(fd)
+        try:
+            size = download_to_spool(
+                url, path, int(file_size) if file_size else None, logger=self.logger
+            )
+            self.logger.info(f"Downloaded {size} bytes bulk result of stream {self.name}")
+            yield from iter_spooled_lines(path, use_mmap=bool(self.config.get("bulk_mmap")))
+        finally:
+            os.remove(path)
+
+    def parse_bulk_lines(self, lines: Iterable[bytes]) -> Iterable[dict]:
+        """Return the records of a bulk result, nesting child lines into their parent."""
+        return iter_bulk_records(lines, getattr(self, "bulk_process_fields", None))
 
     def get_next_page_token(self, response, previous_token) -> Any:
         now = datetime.now(timezone.utc)
         config_end_date = self.config.get("end_date")
         upper_bound = min(now, parse(config_end_date)) if config_end_date else now
         if self.end_date < upper_bound:
+            operation = getattr(response, "bulk_operation", None)
+            if operation:
+                self.resize_bulk_window(operation)
             self.start_date = self.end_date
             return self.start_date
 
+    def resize_bulk_window(self, operation: dict) -> None:
+        """Size the next window from the objects and duration of the operation that just completed.
+
+        Windows holding few objects, e.g. on low-volume shops, grow so a backfill
+        runs fewer operations and pays their fixed overhead less often. Windows
+        running long or holding many objects, e.g. Black Friday, shrink.
+        """
+        window = self.end_date - self.start_date
+        objects = int(operation.get("objectCount") or 0)
+        factor = self.bulk_max_window_factor
+        if objects:
+            factor = min(factor, self.bulk_target_objects / objects)
+        if operation.get("createdAt") and operation.get("completedAt"):
+            seconds = (parse(operation["completedAt"]) - parse(operation["createdAt"])).total_seconds()
+            if seconds > 0:
+                factor = min(factor, self.bulk_target_seconds / seconds)
+        factor = max(factor, 1 / self.bulk_max_window_factor)
+
+        min_window = self.bulk_min_window
+        if self.config.get("bulk_min_window_hours"):
+            min_window = timedelta(hours=self.config["bulk_min_window_hours"])
+        max_window = self.bulk_max_window
+        if self.config.get("bulk_max_window_days"):
+            max_window = timedelta(days=self.config["bulk_max_window_days"])
+        self.bulk_window = min(max(window * factor, min_window), max_window)
+        self.expected_object_count = round(objects * (self.bulk_window / window)) if window else None
+        self.logger.info(
+            f"Bulk window of stream {self.name} set to {self.bulk_window} "
+            f"after {objects} objects in {window}"
+        )
+
@@ -1,6 +1,5 @@
 """GraphQL client handling, including shopifyStream base class."""
 
-from time import sleep
 from typing import Any, Dict, Iterable, Optional, cast, Callable
 
 import requests
@@ -9,16 +8,36 @@ from backports.cached_property import cached_property
 from hotglue_singer_sdk.helpers.jsonpath import extract_jsonpath
 import math
 
+from tap_shopify_beta.async_engine import DEFAULT_MAX_CONNECTIONS, AsyncRequestEngine
+from tap_shopify_beta.checkpoints import PartitionCheckpoints, PartitionProgress
 from tap_shopify_beta.client import shopifyStream
+from tap_shopify_beta.cost_budget import MAX_SINGLE_QUERY_COST
+from tap_shopify_beta.cost_model import QueryCostModel
+from tap_shopify_beta.dedupe import PartitionDeduplicator
+from tap_shopify_beta.partitioning import DateRangeQueue, plan_balanced_ranges, split_point
+from tap_shopify_beta.query_cost import (
+    CONNECTION_COST,
+    estimate_node_cost,
+    most_expensive_fields,
+)
+from tap_shopify_beta.record_queue import ByteBudgetQueue
+from tap_shopify_beta.scheduler import sync_lock
 from dateutil.relativedelta import relativedelta
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 import copy
-from hotglue_singer_sdk.exceptions import RetriableAPIError
+from hotglue_singer_sdk.exceptions import FatalAPIError, RetriableAPIError
+import asyncio
 import backoff
 import concurrent.futures
+import functools
+import hashlib
+import json
 import queue
+import random
+import re
 import threading
+from time import monotonic, sleep
 from pendulum import parse
 from tap_shopify_beta.shopify_dates import to_shopify_utc
 
@@ -27,17 +46,32 @@ class GraphQLInternalServerError(RetriableAPIError):
     """Error raised when Shopify returns an internal server error in the GraphQL response."""
     pass
 
+class GraphQLThrottledError(RetriableAPIError):
+    """Error raised when Shopify rejects a query because the cost bucket is empty."""
+
+    def __init__(self, message: str, response: requests.Response = None, retry_after: float = 0):
+        super().__init__(message, response)
+        self.retry_after = retry_after
+
+
+class GraphQLInvalidCursorError(FatalAPIError):
+    """Error raised when Shopify rejects the `after` cursor of a query, e.g. once it expired."""
+    pass
+
+
+# error messages of a query whose `after` cursor Shopify can't page from
+INVALID_CURSOR_MESSAGE = re.compile(r"\b(invalid cursor|cursor is invalid)\b", re.IGNORECASE)
+
+
 class shopifyGqlStream(shopifyStream):
     """shopify stream class."""
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.ids = set()
+        self.deduplicator = PartitionDeduplicator()
+        self.partition_checkpoints: Optional[PartitionCheckpoints] = None
+        self._checkpoint_written_at = monotonic()
 
-    query_cost = None
-    available_points = None
-    restore_rate = None
-    max_points = None
     single_object_params = None
     is_list = True
     json_path = None
@@ -45,44 +79,110 @@ class shopifyGqlStream(shopifyStream):
     end_date = None
     sort_key = None
     sort_key_type = None
+    # stream state key holding the cost parameters learned on previous runs
+    cost_state_key = "cost_parameters"
+    # THROTTLED responses are retried by waiting on the cost budget before falling back to backoff
+    max_throttled_retries = 10
+    # upper bound of the random delay spreading concurrent workers retrying after THROTTLED
+    throttle_jitter = 0.5
+    # pages a partition fetches between checks for idle workers to split it with
+    split_after_pages = 5
+    # memory budget of the records queued by concurrent partition workers, in MB
+    record_queue_mb = 256
+    # seconds between two logs of the record queue occupancy
+    record_queue_log_interval = 30
+    # partitions are not split into ranges shorter than this
+    min_split_interval = timedelta(hours=1)
+    # count query used to plan partitions holding the same number of records, e.g. ordersCount
+    count_query_name = None
+    # points reserved for a count query
+    count_query_cost = 10
+    # count queries spent planning partitions, per request the shop's rate limit allows at once
+    count_queries_per_request = 4
+    # stream state key holding the progress of the partitions of an unfinished concurrent sync
+    checkpoint_state_key = "partition_checkpoints"
+    # seconds between two STATE messages saving the progress of concurrent partitions
+    checkpoint_interval = 60
+    # stream state key holding the cursor of the next page of an unfinished sequential sync
+    cursor_state_key = "resume_cursor"
+
+    @cached_property
+    def cost_model(self) -> QueryCostModel:
+        """Return the cost and latency history of this stream's queries."""
+        return QueryCostModel()
+
+    @cached_property
+    def static_node_cost(self) -> int:
+        """Estimate the requested cost of one node from the selected fields."""
+        selection = self.gql_selected_fields
+        node_cost = estimate_node_cost(selection)
+        if CONNECTION_COST + node_cost > MAX_SINGLE_QUERY_COST:
+            self.logger.warning(
+                f"Selected fields for stream {self.name} are estimated to cost {node_cost} "
+                f"points per record, above the single query limit of {MAX_SINGLE_QUERY_COST}. "
+                f"Most expensive fields: {most_expensive_fields(selection)}"
+            )
+        return node_cost
+
+    @cached_property
+    def selection_hash(self) -> str:
+        """Return a fingerprint of the selected fields, saved cost parameters only apply to it."""
+        selection = f"{self.query_name}:{self.gql_selected_fields}"
+        return hashlib.sha1(selection.encode("utf-8")).hexdigest()
+
+    def warm_up_cost_model(self) -> None:
+        """Start the cost model from the previous run's parameters or from a static estimate."""
+        saved = self.stream_state.get(self.cost_state_key) or {}
+        if (
+            saved.get("api_version") == self.api_version
+            and saved.get("selection_hash") == self.selection_hash
+        ):
+            self.cost_model.restore(saved)
+            self.cost_budget.calibrate(saved.get("max_points"), saved.get("restore_rate"))
+        if not self.cost_model.is_warm:
+            self.cost_model.seed(self.static_node_cost)
+
+    def save_cost_parameters(self) -> None:
+        """Store the learned cost parameters in the stream state for the next run."""
+        if not self.cost_model.is_warm or self.cost_model.is_estimate:
+            return
+        budget = self.cost_budget
+        parameters = {
+            "api_version": self.api_version,
+            "selection_hash": self.selection_hash,
+            **self.cost_model.to_dict(),
+            "max_points": budget.max_points,
+            "restore_rate": budget.restore_rate,
+        }
+        # other streams may be serializing the tap state in a STATE message
+        with sync_lock:
+            self.stream_state[self.cost_state_key] = parameters
 
     @property
     def page_size(self) -> int:
-        if self.available_points is None:
+        if not self.cost_model.is_warm:
             return 1
-        
-        # if restore rate and max points are high, wait to always be able to use max points
-        if self.restore_rate >= 500:
-            sleep(math.ceil(1000/self.restore_rate))
-            
-        # If we don't have enough points for at least 2 queries, wait
-        if self.available_points < self.query_cost * 5:
-            points_needed = self.query_cost * 5 - self.available_points
-            seconds_to_wait = math.ceil(points_needed / self.restore_rate)
-            self.logger.info(f"Waiting {seconds_to_wait} seconds for {points_needed} more points to become available")
-            sleep(seconds_to_wait)
-            # Update available points after waiting
-            self.available_points = min(
-                self.available_points + (self.restore_rate * seconds_to_wait),
-                self.max_points
-            )
-            
-        # Calculate how many points we'll restore during the next query
-        # Assuming average query takes 2 seconds to execute
-        points_restored_during_query = self.restore_rate * 2
-        # Calculate base pages from available points
-        pages = (self.available_points + points_restored_during_query) / self.query_cost
-        
-        # Calculate maximum pages we can use without exceeding 1000 points
-        max_pages = math.floor(1000 / self.query_cost)
-            
-        # Use a more aggressive page size, but ensure we don't exceed max_pages
-        target_pages = min(max_pages, pages)
-        
-        self.logger.info(f"Thread: {threading.current_thread().name} Using {target_pages * self.query_cost} points, Available points: {self.available_points}")
 
-        # For smaller page counts, still use them but be more conservative
-        return min(int(target_pages), 250)
+        # waiting for points is left to the shared cost budget, so concurrent
+        # workers take turns instead of racing into THROTTLED
+        budget = self.cost_budget
+        available = budget.estimate_available()
+        page_size = self.cost_model.best_page_size(
+            available, budget.max_points, budget.restore_rate
+        )
+
+        self.logger.info(f"Thread: {threading.current_thread().name} Using page size {page_size} ({self.cost_model.requested_cost(page_size):.0f} points), Available points: {available:.0f}")
+
+        return page_size
+
+    def get_requested_nodes(self, request_data: dict) -> int:
+        """Return how many nodes a request payload asks for."""
+        variables = request_data.get("variables") or {}
+        return variables.get("first") or max(len(variables), 1)
+
+    def estimate_query_cost(self, request_data: dict) -> Optional[float]:
+        """Estimate the requested cost of a payload from the costs of previous pages."""
+        return self.cost_model.requested_cost(self.get_requested_nodes(request_data))
 
     @cached_property
     def query(self) -> str:
@@ -153,7 +253,7 @@ class shopifyGqlStream(shopifyStream):
         """Return token identifying next page or None if all records have been read."""
         if not self.replication_key:
             return None
-        response_json = response.json()
+        response_json = self.get_response_json(response)
         has_next_json_path = f"$.data.{self.query_name}.pageInfo.hasNextPage"
         has_next = next(extract_jsonpath(has_next_json_path, response_json))
         if has_next:
@@ -167,8 +267,6 @@ class shopifyGqlStream(shopifyStream):
             if self.end_date < upper_bound:
                 self.start_date = self.start_date + relativedelta(months=1)
                 self.logger.info(f"Reached end of data for current month. Moving start date to {self.start_date}")
-                # make self.available_points None so page_size calculation is accurate
-                self.available_points = None
                 return 0
         self.logger.info(f"Finishing sync for stream {self.name}")
         return None
@@ -232,7 +330,7 @@ class shopifyGqlStream(shopifyStream):
             json_path = f"$.data.{self.query_name}.edges[*].node"
         else:
             json_path = f"$.data.{self.query_name}"
-        res_json = response.json()
+        res_json = self.get_response_json(response)
 
         errors = res_json.get("errors")
 
@@ -244,21 +342,21 @@ class shopifyGqlStream(shopifyStream):
         cost = res_json.get("extensions", dict()).get("cost")
         if not cost:
             self.logger.warning(f"No cost found for stream {self.name}, response: {res_json}")
-        if not self.query_cost:
-            self.query_cost = (cost.get("actualQueryCost") + cost.get("requestedQueryCost")) / 2
-        self.available_points = cost["throttleStatus"].get("currentlyAvailable")
-        self.restore_rate = cost["throttleStatus"].get("restoreRate")
-        self.max_points = cost["throttleStatus"].get("maximumAvailable")
+        self.cost_model.observe(
+            nodes=getattr(response.request, "requested_nodes", 1),
+            records=len(records),
+            requested_cost=cost.get("requestedQueryCost"),
+            actual_cost=cost.get("actualQueryCost"),
+            latency=response.elapsed.total_seconds(),
+        )
+        self.write_request_metrics(response, len(records))
 
         if errors:
             #self.logger.info(f"Issue found while fetching {self.name}, response: {errors}")
             pass
-        for record in records:
-            if isinstance(record.get("metafields"), dict):
-                record["metafields"] = self._fetch_all_metafields(record)
-            if isinstance(record.get("refundLineItems"), dict):
-                record["refundLineItems"] = self._fetch_all_refund_line_items(record)
-            yield record
+        self._fetch_all_metafields(records)
+        self._fetch_all_refund_line_items(records)
+        yield from records
 
     def filter_response(self, response_json: dict) -> dict:
         return response_json
@@ -266,6 +364,8 @@ class shopifyGqlStream(shopifyStream):
     def prepare_request(
         self, context: Optional[dict], next_page_token: Optional[Any]
     ) -> requests.PreparedRequest:
+        if not self.cost_model.is_warm:
+            self.warm_up_cost_model()
         http_method = self.rest_method
         url: str = self.get_url(context)
         params: dict = {}
@@ -289,6 +389,10 @@ class shopifyGqlStream(shopifyStream):
                 ),
             ),
         )
+        request.requested_nodes = self.get_requested_nodes(request_data)
+        request.estimated_cost = self.estimate_query_cost(request_data)
+        # metrics are written by parse_response, once the page's records are counted
+        request.counts_records = True
         return request
 
     def validate_response(self, response: requests.Response) -> None:
@@ -296,9 +400,13 @@ class shopifyGqlStream(shopifyStream):
         super().validate_response(response)
 
         try:
-            resp_json = response.json()
+            resp_json = self.get_response_json(response)
             errors = resp_json.get("errors", [])
             if not resp_json.get("data"):
+                if self.rejects_resumed_cursor(getattr(response, "request", None), errors):
+                    raise GraphQLInvalidCursorError(
+                        f"Shopify rejected the query cursor: {errors[0].get('message')}"
+                    )
                 for error in errors:
                     extensions = error.get("extensions", {})
                     if extensions.get("code") == "INTERNAL_SERVER_ERROR":
@@ -307,21 +415,87 @@ class shopifyGqlStream(shopifyStream):
                             response
                         )
                     if extensions.get("code") == "THROTTLED":
-                        import time
-                        time.sleep(5)
-                        raise RetriableAPIError(
+                        raise GraphQLThrottledError(
                             f"Shopify GraphQL Throttled Error: {error.get('message')}",
-                            response
+                            response,
+                            retry_after=self.get_throttle_delay(resp_json),
                         )
         except ValueError:
             # If response is not JSON, let the parent validator handle it
             pass
     
+    def rejects_resumed_cursor(self, request: requests.PreparedRequest, errors: list) -> bool:
+        """Return whether the errors of a response without data reject a resumed cursor.
+
+        Only requests flagged with `resumes_cursor` qualify, they are sent by the
+        paths restarting without the cursor on `GraphQLInvalidCursorError`.
+        """
+        if not getattr(request, "resumes_cursor", False):
+            return False
+        try:
+            variables = json.loads(request.body or "{}").get("variables") or {}
+        except ValueError:
+            return False
+        if not variables.get("after"):
+            return False
+        return any(INVALID_CURSOR_MESSAGE.search(error.get("message") or "") for error in errors)
+
+    def get_throttle_delay(self, response_json: dict) -> float:
+        """Return the seconds needed to restore the points a throttled query requested."""
+        cost = response_json.get("extensions", {}).get("cost", {})
+        throttle_status = cost.get("throttleStatus") or {}
+        restore_rate = throttle_status.get("restoreRate")
+        if not restore_rate or cost.get("requestedQueryCost") is None:
+            return 0
+        points_needed = cost["requestedQueryCost"] - throttle_status.get("currentlyAvailable", 0)
+        return max(points_needed, 0) / restore_rate
+
+    def _request(
+        self, prepared_request: requests.PreparedRequest, context: Optional[dict]
+    ) -> requests.Response:
+        """Send a request, waiting out THROTTLED responses on the shared cost budget."""
+        for _ in range(self.max_throttled_retries):
+            try:
+                return super()._request(prepared_request, context)
+            except GraphQLThrottledError as e:
+                # The budget was resynced from the throttled response, so reserving the
+                # requested cost again waits exactly for the missing points
+                requested_cost = self.get_response_cost(e.response).get("requestedQueryCost")
+                if requested_cost:
+                    prepared_request.estimated_cost = requested_cost
+                self.logger.info(
+                    f"[{threading.current_thread().name}] Throttled by Shopify, "
+                    f"retrying once points are restored in {e.retry_after:.1f} seconds"
+                )
+                sleep(random.uniform(0, self.throttle_jitter))
+        return super()._request(prepared_request, context)
+
+    async def _request_async(
+        self,
+        engine: AsyncRequestEngine,
+        prepared_request: requests.PreparedRequest,
+        context: Optional[dict],
+    ) -> requests.Response:
+        """Send a request through the async engine, waiting out THROTTLED responses."""
+        for _ in range(self.max_throttled_retries):
+            try:
+                return await super()._request_async(engine, prepared_request, context)
+            except GraphQLThrottledError as e:
+                requested_cost = self.get_response_cost(e.response).get("requestedQueryCost")
+                if requested_cost:
+                    prepared_request.estimated_cost = requested_cost
+                self.logger.info(
+                    f"[{self.name}] Throttled by Shopify, "
+                    f"retrying once points are restored in {e.retry_after:.1f} seconds"
+                )
+                await asyncio.sleep(random.uniform(0, self.throttle_jitter))
+        return await super()._request_async(engine, prepared_request, context)
+
     def backoff_wait_generator(self):
-        # Use exponential backoff between min_wait and 30 seconds
-        min_wait = 1000 / self.restore_rate if self.restore_rate else 10
-        return backoff.expo(base=2, factor=min_wait, max_value=30)
-    
+        # THROTTLED responses are waited out on the cost budget, backoff only covers
+        # server and network errors
+        return backoff.expo(base=2, factor=2, max_value=30)
+
 
     def request_decorator(self, func: Callable) -> Callable:
         decorator: Callable = backoff.on_exception(
@@ -384,16 +558,63 @@ class shopifyGqlStream(shopifyStream):
                 return None
             return parse(earliest_rep_key)
 
-    def get_concurrent_params(self, context):
+    def count_records(self, start_date: datetime, end_date: datetime) -> Optional[int]:
+        """Return how many records were updated within a range, None unless Shopify counted them exactly."""
+        date_filter = (
+            f"updated_at:>'{to_shopify_utc(start_date)}' AND "
+            f"updated_at:<='{to_shopify_utc(end_date)}'"
+        )
+        query = (
+            f"query tapShopify($filter: String) {{"
+            f" {self.count_query_name}(query: $filter) {{ count precision }} }}"
+        )
+        headers = {**self.http_headers, **(self.authenticator.auth_headers or {})}
+        request = self.requests_session.prepare_request(
+            requests.Request(
+                method="POST",
+                url=self.url_base,
+                headers=headers,
+                json={"query": query, "variables": {"filter": date_filter}},
+            )
+        )
+        request.estimated_cost = self.count_query_cost
+        resp = self.request_decorator(self._request)(request, None)
+        count = (self.get_response_json(resp).get("data") or {}).get(self.count_query_name) or {}
+        if count.get("precision") != "EXACT":
+            return None
+        return count.get("count")
+
+    def plan_count_balanced_ranges(
+        self, start_date: datetime, end_date: datetime, partitions: int
+    ) -> Optional[list]:
+        """Return date ranges holding about the same number of records, if the stream can count them."""
+        if not self.count_query_name or partitions < 2:
+            return None
+        ranges = plan_balanced_ranges(
+            start_date,
+            end_date,
+            partitions,
+            self.count_records,
+            max_counts=self.count_queries_per_request * self.max_requests,
+            precision=self.min_split_interval,
+        )
+        if not ranges:
+            self.logger.info(
+                f"Could not count {self.name} records exactly, partitioning by time instead"
+            )
+        return ranges
+
+    def get_concurrent_params(self, context, max_requests: Optional[int] = None):
         """Generate list of date range parameters for concurrent requests.
         
         Args:
             context: Stream context
-            max_requests: Maximum number of concurrent requests
+            max_requests: Maximum number of concurrent requests, `self.max_requests` by default
             
         Returns:
             List of parameter dicts with start_date and end_date for each partition
         """            
+        max_requests = max_requests or self.max_requests
         start_date = self.start_date or self.get_starting_timestamp(context)
 
         # make a request to get the earliest rep key value
@@ -402,23 +623,30 @@ class shopifyGqlStream(shopifyStream):
             if earliest_rep_key and earliest_rep_key > start_date:
                 start_date = earliest_rep_key
             
-        # Get current time in UTC
-        now = datetime.now(pytz.UTC)
-        config_end_date = self.config.get("end_date")
-        upper_bound = min(now, parse(config_end_date)) if config_end_date else now
+        upper_bound = self.get_window_end()
+
+        balanced_ranges = self.plan_count_balanced_ranges(start_date, upper_bound, max_requests)
+        if balanced_ranges:
+            params = []
+            for range_start, range_end in balanced_ranges:
+                partition = copy.deepcopy(context) or {}
+                partition["date_range"] = {"start_date": range_start, "end_date": range_end}
+                params.append(partition)
+            self.logger.info(f"Count balanced concurrent params: {params}")
+            return params
 
         # Calculate time range between start_date and upper_bound
         total_time_range = upper_bound - start_date
 
         # Calculate time interval for each partition
-        interval = total_time_range / self.max_requests
+        interval = total_time_range / max_requests
 
         # ensure interval is at least one full day
         interval_days = math.ceil(interval.total_seconds() / (24 * 3600))
         interval = relativedelta(days=interval_days)
 
         params = []
-        for i in range(self.max_requests):
+        for i in range(max_requests):
             context = copy.deepcopy(context) or {}
             date_range = {}
             date_range["start_date"] = start_date + (interval * i)
@@ -431,11 +659,100 @@ class shopifyGqlStream(shopifyStream):
         self.logger.info(f"Concurrent params: {params}")
         return params
 
+    def get_window_end(self) -> datetime:
+        """Return the end of the sync window: now, or the configured end date if earlier."""
+        now = datetime.now(pytz.UTC)
+        config_end_date = self.config.get("end_date")
+        return min(now, parse(config_end_date)) if config_end_date else now
+
+    def start_partition_checkpoints(self, concurrent_params: list, context: Optional[dict]) -> None:
+        """Track the progress of freshly planned partitions."""
+        self.partition_checkpoints = PartitionCheckpoints(
+            self.get_starting_timestamp(context),
+            concurrent_params[-1]["date_range"]["end_date"],
+        )
+        for partition in concurrent_params:
+            self.partition_checkpoints.add(partition)
+
+    def resume_partitions(self, context: Optional[dict]) -> Optional[list]:
+        """Return the partitions of an interrupted concurrent sync, each resuming where it stopped.
+
+        Streams sorted by their replication key resume from the last replication
+        value written, the others from the cursor of their next page. Records
+        updated since the interrupted sync planned its window get a partition of
+        their own. Returns None when there is nothing to resume.
+        """
+        saved = self.get_context_state(context).get(self.checkpoint_state_key)
+        if not saved:
+            return None
+        checkpoints = PartitionCheckpoints.from_dict(saved)
+        if checkpoints.bookmark != self.get_starting_timestamp(context):
+            self.logger.info(f"Ignoring partition checkpoints of stream {self.name} saved for another bookmark")
+            return None
+
+        params = []
+        for partition in checkpoints.pending():
+            partition_context = copy.deepcopy(context) or {}
+            partition_context["partition_id"] = partition["partition_id"]
+            start_date = partition["start_date"]
+            if self.sort_key and partition["replication_value"]:
+                # filters are exclusive with a one second resolution, records of that second are synced again
+                start_date = max(start_date, parse(partition["replication_value"]) - timedelta(seconds=1))
+            elif partition["cursor"]:
+                partition_context["cursor"] = partition["cursor"]
+            partition_context["date_range"] = {"start_date": start_date, "end_date": partition["end_date"]}
+            params.append(partition_context)
+
+        upper_bound = self.get_window_end()
+        if upper_bound > checkpoints.window_end:
+            tail = copy.deepcopy(context) or {}
+            tail["date_range"] = {"start_date": checkpoints.window_end, "end_date": upper_bound}
+            checkpoints.add(tail)
+            checkpoints.window_end = upper_bound
+            params.append(tail)
+
+        self.partition_checkpoints = checkpoints
+        self.logger.info(f"Resuming {len(params)} partitions of stream {self.name}: {params}")
+        return params
+
+    def get_partition_progress(
+        self, context: dict, next_page_token: Optional[Any], records: list, finished: bool
+    ) -> Optional[PartitionProgress]:
+        """Return the progress marker of a partition after a page, None if it isn't checkpointed."""
+        if self.partition_checkpoints is None or "partition_id" not in context:
+            return None
+        return PartitionProgress(
+            context["partition_id"],
+            next_page_token,
+            records[-1][self.replication_key] if records else None,
+            finished,
+        )
+
+    def save_partition_progress(self, progress: PartitionProgress, context: Optional[dict]) -> None:
+        """Save the progress of a partition once every record queued before it was written."""
+        self.partition_checkpoints.advance(progress)
+        with sync_lock:
+            state = self.get_context_state(context)
+            state[self.checkpoint_state_key] = self.partition_checkpoints.to_dict()
+        if monotonic() - self._checkpoint_written_at >= self.checkpoint_interval:
+            self._write_state_message()
+            self._checkpoint_written_at = monotonic()
+
+    def clear_partition_checkpoints(self, context: Optional[dict]) -> None:
+        """Drop the checkpoints of a finished concurrent sync, its bookmark now covers them."""
+        self.partition_checkpoints = None
+        with sync_lock:
+            self.get_context_state(context).pop(self.checkpoint_state_key, None)
+
     @cached_property
     def max_requests(self):
         # flag for testing, so new request doesn't break previous tests
         if not self.config.get("apply_concurrency", True):
             return 1
+        if not self.cost_model.is_warm:
+            self.warm_up_cost_model()
+        if self.cost_budget.is_calibrated:
+            return self.get_max_requests(self.cost_budget.max_points)
         # check how many points are available
         query = """
             query {
@@ -465,7 +782,10 @@ class shopifyGqlStream(shopifyStream):
         resp = self._request(request, None)
         resp_json = resp.json()
         max_available = resp_json.get("extensions", {}).get("cost", {}).get("throttleStatus", {}).get("maximumAvailable", 2000)
+        return self.get_max_requests(max_available)
 
+    def get_max_requests(self, max_available: float) -> int:
+        """Return how many partitions to run concurrently for a bucket of `max_available` points."""
         # Calculate number of partitions based on available points
         max_requests = math.floor(max_available / 1000)
         # if max_requests is greater than 10, set max_concurrent_threads to 80% of restore rate to avoid throttling
@@ -474,7 +794,7 @@ class shopifyGqlStream(shopifyStream):
         self.logger.info(f"Max requests: {max_requests}")
         return max_requests
     
-    def safe_put(self, q: queue.Queue, record: dict):
+    def safe_put(self, q: ByteBudgetQueue, record: dict):
         while True:
             try:
                 q.put(record, timeout=1)
@@ -482,37 +802,120 @@ class shopifyGqlStream(shopifyStream):
             except queue.Full:
                 continue
     
-    def concurrent_request(self, context: dict, record_queue: queue.Queue):
-        try:
-            next_page_token = None
-            finished = False
-            decorated_request = self.request_decorator(self._request)
-
-            while not finished:
-                self.logger.info(f"[{threading.current_thread().name}] Fetching next page...")
-                prepared = self.prepare_request(context, next_page_token=next_page_token)
+    def split_partition(
+        self,
+        context: dict,
+        end_date: datetime,
+        records: list,
+        partitions: DateRangeQueue,
+    ) -> Optional[datetime]:
+        """Hand the second half of what is left of a partition to an idle worker.
+
+        Only streams sorted by their replication key can be split: the worker keeps
+        paginating its query and stops once records go past the returned date.
+        """
+        if not self.sort_key or not records or not partitions.wants_work():
+            return None
+        last_synced = parse(records[-1][self.replication_key])
+        split_date = split_point(last_synced, end_date, self.min_split_interval)
+        if not split_date:
+            return None
+        new_context = copy.deepcopy(context)
+        new_context["date_range"] = {"start_date": split_date, "end_date": end_date}
+        self.deduplicator.add_boundary(split_date)
+        if self.partition_checkpoints is not None:
+            self.partition_checkpoints.split(context, new_context)
+        partitions.put(new_context)
+        self.logger.info(
+            f"Splitting partition of stream {self.name} at {split_date}, "
+            f"{split_date} - {end_date} handed to an idle worker"
+        )
+        return split_date
+
+    def get_partition_end(self, context: dict) -> Optional[datetime]:
+        """Return the end of a date range partition, None for other partitions, e.g. locations."""
+        return (context.get("date_range") or {}).get("end_date")
+
+    def records_until(self, records: list, end_date: datetime) -> list:
+        """Return the records of a split partition that still belong to it."""
+        return [r for r in records if parse(r[self.replication_key]) <= end_date]
+
+    def concurrent_request(
+        self, context: dict, record_queue: ByteBudgetQueue, partitions: Optional[DateRangeQueue] = None
+    ):
+        next_page_token = context.get("cursor")
+        finished = False
+        pages = 0
+        end_date = self.get_partition_end(context)
+        decorated_request = self.request_decorator(self._request)
+
+        while not finished:
+            self.logger.info(f"[{threading.current_thread().name}] Fetching next page...")
+            prepared = self.prepare_request(context, next_page_token=next_page_token)
+            prepared.resumes_cursor = self.resumes_cursor(context, next_page_token)
+            try:
                 resp = decorated_request(prepared, context)
+            except GraphQLInvalidCursorError as e:
+                if not prepared.resumes_cursor:
+                    raise
+                self.restart_partition(context, e)
+                next_page_token = None
+                continue
 
-                # Log memory before processing response
-                self.log_memory_usage(f"[{threading.current_thread().name}] Memory before processing")
+            # Log memory before processing response
+            self.log_memory_usage(f"[{threading.current_thread().name}] Memory before processing")
 
-                for record in self.parse_response(resp):
-                    self.safe_put(record_queue, record)
+            records = list(self.parse_response(resp))
+            kept = self.records_until(records, end_date) if end_date != self.get_partition_end(context) else records
+            for record in kept:
+                self.safe_put(record_queue, record)
 
-                # Log memory after processing response
-                self.log_memory_usage(f"[{threading.current_thread().name}] Memory after processing")
+            # Log memory after processing response
+            self.log_memory_usage(f"[{threading.current_thread().name}] Memory after processing")
 
-                previous_token = copy.deepcopy(next_page_token)
-                next_page_token = self.get_next_page_token(resp, previous_token)
+            previous_token = copy.deepcopy(next_page_token)
+            next_page_token = self.get_next_page_token(resp, previous_token)
 
-                if next_page_token and next_page_token == previous_token:
-                    raise RuntimeError("Pagination loop detected")
+            if next_page_token and next_page_token == previous_token:
+                raise RuntimeError("Pagination loop detected")
 
-                finished = not next_page_token
+            pages += 1
+            if next_page_token and partitions and pages % self.split_after_pages == 0:
+                end_date = self.split_partition(context, end_date, kept, partitions) or end_date
+
+            # records past the end of a split partition belong to another worker
+            finished = not next_page_token or len(kept) < len(records)
+            progress = self.get_partition_progress(context, next_page_token, kept, finished)
+            if progress:
+                self.safe_put(record_queue, progress)
+
+    def resumes_cursor(self, context: dict, next_page_token: Optional[Any]) -> bool:
+        """Return whether a page request sends the cursor a partition resumed from."""
+        return next_page_token is not None and next_page_token == context.get("cursor")
+
+    def restart_partition(self, context: dict, error: GraphQLInvalidCursorError) -> None:
+        """Drop the resumed cursor Shopify rejected, restarting the partition from its start date."""
+        start_date = (context.get("date_range") or {}).get("start_date")
+        self.logger.warning(
+            f"{error}, restarting partition {context.get('partition_id')} of stream {self.name} "
+            f"from {start_date or 'its first page'}"
+        )
+        context.pop("cursor", None)
 
+    def partition_worker(self, partitions: DateRangeQueue, record_queue: ByteBudgetQueue):
+        """Sync partitions taken from the queue until every one of them is done."""
+        try:
+            while True:
+                context = partitions.get()
+                if context is None:
+                    break
+                try:
+                    self.concurrent_request(context, record_queue, partitions)
+                finally:
+                    partitions.done()
         except Exception as e:
             self.logger.exception(e)
-            record_queue.put(("ERROR", str(e)))
+            record_queue.put(("ERROR", e))
         finally:
             record_queue.put(None)
 
@@ -534,30 +937,148 @@ class shopifyGqlStream(shopifyStream):
             except queue.Empty:
                 break
 
-    def get_records(self, context: Optional[dict]) -> Iterable[dict]:
-        if self.config.get(f"sync_{self.name}_monthly") or self.max_requests < 2 or not self.replication_key:
-            yield from super().get_records(context)
+    async def concurrent_request_async(
+        self,
+        engine: AsyncRequestEngine,
+        context: dict,
+        emit: Callable,
+        partitions: Optional[DateRangeQueue] = None,
+    ) -> None:
+        """Fetch every page of a partition in the event loop, emitting its records."""
+        next_page_token = context.get("cursor")
+        finished = False
+        pages = 0
+        end_date = self.get_partition_end(context)
+        decorated_request = self.request_decorator(self._request_async)
+
+        while not finished:
+            # preparing the first page may warm up the cost model with a blocking request
+            prepared = await engine.run_in_thread(
+                self.prepare_request, context, next_page_token
+            )
+            prepared.resumes_cursor = self.resumes_cursor(context, next_page_token)
+            try:
+                resp = await decorated_request(engine, prepared, context)
+            except GraphQLInvalidCursorError as e:
+                if not prepared.resumes_cursor:
+                    raise
+                self.restart_partition(context, e)
+                next_page_token = None
+                continue
+
+            # parsing may page through overflowing connections with blocking requests
+            records = await engine.run_in_thread(lambda: list(self.parse_response(resp)))
+            kept = self.records_until(records, end_date) if end_date != self.get_partition_end(context) else records
+            for record in kept:
+                await emit(record)
+
+            previous_token = copy.deepcopy(next_page_token)
+            next_page_token = self.get_next_page_token(resp, previous_token)
+
+            if next_page_token and next_page_token == previous_token:
+                raise RuntimeError("Pagination loop detected")
+
+            pages += 1
+            if next_page_token and partitions and pages % self.split_after_pages == 0:
+                end_date = self.split_partition(context, end_date, kept, partitions) or end_date
+
+            finished = not next_page_token or len(kept) < len(records)
+            progress = self.get_partition_progress(context, next_page_token, kept, finished)
+            if progress:
+                await emit(progress)
+
+    async def partition_worker_async(
+        self, engine: AsyncRequestEngine, partitions: DateRangeQueue, emit: Callable
+    ) -> None:
+        """Sync partitions taken from the queue until every one of them is done."""
+        while True:
+            context = await partitions.get_async()
+            if context is None:
+                return
+            try:
+                await self.concurrent_request_async(engine, context, emit, partitions)
+            finally:
+                partitions.done()
+
+    def get_async_records(
+        self, concurrent_params: list, workers: int, context: Optional[dict]
+    ) -> Iterable[dict]:
+        """Sync partitions as coroutines of one event loop instead of threads."""
+        partitions = DateRangeQueue(concurrent_params)
+        engine = AsyncRequestEngine(
+            max_connections=self.config.get("async_max_connections") or DEFAULT_MAX_CONNECTIONS,
+            timeout=getattr(self, "timeout", None),
+            max_bytes=self.record_queue_bytes,
+        )
+        self.logger.info(f"Syncing stream {self.name} with {workers} async workers")
+        producers = [
+            functools.partial(self.partition_worker_async, engine, partitions)
+            for _ in range(workers)
+        ]
+        try:
+            for record in engine.iter_records(producers):
+                if isinstance(record, PartitionProgress):
+                    self.save_partition_progress(record, context)
+                    continue
+                transformed = self.post_process(record, context)
+                if transformed:
+                    yield transformed
+        finally:
+            self.logger.info(
+                f"[QUEUE] {self.name}: peak {engine.peak_bytes / 1024 / 1024:.1f}"
+                f"/{engine.max_bytes / 1024 / 1024:.0f} MB"
+            )
+            engine.close()
+
+    @property
+    def concurrent_workers(self) -> int:
+        """Return how many partitions are synced at the same time."""
+        if self.config.get("async_engine"):
+            return self.config.get("async_partitions") or self.max_requests
+        return self.max_requests
+
+    def get_concurrent_records(
+        self, concurrent_params: list, workers: int, context: Optional[dict]
+    ) -> Iterable[dict]:
+        """Sync partitions concurrently, with up to `workers` of them in flight."""
+        for partition in concurrent_params:
+            for boundary in (partition.get("date_range") or {}).values():
+                self.deduplicator.add_boundary(boundary)
+
+        if self.config.get("async_engine"):
+            yield from self.get_async_records(concurrent_params, workers, context)
             return
 
         self.log_memory_usage("Starting concurrent processing")
 
-        concurrent_params = self.get_concurrent_params(context)
-        record_queue = queue.Queue(maxsize=5_000)
+        partitions = DateRangeQueue(concurrent_params)
+        record_queue = ByteBudgetQueue(self.record_queue_bytes)
         finished_threads = 0
+        stats_logged_at = monotonic()
 
-        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_requests) as executor:
-            futures = [executor.submit(self.concurrent_request, param, record_queue) for param in concurrent_params]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(self.partition_worker, partitions, record_queue)
+                for _ in range(workers)
+            ]
 
-            while finished_threads < len(concurrent_params):
+            while finished_threads < len(futures):
                 self._check_futures_for_errors(futures)
+                if monotonic() - stats_logged_at >= self.record_queue_log_interval:
+                    self.log_record_queue(record_queue)
+                    stats_logged_at = monotonic()
                 try:
                     record = record_queue.get(timeout=1)
                     if record is None:
                         finished_threads += 1
                         self.log_memory_usage(f"[{threading.current_thread().name}] Worker finished")
+                    elif isinstance(record, PartitionProgress):
+                        self.save_partition_progress(record, context)
                     elif isinstance(record, tuple) and record[0] == "ERROR":
                         self.logger.exception(f"Error from thread: {record[1]}")
                         self._cancel_and_drain(futures, record_queue)
+                        if isinstance(record[1], GraphQLInvalidCursorError):
+                            raise record[1]
                         raise Exception(f"Thread error: {record[1]}")
                     else:
                         self.logger.debug(f"Yielding record: {record}")
@@ -568,13 +1089,114 @@ class shopifyGqlStream(shopifyStream):
                     self.logger.debug("Queue is empty, still waiting...")
                     continue
 
+        self.log_record_queue(record_queue)
         self.log_memory_usage("Finished concurrent processing")
 
+    @property
+    def record_queue_bytes(self) -> int:
+        """Return the memory budget of the queue between partition workers and the sync loop."""
+        return int((self.config.get("record_queue_mb") or self.record_queue_mb) * 1024 * 1024)
+
+    def log_record_queue(self, record_queue: ByteBudgetQueue) -> None:
+        stats = record_queue.stats()
+        self.logger.info(
+            f"[QUEUE] {self.name}: {stats['records']} records, "
+            f"{stats['bytes'] / 1024 / 1024:.1f}/{stats['max_bytes'] / 1024 / 1024:.0f} MB, "
+            f"peak {stats['peak_bytes'] / 1024 / 1024:.1f} MB, "
+            f"producers blocked for {stats['producer_blocked_seconds']}s"
+        )
+
+    @property
+    def saves_cursors(self) -> bool:
+        """Return whether sequential syncs save the cursor of their next page in the state."""
+        return (
+            bool(self.config.get("resume_cursors"))
+            and bool(self.replication_key)
+            and not self.config.get(f"sync_{self.name}_monthly")
+        )
+
+    def get_cursor_variables(self, context: Optional[dict]) -> dict:
+        """Return the query variables, such as the filter, a saved cursor is only valid for."""
+        params = self.get_url_params(context, None)
+        return {key: value for key, value in params.items() if key not in ("first", "after")}
+
+    def save_cursor(self, cursor: Optional[str], variables: dict) -> None:
+        """Save the cursor of the next page, once every record before it has been written."""
+        with sync_lock:
+            if cursor:
+                self.stream_state[self.cursor_state_key] = {"cursor": cursor, "variables": variables}
+            else:
+                self.stream_state.pop(self.cursor_state_key, None)
+
+    def request_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Request records page by page, resuming from a saved cursor with `resume_cursors`.
+
+        The bookmark of unsorted streams only moves at the end of the sync, so the
+        cursor of the next page is saved in the stream state, and sent with every
+        STATE message, to resume an interrupted sync where it stopped. A cursor is
+        only resumed for the query variables it was returned for, and a cursor
+        Shopify rejects restarts the sync from the first page.
+        """
+        if context is not None or not self.saves_cursors:
+            yield from super().request_records(context)
+            return
+
+        variables = self.get_cursor_variables(context)
+        saved = self.stream_state.get(self.cursor_state_key) or {}
+        resumed_cursor = saved.get("cursor") if saved.get("variables") == variables else None
+        if resumed_cursor:
+            self.logger.info(f"Resuming stream {self.name} from saved cursor {resumed_cursor}")
+
+        next_page_token = resumed_cursor
+        finished = False
+        decorated_request = self.request_decorator(self._request)
+        while not finished:
+            prepared = self.prepare_request(context, next_page_token=next_page_token)
+            # only a rejected resumed cursor raises GraphQLInvalidCursorError
+            prepared.resumes_cursor = bool(resumed_cursor) and next_page_token == resumed_cursor
+            try:
+                resp = decorated_request(prepared, context)
+            except GraphQLInvalidCursorError as e:
+                if not resumed_cursor or next_page_token != resumed_cursor:
+                    raise
+                self.logger.warning(f"{e}, syncing stream {self.name} from the first page")
+                next_page_token = resumed_cursor = None
+                continue
+            self.update_sync_costs(prepared, resp, context)
+            yield from self.parse_response(resp)
+
+            previous_token = copy.deepcopy(next_page_token)
+            next_page_token = self.get_next_page_token(resp, previous_token)
+            if next_page_token and next_page_token == previous_token:
+                raise RuntimeError("Pagination loop detected")
+            finished = not next_page_token
+            self.save_cursor(next_page_token, variables)
+
+    def get_records(self, context: Optional[dict]) -> Iterable[dict]:
+        if self.config.get(f"sync_{self.name}_monthly") or self.max_requests < 2 or not self.replication_key:
+            yield from super().get_records(context)
+            self.save_cost_parameters()
+            return
+
+        workers = self.concurrent_workers
+        concurrent_params = self.resume_partitions(context)
+        if concurrent_params is None:
+            concurrent_params = self.get_concurrent_params(context, workers)
+            self.start_partition_checkpoints(concurrent_params, context)
+        try:
+            yield from self.get_concurrent_records(concurrent_params, workers, context)
+        except GraphQLInvalidCursorError:
+            # saved cursors Shopify rejects would stop every later sync at the same place
+            self.clear_partition_checkpoints(context)
+            raise
+        self.clear_partition_checkpoints(context)
+        self.save_cost_parameters()
+
     def post_process(self, row: dict, context: Optional[dict] = None):
         start_date = self.get_starting_timestamp(context)
         if self.replication_key:
-            if parse(row[self.replication_key]) > start_date and row["id"] not in self.ids:
-                self.ids.add(row["id"])
+            updated_at = parse(row[self.replication_key])
+            if updated_at > start_date and not self.deduplicator.is_duplicate(row["id"], updated_at):
                 return row
         else:
             return row
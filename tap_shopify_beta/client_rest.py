@@ -2,19 +2,23 @@ from hotglue_singer_sdk.streams.rest import RESTStream
 from tap_shopify_beta.auth import ShopifyAuthenticator
 from hotglue_singer_sdk.authenticators import APIKeyAuthenticator
 import requests
-from typing import Any, Dict, Optional, Callable
+from typing import Any, Dict, Iterable, Optional, Callable
 from pendulum import parse
 import re
 import urllib3
 import backoff
 from hotglue_singer_sdk.exceptions import RetriableAPIError
+from hotglue_singer_sdk.helpers.jsonpath import extract_jsonpath
 import http.client
 
+from tap_shopify_beta import telemetry
+from tap_shopify_beta.cost_budget import RestCallLimiter, get_rest_call_limiter
+from tap_shopify_beta.scheduler import SerializedSyncMixin
 from tap_shopify_beta.shopify_dates import to_shopify_utc
 
 
 
-class shopifyRestStream(RESTStream):
+class shopifyRestStream(SerializedSyncMixin, RESTStream):
     """shopify stream class."""
 
     add_params = None
@@ -34,6 +38,57 @@ class shopifyRestStream(RESTStream):
         shop = self.get_shop_name()
         return f"https://{shop}.myshopify.com/admin/api/2021-07/"
     
+    @property
+    def call_limiter(self) -> RestCallLimiter:
+        """Return the REST call limiter shared by all streams of this shop."""
+        return get_rest_call_limiter(self.get_shop_name())
+
+    def _request(
+        self, prepared_request: requests.PreparedRequest, context: Optional[dict]
+    ) -> requests.Response:
+        """Send a request once the shared REST call bucket has room for it."""
+        limiter = self.call_limiter
+        budget_wait = limiter.reserve(1)
+        response = None
+        succeeded = False
+        try:
+            response = super()._request(prepared_request, context)
+            succeeded = True
+        except RetriableAPIError as e:
+            response = e.response
+            raise
+        finally:
+            if response is None:
+                limiter.settle(1)
+            else:
+                limiter.settle_response(1, response.status_code, response.headers)
+            if telemetry.is_enabled(self.config):
+                metrics = telemetry.build_request_metrics(
+                    self.name, context, response, page_size=self.limit, budget_wait=budget_wait
+                )
+                metrics["available_points"] = limiter.estimate_available()
+                if succeeded:
+                    response.request_metrics = metrics
+                else:
+                    telemetry.write_request_metrics(self, metrics)
+        return response
+
+    def get_response_json(self, response: requests.Response) -> Any:
+        """Return the decoded body of a response, decoding it only once."""
+        return telemetry.decode_response_json(response)
+
+    def parse_response(self, response: requests.Response) -> Iterable[dict]:
+        """Parse the response and write its request metrics once records are counted."""
+        response_json = self.get_response_json(response)
+        records = list(extract_jsonpath(self.records_jsonpath, input=response_json))
+        metrics = getattr(response, "request_metrics", None)
+        if metrics is not None:
+            # the body is decoded after the request metrics are built
+            metrics["json_decode_time"] = round(response.json_decode_time, 4)
+            metrics["records"] = len(records)
+            telemetry.write_request_metrics(self, metrics)
+        yield from records
+
     @property
     def authenticator(self) -> ShopifyAuthenticator:
         """Return a new authenticator object."""
@@ -0,0 +1,211 @@
+"""Process-wide rate limit budgets shared by every stream of a shop."""
+
+import asyncio
+import math
+import threading
+from time import monotonic
+from typing import Callable, Dict, Optional
+
+# Shopify's standard plan bucket, used until a response tells us the real values
+DEFAULT_MAX_POINTS = 1000
+DEFAULT_RESTORE_RATE = 50
+# Shopify rejects any single query whose requested cost is above this value
+MAX_SINGLE_QUERY_COST = 1000
+# REST Admin API bucket of standard plans: 40 calls, leaking 2 calls per second
+REST_DEFAULT_BUCKET_SIZE = 40
+REST_LEAK_SECONDS = 20
+# calls left free in the REST bucket so other apps of the shop keep some room
+REST_BUCKET_HEADROOM = 2
+
+
+class LeakyBucket:
+    """Thread-safe leaky bucket mirroring one of Shopify's rate limits.
+
+    Requests reserve their estimated cost before being sent and settle the
+    reservation once the response tells how much room is really left, so
+    concurrent workers never spend points the shop does not have.
+    """
+
+    def __init__(
+        self,
+        max_points: float = DEFAULT_MAX_POINTS,
+        restore_rate: float = DEFAULT_RESTORE_RATE,
+        clock: Callable[[], float] = monotonic,
+    ):
+        self.max_points = max_points
+        self.restore_rate = restore_rate
+        self.available = max_points
+        self.in_flight = 0
+        # whether max_points and restore_rate come from Shopify rather than the defaults
+        self.is_calibrated = False
+        self._paused_until = 0.0
+        self._clock = clock
+        self._updated_at = clock()
+        self._condition = threading.Condition()
+
+    def _refill(self) -> None:
+        now = self._clock()
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self.available = min(self.available + elapsed * self.restore_rate, self.max_points)
+
+    def estimate_available(self) -> float:
+        """Return the points we expect to be available right now."""
+        with self._condition:
+            self._refill()
+            return self.available
+
+    def clamp(self, cost: float) -> float:
+        """Return the cost actually reserved for a request, bounded by the bucket size."""
+        return max(0, min(cost, self.max_points))
+
+    def pause(self, seconds: float) -> None:
+        """Hold every reservation for `seconds`, e.g. when Shopify asks us to retry later."""
+        with self._condition:
+            self._paused_until = max(self._paused_until, self._clock() + seconds)
+
+    def calibrate(self, max_points: Optional[float], restore_rate: Optional[float]) -> None:
+        """Use bucket parameters learned on a previous run until Shopify reports its own."""
+        if not max_points or not restore_rate:
+            return
+        with self._condition:
+            if self.is_calibrated:
+                return
+            self._refill()
+            self.available = max(min(self.available + max_points - self.max_points, max_points), 0)
+            self.max_points = max_points
+            self.restore_rate = restore_rate
+            self.is_calibrated = True
+            self._condition.notify_all()
+
+    def _try_reserve(self, cost: float) -> float:
+        """Take ``cost`` points if available, else return the seconds to wait before retrying.
+
+        Must be called with the condition held.
+        """
+        self._refill()
+        paused = self._paused_until - self._clock()
+        if paused > 0:
+            return paused
+        if self.available >= cost:
+            self.available -= cost
+            self.in_flight += cost
+            return 0
+        missing = cost - self.available
+        return math.ceil(missing / self.restore_rate * 100) / 100
+
+    def reserve(self, cost: float) -> float:
+        """Block until ``cost`` points are available and take them.
+
+        Returns the number of seconds spent waiting for the budget.
+        """
+        cost = self.clamp(cost)
+        started = self._clock()
+        with self._condition:
+            while True:
+                wait = self._try_reserve(cost)
+                if not wait:
+                    return self._clock() - started
+                self._condition.wait(wait)
+
+    async def reserve_async(self, cost: float) -> float:
+        """Wait in the event loop until ``cost`` points are available and take them.
+
+        Shares the bucket with threads calling `reserve`, so both engines can run
+        against the same shop. Returns the number of seconds spent waiting.
+        """
+        cost = self.clamp(cost)
+        started = self._clock()
+        while True:
+            with self._condition:
+                wait = self._try_reserve(cost)
+            if not wait:
+                return self._clock() - started
+            await asyncio.sleep(wait)
+
+    def settle(self, reserved: float, throttle_status: Optional[dict] = None) -> None:
+        """Release a reservation and resync with the throttle status Shopify returned.
+
+        Without a throttle status (e.g. a network error) the reserved points are
+        given back, since we can't tell whether Shopify charged for the request.
+        """
+        reserved = self.clamp(reserved)
+        with self._condition:
+            self._refill()
+            self.in_flight = max(self.in_flight - reserved, 0)
+            if throttle_status:
+                self.is_calibrated = True
+                self.max_points = throttle_status.get("maximumAvailable") or self.max_points
+                self.restore_rate = throttle_status.get("restoreRate") or self.restore_rate
+                currently_available = throttle_status.get("currentlyAvailable")
+                if currently_available is not None:
+                    # points still reserved by other workers are not spent on Shopify's side yet
+                    self.available = max(currently_available - self.in_flight, 0)
+            else:
+                self.available = min(self.available + reserved, self.max_points)
+            self._condition.notify_all()
+
+
+class GraphQLCostBudget(LeakyBucket):
+    """Leaky bucket of GraphQL query cost points, synced with `extensions.cost.throttleStatus`."""
+
+    def clamp(self, cost: float) -> float:
+        """Return the cost actually reserved for a query, bounded by the single query limit."""
+        return max(0, min(cost, self.max_points, MAX_SINGLE_QUERY_COST))
+
+
+class RestCallLimiter(LeakyBucket):
+    """Leaky bucket of REST calls, synced with the `X-Shopify-Shop-Api-Call-Limit` header."""
+
+    def __init__(self, clock: Callable[[], float] = monotonic):
+        super().__init__(
+            max_points=REST_DEFAULT_BUCKET_SIZE - REST_BUCKET_HEADROOM,
+            restore_rate=REST_DEFAULT_BUCKET_SIZE / REST_LEAK_SECONDS,
+            clock=clock,
+        )
+
+    def settle_response(self, reserved: float, status_code: Optional[int], headers: dict) -> None:
+        """Release a reservation using the call limit and Retry-After headers of a response."""
+        throttle_status = None
+        call_limit = headers.get("X-Shopify-Shop-Api-Call-Limit")
+        if call_limit:
+            try:
+                used, bucket_size = (float(value) for value in call_limit.split("/"))
+            except ValueError:
+                used, bucket_size = None, None
+            if bucket_size:
+                throttle_status = {
+                    "maximumAvailable": bucket_size - REST_BUCKET_HEADROOM,
+                    "currentlyAvailable": max(bucket_size - used - REST_BUCKET_HEADROOM, 0),
+                    "restoreRate": bucket_size / REST_LEAK_SECONDS,
+                }
+        if status_code == 429 and not throttle_status:
+            throttle_status = {"currentlyAvailable": 0}
+        retry_after = headers.get("Retry-After")
+        if retry_after:
+            try:
+                self.pause(float(retry_after))
+            except ValueError:
+                pass
+        self.settle(reserved, throttle_status)
+
+
+_budgets: Dict[str, GraphQLCostBudget] = {}
+_rest_limiters: Dict[str, RestCallLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def get_cost_budget(shop: str) -> GraphQLCostBudget:
+    """Return the cost budget shared by every GraphQL request made to ``shop``."""
+    with _registry_lock:
+        if shop not in _budgets:
+            _budgets[shop] = GraphQLCostBudget()
+        return _budgets[shop]
+
+
+def get_rest_call_limiter(shop: str) -> RestCallLimiter:
+    """Return the call limiter shared by every REST request made to ``shop``."""
+    with _registry_lock:
+        if shop not in _rest_limiters:
+            _rest_limiters[shop] = RestCallLimiter()
+        return _rest_limiters[shop]
@@ -0,0 +1,146 @@
+"""Per-stream GraphQL cost and latency model used to pick page sizes."""
+
+import threading
+from typing import Optional
+
+from tap_shopify_beta.cost_budget import MAX_SINGLE_QUERY_COST
+
+# share of the single query limit used while page sizes rely on a static estimate only
+STATIC_ESTIMATE_HEADROOM = 0.8
+
+
+class QueryCostModel:
+    """Exponentially weighted history of what a stream's pages cost and how long they take.
+
+    Shopify charges the requested cost up front and refunds the difference with
+    the actual cost once the query ran, so both are tracked: the requested cost
+    bounds how big a page may be, the actual cost is what a page really takes
+    out of the bucket in the long run.
+    """
+
+    def __init__(self, alpha: float = 0.3):
+        self.alpha = alpha
+        self.requested_per_node: Optional[float] = None
+        self.actual_per_node: Optional[float] = None
+        self.pages = 0
+        self.is_estimate = False
+        # weighted means used to fit latency = base + per_node * nodes
+        self._mean_nodes = 0.0
+        self._mean_latency = 0.0
+        self._mean_nodes_sq = 0.0
+        self._mean_nodes_latency = 0.0
+        self._lock = threading.Lock()
+
+    def _ewma(self, previous: Optional[float], value: float) -> float:
+        if previous is None:
+            return value
+        return previous + self.alpha * (value - previous)
+
+    def seed(self, requested_per_node: float) -> None:
+        """Start from a static estimate of the requested cost per node."""
+        with self._lock:
+            if self.requested_per_node is None:
+                self.requested_per_node = requested_per_node
+                self.is_estimate = True
+
+    def restore(self, saved: dict) -> None:
+        """Start from the per-node costs learned on a previous run."""
+        with self._lock:
+            if saved.get("requested_per_node") is None:
+                return
+            self.requested_per_node = saved["requested_per_node"]
+            self.actual_per_node = saved.get("actual_per_node")
+            self.is_estimate = False
+
+    def to_dict(self) -> dict:
+        """Return the learned per-node costs, in the shape `restore` accepts."""
+        return {
+            "requested_per_node": self.requested_per_node,
+            "actual_per_node": self.actual_per_node,
+        }
+
+    def observe(
+        self,
+        nodes: int,
+        records: int,
+        requested_cost: Optional[float],
+        actual_cost: Optional[float],
+        latency: Optional[float] = None,
+    ) -> None:
+        """Record the outcome of a page that asked for `nodes` and returned `records`."""
+        nodes = max(nodes or 1, 1)
+        with self._lock:
+            if requested_cost is not None:
+                previous = None if self.is_estimate else self.requested_per_node
+                self.requested_per_node = self._ewma(previous, requested_cost / nodes)
+                self.is_estimate = False
+            if actual_cost is not None:
+                per_record = actual_cost / max(records, 1)
+                self.actual_per_node = self._ewma(self.actual_per_node, per_record)
+            if latency is not None:
+                weight = 1.0 if not self.pages else self.alpha
+                self._mean_nodes += weight * (nodes - self._mean_nodes)
+                self._mean_latency += weight * (latency - self._mean_latency)
+                self._mean_nodes_sq += weight * (nodes * nodes - self._mean_nodes_sq)
+                self._mean_nodes_latency += weight * (nodes * latency - self._mean_nodes_latency)
+            self.pages += 1
+
+    @property
+    def is_warm(self) -> bool:
+        """Return whether the model has seen enough to size pages."""
+        return self.requested_per_node is not None
+
+    @property
+    def actual_ratio(self) -> Optional[float]:
+        """Return the share of the requested cost Shopify ends up charging."""
+        if not self.requested_per_node or self.actual_per_node is None:
+            return None
+        return self.actual_per_node / self.requested_per_node
+
+    def requested_cost(self, nodes: int) -> Optional[float]:
+        """Return the requested cost expected for a query asking for `nodes`."""
+        if self.requested_per_node is None:
+            return None
+        return self.requested_per_node * max(nodes, 1)
+
+    def latency(self, nodes: int) -> float:
+        """Return the expected network latency in seconds for a page of `nodes`."""
+        variance = self._mean_nodes_sq - self._mean_nodes ** 2
+        per_node = 0.0
+        if variance > 1e-9:
+            covariance = self._mean_nodes_latency - self._mean_nodes * self._mean_latency
+            per_node = max(covariance / variance, 0.0)
+        base = max(self._mean_latency - per_node * self._mean_nodes, 0.0)
+        return base + per_node * nodes
+
+    def best_page_size(
+        self,
+        available: float,
+        max_points: float,
+        restore_rate: float,
+        max_page_size: int = 250,
+    ) -> int:
+        """Return the page size expected to yield the most records per second.
+
+        A page is limited by its requested cost, takes at least its latency or
+        the time to restore its actual cost, and has to wait for any requested
+        points the bucket does not hold yet.
+        """
+        if not self.is_warm:
+            return 1
+        limit = min(max_points, MAX_SINGLE_QUERY_COST)
+        if self.is_estimate:
+            limit *= STATIC_ESTIMATE_HEADROOM
+        actual_per_node = self.actual_per_node or self.requested_per_node
+        best_size, best_rate = 1, 0.0
+        for nodes in range(1, max_page_size + 1):
+            requested = self.requested_per_node * nodes
+            if requested > limit:
+                break
+            seconds = max(self.latency(nodes), actual_per_node * nodes / restore_rate)
+            seconds += max(requested - available, 0) / restore_rate
+            rate = nodes / max(seconds, 1e-3)
+            # on ties prefer bigger pages, they mean fewer requests for the same throughput
+            if rate >= best_rate * (1 - 1e-9):
+                best_size, best_rate = nodes, rate
+        return best_size
@@ -0,0 +1,122 @@
+"""Memory-compact de-duplication of records synced by concurrent partitions.
+
+Partitions cover disjoint `updated_at` ranges, so a record can only be
+fetched twice when its timestamp sits close to a partition boundary (e.g.
+Shopify's search index lagging behind the record). Only those records are
+tracked, by the numeric part of their GID, in sorted arrays of 64-bit ints
+instead of a set of GID strings.
+"""
+
+import bisect
+from array import array
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+
+# ids added to the unsorted buffer before it is sorted into a run
+BUFFER_SIZE = 4096
+
+
+class CompactIdSet:
+    """Set of non-negative integer ids stored as sorted runs of 64-bit ints.
+
+    New ids go to a small buffer, sorted into a run once full. Runs of similar
+    sizes are merged, so there are only a logarithmic number of them to search
+    and each id takes about 8 bytes instead of a Python object.
+    """
+
+    def __init__(self, buffer_size: int = BUFFER_SIZE):
+        self.buffer_size = buffer_size
+        self._buffer: Set[int] = set()
+        self._runs: List[array] = []
+
+    def __len__(self) -> int:
+        return len(self._buffer) + sum(len(run) for run in self._runs)
+
+    def __contains__(self, value: int) -> bool:
+        if value in self._buffer:
+            return True
+        for run in self._runs:
+            position = bisect.bisect_left(run, value)
+            if position < len(run) and run[position] == value:
+                return True
+        return False
+
+    def add(self, value: int) -> bool:
+        """Add an id, returning False if it was already in the set."""
+        if value in self:
+            return False
+        self._buffer.add(value)
+        if len(self._buffer) >= self.buffer_size:
+            self._flush()
+        return True
+
+    def _flush(self) -> None:
+        run = array("Q", sorted(self._buffer))
+        self._buffer = set()
+        while self._runs and len(self._runs[-1]) <= len(run):
+            run = array("Q", _merge(self._runs.pop(), run))
+        self._runs.append(run)
+
+
+def _merge(left: array, right: array):
+    i = j = 0
+    while i < len(left) and j < len(right):
+        if left[i] <= right[j]:
+            yield left[i]
+            i += 1
+        else:
+            yield right[j]
+            j += 1
+    yield from left[i:]
+    yield from right[j:]
+
+
+def numeric_id(record_id: str) -> Optional[int]:
+    """Return the numeric part of a GID such as `gid://shopify/Order/123`, if any."""
+    tail = record_id.rsplit("/", 1)[-1]
+    return int(tail) if tail.isdigit() else None
+
+
+class PartitionDeduplicator:
+    """Tell whether a record was already emitted by another partition.
+
+    Without any boundary every record is tracked.
+    """
+
+    def __init__(self, window: timedelta = timedelta(minutes=5)):
+        self.window = window
+        self._boundaries: List[datetime] = []
+        self._ids = CompactIdSet()
+        # ids that are not numeric GIDs, kept as they are
+        self._other_ids: Set[str] = set()
+
+    def add_boundary(self, boundary: datetime) -> None:
+        """Register the edge of a partition, records updated around it are tracked."""
+        position = bisect.bisect_left(self._boundaries, boundary)
+        if position == len(self._boundaries) or self._boundaries[position] != boundary:
+            self._boundaries.insert(position, boundary)
+
+    def is_tracked(self, updated_at: datetime) -> bool:
+        """Return whether a record updated at `updated_at` may be synced by two partitions."""
+        if not self._boundaries:
+            return True
+        position = bisect.bisect_left(self._boundaries, updated_at - self.window)
+        return (
+            position < len(self._boundaries)
+            and self._boundaries[position] <= updated_at + self.window
+        )
+
+    def is_duplicate(self, record_id: str, updated_at: datetime) -> bool:
+        """Return whether the record was already seen, remembering it otherwise."""
+        if not self.is_tracked(updated_at):
+            return False
+        value = numeric_id(record_id)
+        if value is None:
+            if record_id in self._other_ids:
+                return True
+            self._other_ids.add(record_id)
+            return False
+        return not self._ids.add(value)
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self._other_ids)
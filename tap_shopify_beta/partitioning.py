@@ -0,0 +1,145 @@
+"""Date range partitions shared by the workers of a concurrent sync.
+
+Partitions start as slices of the sync window holding about the same number
+of records when the stream can count them, equal time slices otherwise. Since
+slices are never perfectly balanced, workers take partitions from a
+`DateRangeQueue` and, while some of them sit idle, the busy ones give away the
+second half of what is left of their range so every worker keeps fetching
+until the end.
+"""
+
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Optional, Tuple
+
+
+class DateRangeQueue:
+    """Thread-safe queue of partition contexts, tracking idle and busy workers."""
+
+    def __init__(self, partitions: Iterable[dict]):
+        self._pending = deque(partitions)
+        self._busy = 0
+        self._idle = 0
+        self._condition = threading.Condition()
+
+    def _take(self) -> Optional[dict]:
+        if self._pending:
+            self._busy += 1
+            return self._pending.popleft()
+        return None
+
+    @property
+    def is_finished(self) -> bool:
+        """Return whether every partition, including split ones, has been synced."""
+        with self._condition:
+            return not self._pending and not self._busy
+
+    def get(self) -> Optional[dict]:
+        """Block until a partition is available, or return None once all are synced."""
+        with self._condition:
+            self._idle += 1
+            try:
+                while not self._pending and self._busy:
+                    self._condition.wait()
+                return self._take()
+            finally:
+                self._idle -= 1
+
+    async def get_async(self, poll_interval: float = 0.1) -> Optional[dict]:
+        """Wait in the event loop until a partition is available, or return None once all are synced."""
+        with self._condition:
+            self._idle += 1
+        try:
+            while True:
+                with self._condition:
+                    if self._pending or not self._busy:
+                        return self._take()
+                await asyncio.sleep(poll_interval)
+        finally:
+            with self._condition:
+                self._idle -= 1
+
+    def put(self, partition: dict) -> None:
+        """Hand a partition split off a busy worker to the next idle one."""
+        with self._condition:
+            self._pending.append(partition)
+            self._condition.notify()
+
+    def done(self) -> None:
+        """Mark the partition of the calling worker as synced."""
+        with self._condition:
+            self._busy -= 1
+            self._condition.notify_all()
+
+    def wants_work(self) -> bool:
+        """Return whether a worker is idle with no partition left to take."""
+        with self._condition:
+            return self._idle > 0 and not self._pending
+
+
+def split_point(
+    last_synced: datetime, end_date: datetime, min_interval: timedelta
+) -> Optional[datetime]:
+    """Return where to split the unsynced part of a range, or None if too small to split."""
+    remaining = end_date - last_synced
+    if remaining < min_interval * 2:
+        return None
+    # Shopify filters have a one second resolution
+    return (last_synced + remaining / 2).replace(microsecond=0)
+
+
+def plan_balanced_ranges(
+    start_date: datetime,
+    end_date: datetime,
+    partitions: int,
+    count: Callable[[datetime, datetime], Optional[int]],
+    max_counts: int = 16,
+    precision: timedelta = timedelta(hours=1),
+) -> Optional[List[Tuple[datetime, datetime]]]:
+    """Split a range into ranges holding about the same number of records.
+
+    ``count`` returns the records updated within a range, or None when it can't
+    tell exactly. It is called at most ``max_counts`` times, each time halving
+    the span of the timeline holding the most records, and the boundaries are
+    interpolated between the counted points. Returns None when the records
+    can't be counted.
+    """
+    total = count(start_date, end_date)
+    if not total:
+        return None
+    # records updated between the start date and each counted point
+    counted = [(start_date, 0), (end_date, total)]
+    for _ in range(max_counts - 1):
+        spans = [
+            (high_count - low_count, i)
+            for i, ((low, low_count), (high, high_count)) in enumerate(zip(counted, counted[1:]))
+            if high - low > precision
+        ]
+        if not spans:
+            break
+        records, i = max(spans)
+        if records * partitions <= total:
+            # every span already fits in a partition
+            break
+        low, high = counted[i][0], counted[i + 1][0]
+        middle = (low + (high - low) / 2).replace(microsecond=0)
+        middle_count = count(start_date, middle)
+        if middle_count is None:
+            return None
+        counted.insert(i + 1, (middle, middle_count))
+
+    boundaries = [start_date]
+    for i in range(1, partitions):
+        target = total * i / partitions
+        (low, low_count), (high, high_count) = next(
+            span for span in zip(counted, counted[1:]) if span[1][1] >= target
+        )
+        # assume the records of a span are spread evenly over it
+        boundary = low + (high - low) * ((target - low_count) / (high_count - low_count))
+        boundary = boundary.replace(microsecond=0)
+        if boundaries[-1] < boundary < end_date:
+            boundaries.append(boundary)
+    boundaries.append(end_date)
+    return list(zip(boundaries, boundaries[1:]))
@@ -0,0 +1,141 @@
+"""Static estimate of Shopify's requested GraphQL query cost.
+
+Shopify computes the requested cost of a query before running it: scalar and
+enum fields are free, every object costs 1 and a connection costs 2 plus its
+`first` argument times the cost of one node. Estimating it from the selection
+we generate lets the first request of a stream already use a sensible page size.
+"""
+
+import re
+from typing import List, NamedTuple, Optional, Tuple
+
+from tap_shopify_beta.cost_budget import MAX_SINGLE_QUERY_COST
+
+OBJECT_COST = 1
+CONNECTION_COST = 2
+
+_TOKEN_RE = re.compile(r"\.\.\.|[A-Za-z_]\w*|\([^)]*\)|[{}]")
+_FIRST_RE = re.compile(r"\b(?:first|last)\s*:\s*(\$?\w+)")
+
+
+class SelectionField(NamedTuple):
+    """A field of a GraphQL selection set."""
+
+    name: str
+    arguments: Optional[str]
+    children: Optional[List["SelectionField"]]
+
+
+def parse_selection(selection: str) -> List[SelectionField]:
+    """Parse a GraphQL selection set (without the outer braces) into fields."""
+    tokens = _TOKEN_RE.findall(selection)
+    fields, _ = _parse_fields(tokens, 0)
+    return fields
+
+
+def _parse_fields(tokens: List[str], position: int):
+    fields = []
+    while position < len(tokens) and tokens[position] != "}":
+        token = tokens[position]
+        position += 1
+        if token == "...":
+            # inline fragment: `... on Type { fields }` is merged into the parent
+            if position < len(tokens) and tokens[position] == "on":
+                position += 2
+            if position < len(tokens) and tokens[position] == "{":
+                children, position = _parse_fields(tokens, position + 1)
+                fields.extend(children)
+                position += 1
+            continue
+        if token == "{" or token.startswith("("):
+            continue
+        arguments = None
+        children = None
+        if position < len(tokens) and tokens[position].startswith("("):
+            arguments = tokens[position]
+            position += 1
+        if position < len(tokens) and tokens[position] == "{":
+            children, position = _parse_fields(tokens, position + 1)
+            position += 1
+        fields.append(SelectionField(token, arguments, children))
+    return fields, position
+
+
+def _page_size(arguments: Optional[str], variables: Optional[dict]) -> Optional[int]:
+    match = _FIRST_RE.search(arguments or "")
+    if not match:
+        return None
+    value = match.group(1)
+    if value.startswith("$"):
+        value = (variables or {}).get(value[1:])
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _connection_node(field: SelectionField) -> Optional[List[SelectionField]]:
+    for child in field.children or []:
+        if child.name == "nodes" and child.children is not None:
+            return child.children
+        if child.name == "edges":
+            for edge_child in child.children or []:
+                if edge_child.name == "node" and edge_child.children is not None:
+                    return edge_child.children
+    return None
+
+
+def fields_cost(fields: List[SelectionField], variables: Optional[dict] = None) -> int:
+    """Return the requested cost of a list of parsed fields."""
+    return sum(field_cost(field, variables) for field in fields)
+
+
+def field_cost(field: SelectionField, variables: Optional[dict] = None) -> int:
+    """Return the requested cost of a single parsed field."""
+    if field.children is None:
+        return 0
+    node = _connection_node(field)
+    if node is not None:
+        page_size = _page_size(field.arguments, variables) or 1
+        return CONNECTION_COST + page_size * (OBJECT_COST + fields_cost(node, variables))
+    return OBJECT_COST + fields_cost(field.children, variables)
+
+
+def estimate_selection_cost(selection: str, variables: Optional[dict] = None) -> int:
+    """Return the requested cost of the root selection of a query.
+
+    The query root is not an object, only the fields selected on it are counted,
+    e.g. the aliased `node(id:)` blocks of a query continuing connections.
+    """
+    return fields_cost(parse_selection(selection), variables)
+
+
+def estimate_node_cost(selection: str, variables: Optional[dict] = None) -> int:
+    """Return the requested cost of one object selecting `selection`."""
+    return OBJECT_COST + estimate_selection_cost(selection, variables)
+
+
+def most_expensive_fields(selection: str, limit: int = 3) -> List[tuple]:
+    """Return the top-level fields of `selection` that cost the most, as (name, cost)."""
+    costs = [(field.name, field_cost(field)) for field in parse_selection(selection)]
+    costs.sort(key=lambda item: item[1], reverse=True)
+    return [item for item in costs[:limit] if item[1]]
+
+
+def plan_alias_batch(
+    pending: int,
+    node_cost: int,
+    max_page_size: int,
+    min_page_size: int,
+    max_cost: int = MAX_SINGLE_QUERY_COST,
+) -> Tuple[int, int]:
+    """Return how many aliased `node(id:)` connections fit in one query, and their page size.
+
+    Each alias costs one object plus a connection of `page_size` nodes costing
+    `node_cost` each. As many aliases as possible are packed while keeping pages
+    of at least `min_page_size` nodes, and the remaining cost is spread over them.
+    """
+    alias_overhead = OBJECT_COST + CONNECTION_COST
+    aliases = max(min(pending, max_cost // (alias_overhead + min_page_size * node_cost)), 1)
+    page_size = (max_cost // aliases - alias_overhead) // node_cost
+    return aliases, max(min(page_size, max_page_size), 1)
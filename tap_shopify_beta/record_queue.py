@@ -0,0 +1,103 @@
+"""Queue of records bounded by memory rather than by record count.
+
+Records of different streams differ in size by orders of magnitude: an order
+with hundreds of line items weighs as much as thousands of variants. Bounding
+the queue between partition workers and the sync loop by an estimate of the
+bytes it holds keeps memory flat whatever the stream.
+"""
+
+import queue
+import threading
+from collections import deque
+from time import monotonic
+from typing import Any, Callable, Optional
+
+# rough CPython sizes, only used to compare records with each other and the budget
+_CONTAINER_OVERHEAD = 64
+_ITEM_OVERHEAD = 16
+_SCALAR_SIZE = 24
+
+
+def estimate_record_size(value: Any) -> int:
+    """Return an estimate of the memory held by a decoded JSON value, in bytes."""
+    if isinstance(value, dict):
+        return _CONTAINER_OVERHEAD + sum(
+            _ITEM_OVERHEAD + estimate_record_size(key) + estimate_record_size(item)
+            for key, item in value.items()
+        )
+    if isinstance(value, (list, tuple)):
+        return _CONTAINER_OVERHEAD + sum(
+            _ITEM_OVERHEAD + estimate_record_size(item) for item in value
+        )
+    if isinstance(value, str):
+        return _SCALAR_SIZE + len(value)
+    return _SCALAR_SIZE
+
+
+class ByteBudgetQueue:
+    """Thread-safe FIFO queue blocking producers once records exceed a byte budget.
+
+    Exposes the `put`/`get`/`get_nowait`/`empty` subset of `queue.Queue` used by
+    the partition workers. A record is always accepted by an empty queue, so a
+    record bigger than the whole budget can't block the sync.
+    """
+
+    def __init__(self, max_bytes: int, size_of: Callable[[Any], int] = estimate_record_size):
+        self.max_bytes = max_bytes
+        self.size_of = size_of
+        self.used_bytes = 0
+        self.peak_bytes = 0
+        self.blocked_seconds = 0.0
+        self._items = deque()
+        self._condition = threading.Condition()
+
+    def put(self, item: Any, timeout: Optional[float] = None) -> None:
+        """Add an item, waiting for room for at most ``timeout`` seconds (forever if None)."""
+        # markers such as the end of a worker are not records and are never held back
+        size = self.size_of(item) if isinstance(item, dict) else 0
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._condition:
+            started = monotonic()
+            while self._items and size and self.used_bytes + size > self.max_bytes:
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    self.blocked_seconds += monotonic() - started
+                    raise queue.Full
+                self._condition.wait(remaining)
+            self.blocked_seconds += monotonic() - started
+            self._items.append((item, size))
+            self.used_bytes += size
+            self.peak_bytes = max(self.peak_bytes, self.used_bytes)
+            self._condition.notify_all()
+
+    def get(self, timeout: Optional[float] = None) -> Any:
+        """Remove and return the oldest item, raising `queue.Empty` after ``timeout`` seconds."""
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._condition:
+            while not self._items:
+                remaining = None if deadline is None else deadline - monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise queue.Empty
+                self._condition.wait(remaining)
+            item, size = self._items.popleft()
+            self.used_bytes -= size
+            self._condition.notify_all()
+            return item
+
+    def get_nowait(self) -> Any:
+        return self.get(timeout=0)
+
+    def empty(self) -> bool:
+        with self._condition:
+            return not self._items
+
+    def stats(self) -> dict:
+        """Return the current occupancy of the queue."""
+        with self._condition:
+            return {
+                "records": len(self._items),
+                "bytes": self.used_bytes,
+                "max_bytes": self.max_bytes,
+                "peak_bytes": self.peak_bytes,
+                "producer_blocked_seconds": round(self.blocked_seconds, 2),
+            }
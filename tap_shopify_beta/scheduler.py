@@ -0,0 +1,225 @@
+"""Concurrent sync of independent top-level streams.
+
+Top-level streams share nothing but the shop's rate limits, which are already
+enforced process-wide by the cost budget and the REST call limiter, so they can
+be synced in parallel. Child streams are still synced by their parent.
+
+`SerializedSyncMixin` takes `sync_lock` around every Singer message a stream
+writes and around the SDK methods updating the shared tap state, including the
+finalization of its progress markers, so messages are never interleaved
+mid-line and STATE messages always serialize a consistent state. Stream code
+writing the state directly, like the saved cost parameters and partition
+checkpoints, must hold `sync_lock` too.
+"""
+
+import concurrent.futures
+import copy
+import logging
+import threading
+from typing import Iterable, List, Optional
+
+from hotglue_singer_sdk.exceptions import InvalidStreamSortException
+from hotglue_singer_sdk.helpers._state import (
+    finalize_state_progress_markers,
+    log_sort_error,
+)
+
+# held while a stream writes a Singer message or updates the tap state
+sync_lock = threading.RLock()
+
+
+class SerializedSyncMixin:
+    """Serialize the Singer output and state updates of streams synced in parallel."""
+
+    def _write_schema_message(self) -> None:
+        with sync_lock:
+            super()._write_schema_message()
+
+    def _write_record_message(self, record: dict) -> None:
+        with sync_lock:
+            super()._write_record_message(record)
+
+    def _write_state_message(self) -> None:
+        with sync_lock:
+            super()._write_state_message()
+
+    def get_context_state(self, context):
+        # creates the stream's or partition's bookmark on first access
+        with sync_lock:
+            return super().get_context_state(context)
+
+    def _write_replication_key_signpost(self, context, value) -> None:
+        with sync_lock:
+            super()._write_replication_key_signpost(context, value)
+
+    def _write_starting_replication_value(self, context) -> None:
+        with sync_lock:
+            super()._write_starting_replication_value(context)
+
+    def _increment_child_replication_state(self, *args, **kwargs):
+        with sync_lock:
+            return super()._increment_child_replication_state(*args, **kwargs)
+
+    def _increment_stream_state(self, *args, **kwargs):
+        with sync_lock:
+            return super()._increment_stream_state(*args, **kwargs)
+
+    def finalize_state_progress_markers(self, *args, **kwargs):
+        with sync_lock:
+            return super().finalize_state_progress_markers(*args, **kwargs)
+
+    def _sync_records(  # noqa C901  # too complex
+        self, context: Optional[dict] = None
+    ) -> None:
+        """Sync records, emitting RECORD and STATE messages.
+
+        Copy of the SDK's `Stream._sync_records` (hotglue-singer-sdk 1.0.51), which
+        finalizes the state with the module-level `finalize_state_progress_markers`,
+        finalizing it under `sync_lock` instead.
+        """
+        record_count = 0
+        current_context: Optional[dict]
+        context_list: Optional[List[dict]]
+        context_list = [context] if context is not None else self.partitions
+        selected = self.selected
+
+        for current_context in context_list or [{}]:
+            partition_record_count = 0
+            current_context = current_context or None
+            state = self.get_context_state(current_context)
+            state_partition_context = self._get_state_partition_context(current_context)
+            self._write_starting_replication_value(current_context)
+            child_context: Optional[dict] = (
+                None if current_context is None else copy.copy(current_context)
+            )
+
+            # check if any of the child streams have a parallelization limit greater than 1
+            child_threads = self.get_child_threads()
+            # if the number of child threads is greater than 1, we need to use threads
+            use_threads = False
+            if child_threads > 1:
+                use_threads = True
+            # create a list of child contexts to use for parallelization
+            paralellization_context = []
+
+            windows = self.get_paging_windows(current_context)
+            use_parallel_windows = len(windows) > 1 and self.parallelization_limit > 1
+
+            records_iter = (
+                self._sync_records_parallel(current_context, windows)
+                if use_parallel_windows
+                else self.get_records(current_context)
+            )
+
+            for record_result in records_iter:
+                if isinstance(record_result, tuple):
+                    # Tuple items should be the record and the child context
+                    record, child_context = record_result
+                else:
+                    record = record_result
+                child_context = copy.copy(
+                    self.get_child_context(record=record, context=child_context)
+                )
+                for key, val in (state_partition_context or {}).items():
+                    # Add state context to records if not already present
+                    if key not in record:
+                        record[key] = val
+
+                # Sync children, except when primary mapper filters out the record
+                if self.stream_maps[0].get_filter_result(record):
+                    # if use_threads is True and the number of child contexts in the list is less than the number of child threads, add the child context to the list
+                    if use_threads:
+                        # if the number of child contexts in the list is less than the number of child threads, add the child context to the list
+                        if len(paralellization_context) < child_threads:
+                            paralellization_context.append(child_context)
+                        # if the number of child contexts in the list is equal to the number of child threads, sync the children with threads
+                        if len(paralellization_context) == child_threads:
+                            self._sync_children_with_threads(paralellization_context)
+                            paralellization_context = []
+                    else:
+                        self._sync_children(child_context)
+                if selected:
+                    self._write_record_message(record)
+                    try:
+                        self._increment_stream_state(record, context=current_context)
+                    except InvalidStreamSortException as ex:
+                        log_sort_error(
+                            log_fn=self.logger.error,
+                            ex=ex,
+                            record_count=record_count + 1,
+                            partition_record_count=partition_record_count + 1,
+                            current_context=current_context,
+                            state_partition_context=state_partition_context,
+                            stream_name=self.name,
+                        )
+                        raise ex
+                elif self.has_selected_descendents and self.replication_key:
+                    try:
+                        self._increment_child_replication_state(
+                            record, context=current_context
+                        )
+                    except InvalidStreamSortException as ex:
+                        log_sort_error(
+                            log_fn=self.logger.error,
+                            ex=ex,
+                            record_count=record_count + 1,
+                            partition_record_count=partition_record_count + 1,
+                            current_context=current_context,
+                            state_partition_context=state_partition_context,
+                            stream_name=self.name,
+                        )
+                        raise ex
+
+                record_count += 1
+                partition_record_count += 1
+
+                if selected and record_count % self.STATE_MSG_FREQUENCY == 0:
+                    self._write_state_message()
+
+                if self._check_max_record_limit(record_count):
+                    return
+
+            # if parallelization context is not empty, sync the children with threads
+            if use_threads and len(paralellization_context) > 0:
+                self._sync_children_with_threads(paralellization_context)
+                paralellization_context = []
+            if current_context == state_partition_context:
+                # Finalize per-partition state only if 1:1 with context
+                with sync_lock:
+                    finalize_state_progress_markers(state)
+        if not context:
+            # Finalize total stream only if we have the full full context.
+            # Otherwise will be finalized by tap at end of sync.
+            with sync_lock:
+                finalize_state_progress_markers(self.stream_state)
+        self._write_record_count_log(record_count=record_count, context=context)
+        # Reset interim bookmarks before emitting final STATE message:
+        self._write_state_message()
+
+
+
+def sync_stream(stream) -> None:
+    """Sync a top-level stream and its children, then finalize its state."""
+    stream.sync()
+    stream.finalize_state_progress_markers()
+
+
+def sync_streams_in_parallel(streams: Iterable, max_workers: int, logger: logging.Logger) -> None:
+    """Sync streams with up to `max_workers` of them running at once.
+
+    The first failing stream stops the streams that have not started yet and
+    its error is raised once the running ones are done.
+    """
+    streams = list(streams)
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max_workers, thread_name_prefix="stream"
+    ) as executor:
+        futures = {executor.submit(sync_stream, stream): stream for stream in streams}
+        try:
+            for future in concurrent.futures.as_completed(futures):
+                future.result()
+                logger.info(f"Finished syncing stream '{futures[future].name}'.")
+        except Exception:
+            for future in futures:
+                future.cancel()
+            raise
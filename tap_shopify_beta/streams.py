@@ -11,6 +11,7 @@ from hotglue_singer_sdk import typing as th
 from tap_shopify_beta.client_bulk import shopifyBulkStream
 from tap_shopify_beta.client_gql import shopifyGqlStream, GqlChildStream
 from tap_shopify_beta.client_rest import shopifyRestStream
+from tap_shopify_beta.scheduler import sync_lock
 from tap_shopify_beta.shopify_dates import to_shopify_utc
 from tap_shopify_beta.types.order_app import OrderAppType
 from tap_shopify_beta.types.channel_information import ChannelInformationType
@@ -28,7 +29,9 @@ from tap_shopify_beta.types.money_v2 import MoneyV2Type
 from tap_shopify_beta.types.mailing_address import MailingAddressType
 from tap_shopify_beta.types.sms_marketing_consent import SmsMarketingConsentType
 from tap_shopify_beta.types.discount_allocations import DiscountAllocationsType
+import concurrent.futures
 import copy
+from collections import deque
 from hotglue_singer_sdk.helpers._state import (
     finalize_state_progress_markers,
     log_sort_error,
@@ -57,6 +60,7 @@ class ProductsStream(DynamicStream):
     primary_keys = ["id", "updatedAt"]
     query_name = "products"
     replication_key = "updatedAt"
+    count_query_name = "productsCount"
 
     schema = th.PropertiesList(
         th.Property("id", th.StringType),
@@ -209,14 +213,24 @@ class OrdersStream(DynamicStream):
     primary_keys = ["id", "updatedAt"]
     query_name = "orders"
     replication_key = "updatedAt"
+    count_query_name = "ordersCount"
     first_line_item = 25  # works as page_size for line_items
-    _after_line_item = None
+    # page size of line items continued outside of the orders query
+    line_items_page_size = 250
     last_replication_key = None
     sort_key = "UPDATED_AT"
     sort_key_type = "OrderSortKeys"
     child_context_keys = ["fulfillments", "refunds"]
 
     child_size = 140 # value based on the estimated query cost of child stream and the max allowed by the API (1000 per request)
+    # child batches queued per child stream before the parent waits for them
+    max_pending_child_batches = 2
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # one single-threaded executor and queue of child batches per child stream
+        self._child_executors: Dict[str, concurrent.futures.ThreadPoolExecutor] = {}
+        self._pending_child_batches: Dict[str, deque] = {}
 
     schema = th.PropertiesList(
         th.Property("id", th.StringType),
@@ -414,44 +428,22 @@ class OrdersStream(DynamicStream):
 
     bulk_process_fields = {"LineItem": "lineItems", "Metafield": "metafields"}
 
-    def has_next_page_line_items(self, record):
-        return record.get("lineItems", {}).get("pageInfo", {}).get("hasNextPage", False)
-
     def parse_response(self, response):
-        records = super().parse_response(response)
-        # iterate through lines pages
-        decorated_request = self.request_decorator(self._request)
+        if self.config.get("bulk", False):
+            yield from super().parse_response(response)
+            return
+
+        records = list(super().parse_response(response))
+        # continue orders with more line items than the first page, many orders per query
+        self._fetch_paginated_connections(
+            records, "lineItems", resource_type="Order", page_size=self.line_items_page_size
+        )
         for record in records:
-            if self.config.get("bulk", False):
-                yield record
-                continue
-
-            # paginate through lineItems for non bulk requests
-            context = {"order_id": record["id"].split("/")[-1]}
-            line_items_edges = record.get("lineItems", {}).get("edges", [])
-            has_next_page = self.has_next_page_line_items(record)
-            order_node = record
-            while has_next_page:
-                self.logger.info(f"Fetching additional line items for order {context['order_id']}")
-                self.after_line_item = "\"" + order_node.get("lineItems", {}).get("edges", [])[-1].get("cursor") + "\""
-                prepared_request = self.prepare_request(
-                    context, next_page_token=None
-                )
-                resp = decorated_request(prepared_request, context)
-                orders = resp.json().get('data', {}).get('orders',{}).get('edges',[])
-                if len(orders) > 1:
-                    self.logger.warning(f"More than one order with same id. id={context['order_id']} and orders={orders}")
-                order_node = orders[0].get('node')
-                line_items_edges.extend(order_node.get("lineItems", {}).get("edges", []))
-                has_next_page = self.has_next_page_line_items(order_node)
-            record["lineItems"] = [edge.get("node") for edge in line_items_edges]
-
             is_customer_id_selected = 'customerId' in self.selected_properties
             customer = record.get('customer')
             if is_customer_id_selected and isinstance(customer, dict):
                 record['customerId'] = customer.get('id')
 
-            self.after_line_item = None
             if record.get(self.replication_key):
                 self.last_replication_key = max(self.last_replication_key, record.get(self.replication_key)) if self.last_replication_key else record.get(self.replication_key)
             elif self.last_replication_key:
@@ -460,35 +452,9 @@ class OrdersStream(DynamicStream):
                 raise Exception(f"No replication key in this record and no replication key could be set for it. id={record['id']}. record={record}")
             yield record
 
-    @property
-    def after_line_item(self):
-        return self._after_line_item
-
-    @after_line_item.setter
-    def after_line_item(self, value):
-        self._after_line_item = value
-        # Clear the cached query when after_line_item changes
-        self._clear_cache()
-
-    def _clear_cache(self):
-        # Clear the cache of the query
-        if 'query' in self.__dict__:
-            del self.__dict__['query']
-
-    def get_url_params_line_items(self, context, next_page_token):
-        """Return a dictionary of values to be used in URL parameterization."""
-        params = {
-            "first": 1,
-            "filter": f"id:{context['order_id']}"
-        }
-        return params
-
     def prepare_request_payload(self, context, next_page_token):
         """Prepare the data payload for the GraphQL API request."""
-        if context and "order_id" in context:
-            params = self.get_url_params_line_items(context, next_page_token)
-        else:
-            params = self.get_url_params(context, next_page_token)
+        params = self.get_url_params(context, next_page_token)
         query = self.query.lstrip()
 
         if 'customerId' in query:
@@ -515,81 +481,132 @@ class OrdersStream(DynamicStream):
         context_list = [context] if context is not None else self.partitions
         selected = self.selected
 
-        for current_context in context_list or [{}]:
-            partition_record_count = 0
-            current_context = current_context or None
-            state = self.get_context_state(current_context)
-            state_partition_context = self._get_state_partition_context(current_context)
-            self._write_starting_replication_value(current_context)
-            child_context: Optional[dict] = (
-                None if current_context is None else copy.copy(current_context)
-            )
-            child_context_bulk = {key: [] for key in self.child_context_keys}
-            for record_result in self.get_records(current_context):
-                if isinstance(record_result, tuple):
-                    # Tuple items should be the record and the child context
-                    record, child_context = record_result
-                else:
-                    record = record_result
-                child_context = copy.copy(
-                    self.get_child_context(record=record, context=child_context)
+        try:
+            for current_context in context_list or [{}]:
+                partition_record_count = 0
+                current_context = current_context or None
+                state = self.get_context_state(current_context)
+                state_partition_context = self._get_state_partition_context(current_context)
+                self._write_starting_replication_value(current_context)
+                child_context: Optional[dict] = (
+                    None if current_context is None else copy.copy(current_context)
                 )
-                for key, val in (state_partition_context or {}).items():
-                    # Add state context to records if not already present
-                    if key not in record:
-                        record[key] = val
-
-                # Sync children, except when primary mapper filters out the record
-                if self.stream_maps[0].get_filter_result(record):
-                    # add id to child_context_bulk ids
-                    for key, value in child_context.items():                        
-                        child_context_bulk[key].extend(child_context[key]) if value else None
+                child_context_bulk = {key: [] for key in self.child_context_keys}
+                for record_result in self.get_records(current_context):
+                    if isinstance(record_result, tuple):
+                        # Tuple items should be the record and the child context
+                        record, child_context = record_result
+                    else:
+                        record = record_result
+                    child_context = copy.copy(
+                        self.get_child_context(record=record, context=child_context)
+                    )
+                    for key, val in (state_partition_context or {}).items():
+                        # Add state context to records if not already present
+                        if key not in record:
+                            record[key] = val
+
+                    # Sync children, except when primary mapper filters out the record
+                    if self.stream_maps[0].get_filter_result(record):
+                        # add id to child_context_bulk ids
+                        for key, value in child_context.items():                        
+                            child_context_bulk[key].extend(child_context[key]) if value else None
                 
-                if any(len(v) >= self.child_size for v in child_context_bulk.values()):
+                    if any(len(v) >= self.child_size for v in child_context_bulk.values()):
+                        self._sync_children(child_context_bulk)
+                        child_context_bulk = {key: [] for key in self.child_context_keys}
+
+                    self._check_max_record_limit(record_count)
+                    if selected:
+                        if (record_count - 1) % self.STATE_MSG_FREQUENCY == 0:
+                            self._write_state_message()
+                        self._write_record_message(record)
+                        try:
+                            self._increment_stream_state(record, context=current_context)
+                        except InvalidStreamSortException as ex:
+                            log_sort_error(
+                                log_fn=self.logger.error,
+                                ex=ex,
+                                record_count=record_count + 1,
+                                partition_record_count=partition_record_count + 1,
+                                current_context=current_context,
+                                state_partition_context=state_partition_context,
+                                stream_name=self.name,
+                            )
+                            raise ex
+
+                    record_count += 1
+                    partition_record_count += 1
+                # process remaining child context if len < 1000
+                if any(v != [] for v in child_context_bulk.values()):
                     self._sync_children(child_context_bulk)
-                    child_context_bulk = {key: [] for key in self.child_context_keys}
-
-                self._check_max_record_limit(record_count)
-                if selected:
-                    if (record_count - 1) % self.STATE_MSG_FREQUENCY == 0:
-                        self._write_state_message()
-                    self._write_record_message(record)
-                    try:
-                        self._increment_stream_state(record, context=current_context)
-                    except InvalidStreamSortException as ex:
-                        log_sort_error(
-                            log_fn=self.logger.error,
-                            ex=ex,
-                            record_count=record_count + 1,
-                            partition_record_count=partition_record_count + 1,
-                            current_context=current_context,
-                            state_partition_context=state_partition_context,
-                            stream_name=self.name,
-                        )
-                        raise ex
-
-                record_count += 1
-                partition_record_count += 1
-            # process remaining child context if len < 1000
-            if any(v != [] for v in child_context_bulk.values()):
-                self._sync_children(child_context_bulk)
-            #----
-            if current_context == state_partition_context:
-                # Finalize per-partition state only if 1:1 with context
-                finalize_state_progress_markers(state)
+                self._wait_for_children()
+                #----
+                if current_context == state_partition_context:
+                    # Finalize per-partition state only if 1:1 with context
+                    with sync_lock:
+                        finalize_state_progress_markers(state)
+        except BaseException:
+            # stop the queued child batches, so no child writes messages once the parent failed
+            self._cancel_children()
+            raise
         if not context:
             # Finalize total stream only if we have the full full context.
             # Otherwise will be finalized by tap at end of sync.
-            finalize_state_progress_markers(self.stream_state)
+            with sync_lock:
+                finalize_state_progress_markers(self.stream_state)
         self._write_record_count_log(record_count=record_count, context=context)
         # Reset interim bookmarks before emitting final STATE message:
         self._write_state_message()
     
     def _sync_children(self, child_context: dict) -> None:
+        """Queue a batch of child ids, so orders keep paging while children are fetched."""
         for child_stream in self.child_streams:
             # sync child stream if it is selected and has ids to fetch in child_context
             if (child_stream.selected or child_stream.has_selected_descendents) and child_context.get(child_stream.context_key):
-                child_stream.sync(context=child_context)
+                self._submit_child_batch(child_stream, child_context)
+
+    def _submit_child_batch(self, child_stream, child_context: dict) -> None:
+        """Sync a child batch in the background, one batch at a time per child stream.
+
+        Child streams write their messages and update the state through the
+        `sync_lock` guarded methods of `SerializedSyncMixin`, including the
+        finalization of their state in `_sync_records`.
+        """
+        pending = self._pending_child_batches.setdefault(child_stream.name, deque())
+        while len(pending) >= self.max_pending_child_batches:
+            pending.popleft().result()
+        if child_stream.name not in self._child_executors:
+            self._child_executors[child_stream.name] = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix=child_stream.name
+            )
+        executor = self._child_executors[child_stream.name]
+        pending.append(executor.submit(child_stream.sync, context=child_context))
+
+    def _wait_for_children(self) -> None:
+        """Wait for every queued child batch, raising the first child error."""
+        try:
+            for pending in self._pending_child_batches.values():
+                while pending:
+                    pending.popleft().result()
+        finally:
+            for pending in self._pending_child_batches.values():
+                for future in pending:
+                    future.cancel()
+                pending.clear()
+            for executor in self._child_executors.values():
+                executor.shutdown(wait=False)
+            self._child_executors.clear()
+
+    def _cancel_children(self) -> None:
+        """Drop the queued child batches and wait for the running ones to stop."""
+        for pending in self._pending_child_batches.values():
+            for future in pending:
+                future.cancel()
+            pending.clear()
+        for executor in self._child_executors.values():
+            executor.shutdown(wait=True)
+        self._child_executors.clear()
 
 
 class FulfillmentsStream(GqlChildStream):
@@ -909,6 +926,7 @@ class CustomersStream(DynamicStream):
     primary_keys = ["id"]
     query_name = "customers"
     replication_key = "updatedAt"
+    count_query_name = "customersCount"
     sort_key = "UPDATED_AT"
     sort_key_type = "CustomerSortKeys"
 
@@ -1011,30 +1029,118 @@ class InventoryLevelRestStream(shopifyRestStream):
         th.Property("admin_graphql_api_id", th.StringType),
     ).to_dict()
 
-    def get_child_context(self, record: dict, context: Optional[dict]) -> dict:
-        """Return a context dictionary for child streams."""
-        return {
-            "inventory_level_id": record["admin_graphql_api_id"],
-        }
-
 
 class InventoryLevelGqlStream(shopifyGqlStream):
-    """Define collections stream."""
+    """Define inventory levels stream, paging the inventory levels of every location."""
 
     name = "inventory_level_gql"
     primary_keys = ["id"]
     replication_key = None
-    parent_stream_type = InventoryLevelRestStream
-    query_name = "inventoryLevel"
-    is_list = False
+    query_name = "location"
+    json_path = "$.data.location.inventoryLevels.edges[*].node"
     # change needed as incoming and available fields are deprecated in inventory_level
     additional_arguments = {
         "quantities": '(names: ["available", "incoming"])'
     }
 
+    @cached_property
+    def query(self) -> str:
+        """Return the query paging the inventory levels of one location."""
+        query = """
+            query tapShopify($locationId: ID!, $first: Int, $after: String, $filter: String) {
+                location(id: $locationId) {
+                    inventoryLevels(first: $first, after: $after, query: $filter) {
+                        edges {
+                            cursor
+                            node {
+                                __selected_fields__
+                            }
+                        },
+                        pageInfo {
+                            hasNextPage
+                        }
+                    }
+                }
+            }
+        """
+        query = query.replace("__selected_fields__", self.gql_selected_fields)
+        for key, value in self.additional_arguments.items():
+            query = query.replace(key, f"{key} {value}")
+        return query
 
-    def single_object_params(self, context=None):
-        return {"id": context["inventory_level_id"]}
+    def get_location_contexts(self) -> List[dict]:
+        """Return one partition context per location of the shop, including inactive ones."""
+        query = """
+            query tapShopify($after: String) {
+                locations(first: 250, after: $after, includeInactive: true) {
+                    edges { cursor node { id } }
+                    pageInfo { hasNextPage }
+                }
+            }
+        """
+        decorated_request = self.request_decorator(self._request)
+        contexts = []
+        after = None
+        while True:
+            headers = {**self.http_headers, **(self.authenticator.auth_headers or {})}
+            request = self.requests_session.prepare_request(
+                requests.Request(
+                    method="POST",
+                    url=self.url_base,
+                    headers=headers,
+                    json={
+                        "query": " ".join(line.strip() for line in query.splitlines()),
+                        "variables": {"after": after},
+                    },
+                )
+            )
+            resp = decorated_request(request, None)
+            locations = self.get_response_json(resp).get("data", {}).get("locations", {})
+            edges = locations.get("edges", [])
+            contexts.extend({"location_id": edge["node"]["id"]} for edge in edges)
+            if not edges or not locations.get("pageInfo", {}).get("hasNextPage"):
+                return contexts
+            after = edges[-1]["cursor"]
+
+    def get_url_params(self, context, next_page_token):
+        params = {"locationId": context["location_id"], "first": self.page_size}
+        if next_page_token:
+            params["after"] = next_page_token
+        item_ids = self.config.get("inventory_item_ids")
+        if item_ids:
+            if not isinstance(item_ids, list):
+                item_ids = str(item_ids).split(",")
+            params["filter"] = " OR ".join(
+                f"inventory_item_id:{str(item_id).split('/')[-1].strip()}" for item_id in item_ids
+            )
+        return params
+
+    def get_next_page_token(self, response, previous_token):
+        inventory_levels = (
+            (self.get_response_json(response).get("data") or {})
+            .get("location", {})
+            .get("inventoryLevels", {})
+        )
+        edges = inventory_levels.get("edges") or []
+        if edges and inventory_levels.get("pageInfo", {}).get("hasNextPage"):
+            return edges[-1]["cursor"]
+        return None
+
+    def get_records(self, context: Optional[dict]) -> Iterable[dict]:
+        """Page the inventory levels of every location, several locations at a time."""
+        if context and context.get("location_id"):
+            # a single location, paged like any other stream
+            yield from super().get_records(context)
+            return
+
+        locations = self.get_location_contexts()
+        workers = min(self.concurrent_workers, len(locations))
+        if workers < 2:
+            for location in locations:
+                yield from self.get_records(location)
+        else:
+            yield from self.get_concurrent_records(locations, workers, context)
+            self.save_cost_parameters()
 
     schema = th.PropertiesList(
         th.Property("id", th.StringType),
@@ -1340,7 +1446,7 @@ class PayoutsStream(shopifyGqlStream):
         self, response: requests.Response, previous_token: Optional[Any]
     ) -> Any:
         """Return token identifying next page or None if all records have been read."""
-        response_json = response.json()
+        response_json = self.get_response_json(response)
         has_next_json_path = f"$.data.shopifyPaymentsAccount.{self.query_name}.pageInfo.hasNextPage"
         has_next = next(extract_jsonpath(has_next_json_path, response_json))
         if has_next:
@@ -1368,13 +1474,15 @@ class PayoutsStream(shopifyGqlStream):
     
     def parse_response(self, response: requests.Response) -> Iterable[dict]:
         """Parse the response and return a list of records."""
-        response_json = response.json()
+        response_json = self.get_response_json(response)
         
         errors = response_json.get("errors")
         if errors is not None:
             raise Exception(errors)
 
         account_id = response_json.get("data").get("shopifyPaymentsAccount").get("id")
-        for record in extract_jsonpath(self.json_path, response_json):
+        records = list(extract_jsonpath(self.json_path, response_json))
+        self.write_request_metrics(response, len(records))
+        for record in records:
             record["shopifyPaymentsAccountId"] = account_id
             yield record
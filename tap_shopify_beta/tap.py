@@ -5,6 +5,7 @@ from typing import List
 from hotglue_singer_sdk import Stream, Tap
 from hotglue_singer_sdk import typing as th
 
+from tap_shopify_beta.scheduler import sync_streams_in_parallel
 from tap_shopify_beta.streams import (
     CollectionsStream,
     CustomersStream,
@@ -78,12 +79,111 @@ class TapshopifyBeta(Tap):
             th.DateTimeType,
             description="The latest record date to sync (inclusive)",
         ),
+        th.Property(
+            "request_metrics",
+            th.BooleanType,
+            description="Emit a METRIC log line with cost, wait and latency details for every request",
+        ),
+        th.Property(
+            "request_metrics_file",
+            th.StringType,
+            description="Path of a JSON lines file receiving the metrics of every request",
+        ),
+        th.Property(
+            "async_engine",
+            th.BooleanType,
+            description="Sync concurrent GraphQL partitions as coroutines of one event loop instead of threads",
+        ),
+        th.Property(
+            "async_partitions",
+            th.IntegerType,
+            description="Number of date partitions synced at once by the async engine",
+        ),
+        th.Property(
+            "async_max_connections",
+            th.IntegerType,
+            description="Size of the connection pool used by the async engine",
+        ),
+        th.Property(
+            "max_parallel_streams",
+            th.IntegerType,
+            description="Number of independent top-level streams synced at the same time",
+        ),
+        th.Property(
+            "bulk_max_operations",
+            th.IntegerType,
+            description="Number of bulk query operations run at once for the shop, across streams synced in parallel",
+        ),
+        th.Property(
+            "bulk_min_window_hours",
+            th.NumberType,
+            description="Shortest updated_at window of a bulk operation, in hours (1 by default)",
+        ),
+        th.Property(
+            "bulk_max_window_days",
+            th.NumberType,
+            description="Longest updated_at window of a bulk operation, in days (30 by default)",
+        ),
+        th.Property(
+            "bulk_spool_dir",
+            th.StringType,
+            description="Directory bulk results are downloaded to before being parsed, the system temporary directory by default",
+        ),
+        th.Property(
+            "bulk_mmap",
+            th.BooleanType,
+            description="Read downloaded bulk results through a memory map",
+        ),
+        th.Property(
+            "resume_cursors",
+            th.BooleanType,
+            description="Save the cursor of the next page in the state, so an interrupted sequential sync resumes where it stopped",
+        ),
+        th.Property(
+            "record_queue_mb",
+            th.NumberType,
+            description="Memory budget, in MB, of the records queued by concurrent partition workers",
+        ),
     ).to_dict()
 
     def discover_streams(self) -> List[Stream]:
         """Return a list of discovered streams."""
         return [stream_class(tap=self) for stream_class in STREAM_TYPES]
 
+    def sync_all(self) -> None:
+        """Sync all streams, running independent top-level streams in parallel if configured.
+
+        The SDK marks `Tap.sync_all` as `typing.final`, which only guards static
+        type checks. Sequential syncs still run the SDK's own method, and the
+        parallel path below mirrors it as of hotglue-singer-sdk 1.0.51, only
+        syncing the top-level streams with `sync_streams_in_parallel`.
+        """
+        max_parallel_streams = self.config.get("max_parallel_streams") or 1
+        if max_parallel_streams < 2:
+            super().sync_all()
+            return
+
+        self._prepare_state_and_replication_methods()
+        top_level_streams = []
+        for stream in self.streams.values():
+            # create every bookmark upfront, so the state keeps its shape while streams run
+            stream.get_context_state(None)
+            if not stream.selected and not stream.has_selected_descendents:
+                self.logger.info(f"Skipping deselected stream '{stream.name}'.")
+                continue
+            if stream.parent_stream_type:
+                # child streams are synced by their parent
+                continue
+            top_level_streams.append(stream)
+
+        self.logger.info(
+            f"Syncing {len(top_level_streams)} streams, up to {max_parallel_streams} at a time"
+        )
+        sync_streams_in_parallel(top_level_streams, max_parallel_streams, self.logger)
+
+        # log the costs of every stream, including the child streams skipped above
+        for stream in self.streams.values():
+            stream.log_sync_costs()
 
 if __name__ == "__main__":
     TapshopifyBeta.cli()
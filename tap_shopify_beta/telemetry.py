@@ -0,0 +1,130 @@
+"""Per-request telemetry, telling whether a sync is throttle, network or CPU bound.
+
+Every request made by a stream produces one metrics dict with where the time
+went: waiting for the shared rate limit budget, on the network and decoding
+the JSON body. Metrics are written as Singer METRIC log lines when the
+`request_metrics` setting is enabled and appended to the JSON lines file set
+in `request_metrics_file`.
+"""
+
+import atexit
+import json
+import threading
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import Any, Dict, Optional
+
+import requests
+
+
+class RequestMetricsWriter:
+    """Append request metrics to a JSON lines file, one line per request."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", buffering=1)
+
+    def write(self, metrics: dict) -> None:
+        line = json.dumps(metrics, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+_writers: Dict[str, RequestMetricsWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_metrics_writer(path: str) -> RequestMetricsWriter:
+    """Return the writer shared by every stream appending metrics to `path`."""
+    with _writers_lock:
+        if path not in _writers:
+            _writers[path] = RequestMetricsWriter(path)
+        return _writers[path]
+
+
+def close_metrics_writers() -> None:
+    """Close every metrics file, once the sync is done."""
+    with _writers_lock:
+        for writer in _writers.values():
+            writer.close()
+        _writers.clear()
+
+
+# the tap runs a single sync per process, so its metrics files are closed on exit
+atexit.register(close_metrics_writers)
+
+
+def is_enabled(config: dict) -> bool:
+    """Return whether request metrics are requested by the tap config."""
+    return bool(config.get("request_metrics") or config.get("request_metrics_file"))
+
+
+def decode_response_json(response: requests.Response) -> Any:
+    """Return the decoded body of a response, decoding it once and timing the decode."""
+    if not hasattr(response, "decoded_json"):
+        started = perf_counter()
+        response.decoded_json = response.json()
+        response.json_decode_time = perf_counter() - started
+    return response.decoded_json
+
+
+def build_request_metrics(
+    stream_name: str,
+    context: Optional[dict],
+    response: Optional[requests.Response],
+    page_size: Optional[int] = None,
+    budget_wait: float = 0.0,
+) -> dict:
+    """Return the metrics of a request known once its response came back.
+
+    Cost and record counts are filled in later by the stream, once the body
+    has been parsed.
+    """
+    metrics = {
+        "stream": stream_name,
+        "partition": context or None,
+        "page_size": page_size,
+        "status_code": None,
+        "requested_cost": None,
+        "actual_cost": None,
+        "available_points": None,
+        "budget_wait": round(budget_wait, 4),
+        "latency": None,
+        "json_decode_time": None,
+        "records": 0,
+        "bytes": None,
+    }
+    if response is not None:
+        metrics["status_code"] = response.status_code
+        metrics["latency"] = response.elapsed.total_seconds()
+        metrics["bytes"] = len(response.content or b"")
+        decode_time = getattr(response, "json_decode_time", None)
+        if decode_time is not None:
+            metrics["json_decode_time"] = round(decode_time, 4)
+    return metrics
+
+
+def write_request_metrics(stream, metrics: dict) -> None:
+    """Emit a request's metrics as a METRIC log line and/or a JSON lines entry."""
+    config = stream.config
+    if config.get("request_metrics"):
+        tags = {key: value for key, value in metrics.items() if key != "latency"}
+        stream._write_metric_log(
+            {
+                "type": "timer",
+                "metric": "shopify_request",
+                "value": metrics["latency"],
+                "tags": tags,
+            },
+            extra_tags=None,
+        )
+    path = config.get("request_metrics_file")
+    if path:
+        get_metrics_writer(path).write(
+            {"time": datetime.now(timezone.utc).isoformat(), **metrics}
+        )
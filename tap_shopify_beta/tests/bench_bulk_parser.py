@@ -0,0 +1,106 @@
+"""Micro-benchmark of the bulk result parser on a synthetic JSONL file.
+
+Not collected by pytest, run it with::
+
+    python -m tap_shopify_beta.tests.bench_bulk_parser --lines 2000000
+"""
+
+import argparse
+import json
+import os
+import re
+import tempfile
+from time import perf_counter
+
+from tap_shopify_beta import bulk_parser
+from tap_shopify_beta.bulk_download import iter_spooled_lines
+
+CHILD_FIELDS = {"LineItem": "lineItems", "Metafield": "metafields"}
+
+
+def write_result(path: str, lines: int, line_items: int = 5) -> None:
+    """Write orders followed by their line items and one metafield, ``lines`` lines in all."""
+    written = 0
+    order = 0
+    with open(path, "w") as f:
+        while written < lines:
+            order += 1
+            order_id = f"gid://shopify/Order/{order}"
+            f.write(json.dumps({
+                "id": order_id,
+                "name": f"#{order}",
+                "updatedAt": "2024-01-01T00:00:00Z",
+                "totalPriceSet": {"shopMoney": {"amount": "10.00", "currencyCode": "USD"}},
+            }) + "\n")
+            for item in range(line_items):
+                f.write(json.dumps({
+                    "id": f"gid://shopify/LineItem/{order * 100 + item}",
+                    "sku": f"SKU-{item}",
+                    "quantity": item + 1,
+                    "__parentId": order_id,
+                }) + "\n")
+            f.write(json.dumps({
+                "id": f"gid://shopify/Metafield/{order}",
+                "key": "note",
+                "value": "gift",
+                "__parentId": order_id,
+            }) + "\n")
+            written += line_items + 2
+
+
+def legacy_records(lines):
+    """The previous parser: simplejson, a regex per child line and wrappers built line by line."""
+    import simplejson
+
+    parent_line = None
+    for line in lines:
+        line = simplejson.loads(line)
+        if parent_line and not line.get("__parentId"):
+            yield parent_line
+            parent_line = None
+        if not parent_line and not line.get("__parentId"):
+            parent_line = line
+        if line.get("__parentId"):
+            match = re.search(r"gid://shopify/([^/]+)/", line["id"])
+            line_type = match.group(1) if match else None
+            if line_type in CHILD_FIELDS:
+                field = CHILD_FIELDS[line_type]
+                if not parent_line.get(field):
+                    parent_line[field] = {"edges": [{"node": line}]}
+                else:
+                    parent_line[field]["edges"].append({"node": line})
+    if parent_line:
+        yield parent_line
+
+
+def measure(name: str, parse, path: str, lines: int) -> None:
+    started = perf_counter()
+    records = sum(1 for _ in parse(iter_spooled_lines(path)))
+    elapsed = perf_counter() - started
+    print(f"{name:<10} {records} records in {elapsed:.2f}s, {lines / elapsed:,.0f} lines/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=2_000_000)
+    args = parser.parse_args()
+
+    fd, path = tempfile.mkstemp(suffix=".jsonl")
+    os.close(fd)
+    try:
+        write_result(path, args.lines)
+        measure("legacy", legacy_records, path, args.lines)
+        if bulk_parser.orjson is not None:
+            measure("orjson", lambda lines: bulk_parser.iter_bulk_records(lines, CHILD_FIELDS), path, args.lines)
+        default_loads = bulk_parser.loads
+        bulk_parser.loads = bulk_parser.stdlib_loads
+        try:
+            measure("stdlib", lambda lines: bulk_parser.iter_bulk_records(lines, CHILD_FIELDS), path, args.lines)
+        finally:
+            bulk_parser.loads = default_loads
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Shared fixtures of the tap tests."""
+
+import importlib
+import json
+import logging
+import os
+from datetime import timedelta
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+
+@pytest.fixture(scope="session")
+def streams(tmp_path_factory):
+    """Return the streams module, which reads the tap config when it is imported."""
+    config_dir = tmp_path_factory.mktemp("config")
+    (config_dir / "config.json").write_text(json.dumps({}))
+    cwd = os.getcwd()
+    os.chdir(config_dir)
+    try:
+        return importlib.import_module("tap_shopify_beta.streams")
+    finally:
+        os.chdir(cwd)
+
+
+def build_response(payload, status_code=200, elapsed=0.1, request=None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(payload).encode()
+    response.elapsed = timedelta(seconds=elapsed)
+    response.request = request
+    return response
+
+
+class FakeSession(requests.Session):
+    """Answer every request with the JSON payload `respond` returns for it."""
+
+    def __init__(self, respond):
+        super().__init__()
+        self.respond = respond
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        return build_response(self.respond(request), request=request)
+
+    @property
+    def payloads(self) -> list:
+        return [json.loads(request.body) for request in self.requests]
+
+
+class StubAuthenticator:
+    auth_headers = {}
+    auth_params = {}
+
+    def authenticate_request(self, request):
+        return request
+
+
+@pytest.fixture
+def make_response():
+    """Return a factory of responses with a JSON body, as returned by Shopify."""
+    return build_response
+
+
+@pytest.fixture
+def fake_session():
+    """Return a factory of sessions answering requests with `respond(request)`."""
+    return FakeSession
+
+
+@pytest.fixture
+def make_stream():
+    """Return a factory of streams sending their requests to `respond`, without a tap."""
+
+    def make(stream_class, respond=None, config=None):
+        stream_class = type(stream_class.__name__, (stream_class,), {"authenticator": StubAuthenticator()})
+        tap = SimpleNamespace(
+            name="tap-shopify",
+            logger=logging.getLogger("test"),
+            config={"shop": "test-shop", **(config or {})},
+            state={},
+        )
+        stream = stream_class(tap=tap)
+        stream._requests_session = FakeSession(respond)
+        return stream
+
+    return make
@@ -0,0 +1,103 @@
+"""Tests for the asyncio request engine."""
+
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from tap_shopify_beta.async_engine import AsyncRequestEngine
+from tap_shopify_beta.client_gql import shopifyGqlStream
+
+
+def make_producer(name, count, events, fail=False):
+    async def producer(emit):
+        for i in range(count):
+            events.append(f"{name}{i}")
+            await emit((name, i))
+            await asyncio.sleep(0)
+        if fail:
+            raise ValueError(f"{name} failed")
+
+    return producer
+
+
+def test_iter_records_interleaves_producers():
+    engine = AsyncRequestEngine()
+    events = []
+    producers = [make_producer("a", 3, events), make_producer("b", 3, events)]
+
+    try:
+        records = list(engine.iter_records(producers))
+    finally:
+        engine.close()
+
+    assert sorted(records) == [("a", 0), ("a", 1), ("a", 2), ("b", 0), ("b", 1), ("b", 2)]
+    # both partitions make progress before either one finishes
+    assert events.index("b0") < events.index("a2")
+
+
+def test_iter_records_raises_the_first_producer_error():
+    engine = AsyncRequestEngine()
+    events = []
+    producers = [make_producer("a", 1, events, fail=True), make_producer("b", 100, events)]
+
+    try:
+        with pytest.raises(ValueError, match="a failed"):
+            list(engine.iter_records(producers))
+    finally:
+        engine.close()
+
+
+def test_full_queue_holds_producers_back():
+    engine = AsyncRequestEngine(max_bytes=2, size_of=lambda record: 1)
+    events = []
+
+    try:
+        records = engine.iter_records([make_producer("a", 10, events)])
+        next(records)
+        assert len(events) <= 4
+        records.close()
+    finally:
+        engine.close()
+
+
+class ThreadRecordingStream(shopifyGqlStream):
+    name = "orders"
+    query_name = "orders"
+    schema = {"properties": {"id": {"type": "string"}}}
+
+    def prepare_request(self, context, next_page_token):
+        self.threads["prepare"] = threading.current_thread()
+        return SimpleNamespace()
+
+    def request_decorator(self, func):
+        return func
+
+    async def _request_async(self, engine, prepared_request, context):
+        self.threads["loop"] = threading.current_thread()
+        return SimpleNamespace()
+
+    def parse_response(self, response):
+        return iter([{"id": "1"}])
+
+    def get_next_page_token(self, response, previous_token):
+        return None
+
+
+def test_pages_are_prepared_off_the_event_loop(make_stream):
+    stream = make_stream(ThreadRecordingStream)
+    stream.threads = {}
+    engine = AsyncRequestEngine()
+    emitted = []
+
+    async def emit(item):
+        emitted.append(item)
+
+    try:
+        asyncio.run(stream.concurrent_request_async(engine, {}, emit))
+    finally:
+        engine.close()
+
+    assert emitted[0] == {"id": "1"}
+    assert stream.threads["prepare"] is not stream.threads["loop"]
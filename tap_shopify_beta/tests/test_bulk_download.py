@@ -0,0 +1,91 @@
+"""Tests for downloading bulk results to a spool file."""
+
+import base64
+import hashlib
+
+import pytest
+import requests
+
+from tap_shopify_beta import bulk_download
+from tap_shopify_beta.bulk_download import IncompleteDownload, download_to_spool, iter_spooled_lines
+
+CONTENT = b'{"id": 1}\n{"id": 2}\n\n{"id": 3}\n'
+MD5 = base64.b64encode(hashlib.md5(CONTENT).digest()).decode("ascii")
+
+
+class FakeResponse:
+    def __init__(self, status_code, chunks, headers=None, fail_after=None):
+        self.status_code = status_code
+        self.chunks = chunks
+        self.headers = headers or {}
+        self.fail_after = fail_after
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for i, chunk in enumerate(self.chunks):
+            if i == self.fail_after:
+                raise requests.exceptions.ChunkedEncodingError("connection reset")
+            yield chunk
+
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.ranges = []
+
+    def get(self, url, headers, stream, timeout):
+        self.ranges.append(headers.get("Range"))
+        return self.responses.pop(0)
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(bulk_download, "sleep", lambda seconds: None)
+
+
+def test_interrupted_downloads_resume_with_a_range_request(tmp_path):
+    path = str(tmp_path / "result.jsonl")
+    session = FakeSession([
+        FakeResponse(200, [CONTENT[:10], CONTENT[10:]], fail_after=1),
+        FakeResponse(206, [CONTENT[10:]], headers={"x-goog-hash": f"crc32c=abc==,md5={MD5}"}),
+    ])
+
+    assert download_to_spool("https://file", path, len(CONTENT), session=session) == len(CONTENT)
+    assert session.ranges == [None, "bytes=10-"]
+    assert list(iter_spooled_lines(path)) == [b'{"id": 1}\n', b'{"id": 2}\n', b'{"id": 3}\n']
+    assert list(iter_spooled_lines(path, use_mmap=True)) == list(iter_spooled_lines(path))
+
+
+def test_servers_ignoring_the_range_send_the_whole_file_again(tmp_path):
+    path = str(tmp_path / "result.jsonl")
+    session = FakeSession([
+        FakeResponse(200, [CONTENT[:10], CONTENT[10:]], fail_after=1),
+        FakeResponse(200, [CONTENT]),
+    ])
+
+    download_to_spool("https://file", path, len(CONTENT), session=session)
+
+    with open(path, "rb") as f:
+        assert f.read() == CONTENT
+
+
+def test_truncated_and_corrupted_downloads_fail(tmp_path):
+    path = str(tmp_path / "result.jsonl")
+    with pytest.raises(IncompleteDownload, match="bytes"):
+        download_to_spool("https://file", path, len(CONTENT) + 1, session=FakeSession([
+            FakeResponse(200, [CONTENT]), FakeResponse(416, []),
+        ]))
+
+    path = str(tmp_path / "corrupted.jsonl")
+    with pytest.raises(IncompleteDownload, match="Checksum"):
+        download_to_spool("https://file", path, len(CONTENT), session=FakeSession([
+            FakeResponse(200, [CONTENT.upper()], headers={"x-goog-hash": f"md5={MD5}"}),
+        ]))
@@ -0,0 +1,156 @@
+"""Tests for bulk operations tracked by id and the shop's bulk operation slots."""
+
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tap_shopify_beta import client_bulk
+from tap_shopify_beta.bulk_operations import BulkOperationSlots, PollSchedule
+from tap_shopify_beta.client_bulk import InvalidOperation, shopifyBulkStream
+
+
+def test_slots_hold_operations_back_until_one_completes():
+    slots = BulkOperationSlots(max_operations=2)
+    assert slots.acquire(timeout=0) and slots.acquire(timeout=0)
+    assert not slots.acquire(timeout=0)
+
+    waiter = threading.Thread(target=slots.acquire)
+    waiter.start()
+    slots.release()
+    waiter.join(timeout=1)
+
+    assert not waiter.is_alive()
+    assert slots.running == 2
+
+
+def test_resize_wakes_up_waiting_streams():
+    slots = BulkOperationSlots(max_operations=1)
+    slots.acquire()
+    waiter = threading.Thread(target=slots.acquire)
+    waiter.start()
+
+    slots.resize(2)
+    waiter.join(timeout=1)
+
+    assert not waiter.is_alive()
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class BulkStream(shopifyBulkStream):
+    name = "products"
+    logger = logging.getLogger("test")
+    config = None
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    monkeypatch.setattr(client_bulk, "sleep", lambda seconds: None)
+    stream = BulkStream.__new__(BulkStream)
+    stream.config = {}
+    return stream
+
+
+def status(operation_id, value, **fields):
+    return FakeResponse({"data": {"node": {"id": operation_id, "status": value, **fields}}})
+
+
+def test_operations_are_polled_by_id(stream, monkeypatch):
+    polled = []
+    statuses = iter([
+        status("op-1", "RUNNING"),
+        status("op-1", "COMPLETED", url="https://file", objectCount="12"),
+    ])
+
+    def get_operation_status(operation_id):
+        polled.append(operation_id)
+        return next(statuses)
+
+    monkeypatch.setattr(stream, "get_operation_status", get_operation_status)
+
+    assert stream.check_status("op-1") == "https://file"
+    assert polled == ["op-1", "op-1"]
+    # the next window is expected to hold as many objects
+    assert stream.expected_object_count == 12
+
+
+def test_canceled_operations_fail(stream, monkeypatch):
+    monkeypatch.setattr(
+        stream, "get_operation_status", lambda operation_id: status(operation_id, "CANCELED", errorCode=None)
+    )
+
+    with pytest.raises(InvalidOperation, match="canceled"):
+        stream.check_status("op-1")
+
+
+def test_polls_start_fast_and_back_off_with_elapsed_time():
+    schedule = PollSchedule()
+
+    assert schedule.next_delay(0.5, 0) == 1
+    assert schedule.next_delay(60, 0) == 12
+    assert schedule.next_delay(600, 0) == 30
+
+
+def test_polls_are_brought_forward_to_the_predicted_completion():
+    schedule = PollSchedule(expected_objects=1100)
+    schedule.next_delay(100, 0)
+
+    # 10 objects per second, 100 objects left
+    assert schedule.next_delay(200, 1000) == 10
+
+
+def test_polls_are_brought_forward_once_objects_stop_coming_in():
+    schedule = PollSchedule()
+    schedule.next_delay(100, 0)
+    schedule.next_delay(200, 1000)
+
+    assert schedule.next_delay(300, 1000) == 2
+
+
+def make_window(stream, days):
+    stream.start_date = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    stream.end_date = stream.start_date + timedelta(days=days)
+
+
+def operation(objects, seconds):
+    return {
+        "objectCount": str(objects),
+        "createdAt": "2024-06-01T00:00:00Z",
+        "completedAt": (datetime(2024, 6, 1) + timedelta(seconds=seconds)).isoformat() + "Z",
+    }
+
+
+def test_small_windows_grow(stream):
+    make_window(stream, 1)
+
+    stream.resize_bulk_window(operation(100, 5))
+
+    assert stream.bulk_window == timedelta(days=4)
+    assert stream.expected_object_count == 400
+
+
+def test_long_or_large_windows_shrink(stream):
+    make_window(stream, 4)
+    stream.resize_bulk_window(operation(200000, 60))
+    assert stream.bulk_window == timedelta(days=2)
+
+    make_window(stream, 4)
+    stream.resize_bulk_window(operation(1000, 3600))
+    assert stream.bulk_window == timedelta(days=1)
+
+
+def test_windows_are_bounded_by_config(stream):
+    stream.config["bulk_max_window_days"] = 2
+    make_window(stream, 1)
+
+    stream.resize_bulk_window(operation(0, 1))
+
+    assert stream.bulk_window == timedelta(days=2)
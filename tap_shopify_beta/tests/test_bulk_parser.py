@@ -0,0 +1,45 @@
+"""Tests for the parsing of bulk operation results."""
+
+import pytest
+
+from tap_shopify_beta import bulk_parser
+from tap_shopify_beta.bulk_parser import gid_type, iter_bulk_records
+
+LINES = [
+    b'{"id": "gid://shopify/Order/1", "name": "#1"}\n',
+    b'{"id": "gid://shopify/LineItem/10", "__parentId": "gid://shopify/Order/1"}\n',
+    b'{"id": "gid://shopify/Metafield/20", "__parentId": "gid://shopify/Order/1"}\n',
+    b'{"id": "gid://shopify/LineItem/11", "__parentId": "gid://shopify/Order/1"}\n',
+    b'{"id": "gid://shopify/Refund/30", "__parentId": "gid://shopify/Order/1"}\n',
+    b'{"id": "gid://shopify/Order/2", "name": "#2"}\n',
+]
+CHILD_FIELDS = {"LineItem": "lineItems", "Metafield": "metafields"}
+
+
+@pytest.fixture(params=["default", "stdlib"])
+def decoder(request, monkeypatch):
+    if request.param == "stdlib":
+        monkeypatch.setattr(bulk_parser, "loads", bulk_parser.stdlib_loads)
+
+
+def test_gid_type():
+    assert gid_type("gid://shopify/LineItem/10") == "LineItem"
+    assert gid_type("gid://shopify/ProductVariant/10?ref=1") == "ProductVariant"
+    assert gid_type("10") is None
+
+
+def test_child_lines_are_nested_in_their_parent(decoder):
+    orders = list(iter_bulk_records(LINES, CHILD_FIELDS))
+
+    assert [order["name"] for order in orders] == ["#1", "#2"]
+    assert [edge["node"]["id"] for edge in orders[0]["lineItems"]["edges"]] == [
+        "gid://shopify/LineItem/10",
+        "gid://shopify/LineItem/11",
+    ]
+    assert len(orders[0]["metafields"]["edges"]) == 1
+    # children of types without a field are dropped
+    assert "refunds" not in orders[0] and "lineItems" not in orders[1]
+
+
+def test_every_line_is_a_record_without_child_fields(decoder):
+    assert len(list(iter_bulk_records(LINES))) == len(LINES)
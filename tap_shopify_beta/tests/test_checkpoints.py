@@ -0,0 +1,62 @@
+"""Tests for the checkpoints of concurrent partitions."""
+
+from datetime import datetime, timezone
+
+from tap_shopify_beta.checkpoints import PartitionCheckpoints, PartitionProgress
+
+JAN = datetime(2024, 1, 1, tzinfo=timezone.utc)
+FEB = datetime(2024, 2, 1, tzinfo=timezone.utc)
+MAR = datetime(2024, 3, 1, tzinfo=timezone.utc)
+
+
+def make_partition(start_date, end_date):
+    return {"date_range": {"start_date": start_date, "end_date": end_date}}
+
+
+def test_progress_is_saved_until_the_partition_finishes():
+    checkpoints = PartitionCheckpoints(JAN, MAR)
+    first, second = make_partition(JAN, FEB), make_partition(FEB, MAR)
+    checkpoints.add(first)
+    checkpoints.add(second)
+
+    checkpoints.advance(PartitionProgress(first["partition_id"], "cursor-1", "2024-01-10T00:00:00Z"))
+    checkpoints.advance(PartitionProgress(second["partition_id"], None, None, finished=True))
+
+    assert checkpoints.pending() == [
+        {
+            "partition_id": first["partition_id"],
+            "start_date": JAN,
+            "end_date": FEB,
+            "cursor": "cursor-1",
+            "replication_value": "2024-01-10T00:00:00Z",
+        }
+    ]
+
+
+def test_split_ranges_are_tracked_right_away():
+    checkpoints = PartitionCheckpoints(JAN, MAR)
+    partition = make_partition(JAN, MAR)
+    checkpoints.add(partition)
+    split_off = make_partition(FEB, MAR)
+    split_off["partition_id"] = partition["partition_id"]
+    split_off["cursor"] = "cursor-1"
+
+    checkpoints.split(partition, split_off)
+
+    assert split_off["partition_id"] != partition["partition_id"]
+    assert "cursor" not in split_off
+    assert [(p["start_date"], p["end_date"]) for p in checkpoints.pending()] == [(JAN, FEB), (FEB, MAR)]
+
+
+def test_checkpoints_round_trip_through_the_state():
+    checkpoints = PartitionCheckpoints(JAN, MAR)
+    partition = make_partition(JAN, MAR)
+    checkpoints.add(partition)
+    checkpoints.advance(PartitionProgress(partition["partition_id"], "cursor-1", "2024-01-10T00:00:00Z"))
+
+    restored = PartitionCheckpoints.from_dict(checkpoints.to_dict())
+    restored.add(make_partition(MAR, MAR))
+
+    assert restored.bookmark == JAN and restored.window_end == MAR
+    assert restored.pending()[0] == checkpoints.pending()[0]
+    assert len({p["partition_id"] for p in restored.pending()}) == 2
@@ -0,0 +1,170 @@
+"""Tests for the background sync of order child batches."""
+
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from tap_shopify_beta.scheduler import SerializedSyncMixin, sync_lock
+
+
+class RecordingChild:
+    name = "orders_refunds"
+
+    def __init__(self, release=None, error_on=None):
+        self.release = release
+        self.error_on = error_on
+        self.synced = []
+
+    def sync(self, context=None):
+        if self.release:
+            self.release.wait(timeout=5)
+        if context["batch"] == self.error_on:
+            raise ValueError(f"batch {context['batch']} failed")
+        self.synced.append(context["batch"])
+
+
+class StatefulChild:
+    name = "orders_fulfillments"
+
+    def __init__(self):
+        self.calls = []
+
+    def _increment_stream_state(self, record, *, context=None):
+        self.calls.append(("state", sync_lock._is_owned()))
+
+    def _write_record_message(self, record):
+        self.calls.append(("record", sync_lock._is_owned()))
+
+    def sync(self, context=None):
+        for record in context["records"]:
+            self._write_record_message(record)
+            self._increment_stream_state(record, context=context)
+
+
+class SerializedChild(SerializedSyncMixin, StatefulChild):
+    pass
+
+
+@pytest.fixture
+def stream(streams):
+    stream = streams.OrdersStream.__new__(streams.OrdersStream)
+    stream._child_executors = {}
+    stream._pending_child_batches = {}
+    return stream
+
+
+def test_batches_of_a_child_are_synced_in_order(stream):
+    stream.max_pending_child_batches = 10
+    child = RecordingChild()
+
+    for batch in range(5):
+        stream._submit_child_batch(child, {"batch": batch})
+    stream._wait_for_children()
+
+    assert child.synced == [0, 1, 2, 3, 4]
+    assert stream._child_executors == {}
+
+
+def test_parent_waits_once_max_batches_are_pending(stream):
+    stream.max_pending_child_batches = 2
+    release = threading.Event()
+    child = RecordingChild(release)
+    stream._submit_child_batch(child, {"batch": 0})
+    stream._submit_child_batch(child, {"batch": 1})
+
+    submitter = threading.Thread(target=stream._submit_child_batch, args=(child, {"batch": 2}))
+    submitter.start()
+    submitter.join(timeout=0.2)
+    assert submitter.is_alive()
+
+    release.set()
+    submitter.join(timeout=5)
+    assert not submitter.is_alive()
+    stream._wait_for_children()
+    assert child.synced == [0, 1, 2]
+
+
+def test_child_errors_are_raised_by_the_parent(stream):
+    stream.max_pending_child_batches = 10
+    child = RecordingChild(error_on=1)
+
+    for batch in range(3):
+        stream._submit_child_batch(child, {"batch": batch})
+
+    with pytest.raises(ValueError, match="batch 1 failed"):
+        stream._wait_for_children()
+    assert stream._child_executors == {}
+    assert all(not pending for pending in stream._pending_child_batches.values())
+
+
+def test_child_errors_are_raised_when_waiting_for_a_free_batch(stream):
+    stream.max_pending_child_batches = 1
+    child = RecordingChild(error_on=0)
+    stream._submit_child_batch(child, {"batch": 0})
+
+    with pytest.raises(ValueError, match="batch 0 failed"):
+        stream._submit_child_batch(child, {"batch": 1})
+    stream._wait_for_children()
+
+
+def test_child_state_is_written_under_the_sync_lock(stream):
+    child = SerializedChild()
+
+    stream._submit_child_batch(child, {"records": [{"id": 1}, {"id": 2}]})
+    stream._wait_for_children()
+
+    assert child.calls == [("record", True), ("state", True)] * 2
+
+
+class RefundsChild:
+    name = "orders_refunds"
+    context_key = "refunds"
+    selected = True
+    has_selected_descendents = False
+
+    def __init__(self, release):
+        self.release = release
+        self.synced = []
+
+    def sync(self, context=None):
+        self.release.wait(timeout=5)
+        self.synced.extend(context["refunds"])
+
+
+def test_queued_batches_are_cancelled_when_the_parent_fails(streams):
+    release = threading.Event()
+    child = RefundsChild(release)
+
+    class FailingOrders(streams.OrdersStream):
+        child_size = 1
+        max_pending_child_batches = 10
+        child_streams = [child]
+        selected = False
+
+        def get_context_state(self, context):
+            return {}
+
+        def _get_state_partition_context(self, context):
+            return None
+
+        def _write_starting_replication_value(self, context):
+            pass
+
+        def get_records(self, context):
+            yield {"id": 1, "refunds": [{"id": "r1"}]}
+            yield {"id": 2, "refunds": [{"id": "r2"}]}
+            threading.Timer(0.1, release.set).start()
+            raise RuntimeError("orders query failed")
+
+    stream = FailingOrders.__new__(FailingOrders)
+    stream._stream_maps = [SimpleNamespace(get_filter_result=lambda record: True)]
+    stream._child_executors = {}
+    stream._pending_child_batches = {}
+
+    with pytest.raises(RuntimeError, match="orders query failed"):
+        stream._sync_records({})
+
+    # the running batch finished before the error was raised, the queued one never ran
+    assert child.synced == ["r1"]
+    assert stream._child_executors == {}
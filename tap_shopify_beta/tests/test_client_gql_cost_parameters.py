@@ -0,0 +1,102 @@
+"""Tests for persisting learned GraphQL cost parameters in the stream state."""
+
+from tap_shopify_beta.client_gql import shopifyGqlStream
+from tap_shopify_beta.cost_budget import GraphQLCostBudget
+from tap_shopify_beta.scheduler import sync_lock
+
+
+class CostStream(shopifyGqlStream):
+    stream_state = None
+    cost_budget = None
+
+
+def make_stream(state=None):
+    stream = CostStream.__new__(CostStream)
+    stream.stream_state = state if state is not None else {}
+    stream.cost_budget = GraphQLCostBudget()
+    stream.__dict__["selection_hash"] = "abc"
+    stream.__dict__["static_node_cost"] = 12
+    return stream
+
+
+def test_warm_up_seeds_a_static_estimate_without_saved_parameters():
+    stream = make_stream()
+
+    stream.warm_up_cost_model()
+
+    assert stream.cost_model.is_estimate
+    assert stream.cost_model.requested_per_node == 12
+    assert not stream.cost_budget.is_calibrated
+
+
+def test_saved_parameters_round_trip_through_the_stream_state():
+    stream = make_stream()
+    stream.cost_model.observe(nodes=50, records=50, requested_cost=500, actual_cost=200)
+    stream.cost_budget.settle(0, {"maximumAvailable": 2000, "currentlyAvailable": 2000, "restoreRate": 100})
+
+    stream.save_cost_parameters()
+    next_run = make_stream(stream.stream_state)
+    next_run.warm_up_cost_model()
+
+    assert stream.stream_state["cost_parameters"]["api_version"] == CostStream.api_version
+    assert next_run.cost_model.requested_per_node == 10
+    assert next_run.cost_model.actual_per_node == 4
+    assert next_run.cost_budget.max_points == 2000
+    assert next_run.cost_budget.is_calibrated
+
+
+def test_saved_parameters_are_ignored_when_the_selection_changes():
+    state = {
+        "cost_parameters": {
+            "api_version": CostStream.api_version,
+            "selection_hash": "other",
+            "requested_per_node": 3,
+            "max_points": 2000,
+            "restore_rate": 100,
+        }
+    }
+    stream = make_stream(state)
+
+    stream.warm_up_cost_model()
+
+    assert stream.cost_model.requested_per_node == 12
+    assert not stream.cost_budget.is_calibrated
+
+
+def test_saved_parameters_are_ignored_for_another_api_version():
+    state = {
+        "cost_parameters": {
+            "api_version": "2020-01",
+            "selection_hash": "abc",
+            "requested_per_node": 3,
+        }
+    }
+    stream = make_stream(state)
+
+    stream.warm_up_cost_model()
+
+    assert stream.cost_model.requested_per_node == 12
+
+
+def test_static_estimates_are_not_saved():
+    stream = make_stream()
+    stream.warm_up_cost_model()
+
+    stream.save_cost_parameters()
+
+    assert "cost_parameters" not in stream.stream_state
+
+
+class LockCheckingState(dict):
+    def __setitem__(self, key, value):
+        self.locked = sync_lock._is_owned()
+        super().__setitem__(key, value)
+
+
+def test_parameters_are_saved_under_the_sync_lock():
+    stream = make_stream(LockCheckingState())
+    stream.cost_model.observe(nodes=50, records=50, requested_cost=500, actual_cost=200)
+
+    stream.save_cost_parameters()
+
+    assert stream.stream_state.locked
@@ -26,6 +26,7 @@ def hotglue_sdk_stubs(monkeypatch):
 
     exceptions_stub = types.ModuleType("hotglue_singer_sdk.exceptions")
     exceptions_stub.RetriableAPIError = Exception
+    exceptions_stub.FatalAPIError = Exception
 
     streams_stub = types.ModuleType("hotglue_singer_sdk.streams")
     streams_rest_stub = types.ModuleType("hotglue_singer_sdk.streams.rest")
@@ -0,0 +1,106 @@
+"""Tests for recovering from THROTTLED GraphQL responses."""
+
+import logging
+
+import pytest
+
+from tap_shopify_beta import client, client_gql
+from tap_shopify_beta.client_gql import GraphQLThrottledError, shopifyGqlStream
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class FakeRequest:
+    estimated_cost = 50
+
+
+THROTTLED = {
+    "errors": [{"message": "Throttled", "extensions": {"code": "THROTTLED"}}],
+    "extensions": {
+        "cost": {
+            "requestedQueryCost": 752,
+            "actualQueryCost": None,
+            "throttleStatus": {
+                "maximumAvailable": 2000.0,
+                "currentlyAvailable": 552,
+                "restoreRate": 100.0,
+            },
+        }
+    },
+}
+
+
+class ThrottledStream(shopifyGqlStream):
+    logger = logging.getLogger("test")
+
+
+@pytest.fixture
+def stream(monkeypatch):
+    monkeypatch.setattr(client_gql, "sleep", lambda seconds: None)
+    return ThrottledStream.__new__(ThrottledStream)
+
+
+def test_throttle_delay_is_computed_from_the_throttle_status(stream):
+    assert stream.get_throttle_delay(THROTTLED) == 2.0
+
+
+def test_throttle_delay_is_zero_when_enough_points_are_available(stream):
+    payload = {
+        "extensions": {
+            "cost": {
+                "requestedQueryCost": 10,
+                "throttleStatus": {"currentlyAvailable": 500, "restoreRate": 50},
+            }
+        }
+    }
+
+    assert stream.get_throttle_delay(payload) == 0
+
+
+def test_validate_response_raises_throttled_error_with_retry_after(stream, monkeypatch):
+    monkeypatch.setattr(client.shopifyStream, "validate_response", lambda self, response: None)
+
+    with pytest.raises(GraphQLThrottledError) as error:
+        stream.validate_response(FakeResponse(THROTTLED))
+
+    assert error.value.retry_after == 2.0
+
+
+def test_throttled_requests_are_retried_with_the_requested_cost(stream, monkeypatch):
+    reserved_costs = []
+    responses = iter([FakeResponse(THROTTLED), FakeResponse({"data": {}})])
+
+    def fake_request(self, prepared_request, context):
+        reserved_costs.append(prepared_request.estimated_cost)
+        response = next(responses)
+        if "errors" in response.payload:
+            raise GraphQLThrottledError("Throttled", response, retry_after=2.0)
+        return response
+
+    monkeypatch.setattr(client.shopifyStream, "_request", fake_request)
+
+    response = stream._request(FakeRequest(), None)
+
+    assert response.payload == {"data": {}}
+    assert reserved_costs == [50, 752]
+
+
+def test_throttled_retries_fall_back_to_backoff(stream, monkeypatch):
+    calls = []
+
+    def always_throttled(self, prepared_request, context):
+        calls.append(1)
+        raise GraphQLThrottledError("Throttled", FakeResponse(THROTTLED))
+
+    monkeypatch.setattr(client.shopifyStream, "_request", always_throttled)
+
+    with pytest.raises(GraphQLThrottledError):
+        stream._request(FakeRequest(), None)
+
+    assert len(calls) == stream.max_throttled_retries + 1
@@ -0,0 +1,198 @@
+"""Tests for the shared GraphQL cost budget."""
+
+import asyncio
+import threading
+
+from tap_shopify_beta import cost_budget
+
+from tap_shopify_beta.cost_budget import (
+    GraphQLCostBudget,
+    RestCallLimiter,
+    get_cost_budget,
+    get_rest_call_limiter,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_reserve_takes_points_without_waiting_when_available():
+    budget = GraphQLCostBudget(max_points=1000, restore_rate=50, clock=FakeClock())
+
+    waited = budget.reserve(400)
+
+    assert waited == 0
+    assert budget.available == 600
+    assert budget.in_flight == 400
+
+
+def test_reserve_is_capped_to_the_single_query_limit():
+    budget = GraphQLCostBudget(max_points=2000, restore_rate=100, clock=FakeClock())
+
+    budget.reserve(5000)
+
+    assert budget.available == 1000
+
+
+def test_points_restore_over_time_up_to_the_bucket_size():
+    clock = FakeClock()
+    budget = GraphQLCostBudget(max_points=1000, restore_rate=50, clock=clock)
+    budget.reserve(1000)
+
+    clock.now = 4
+    assert budget.estimate_available() == 200
+
+    clock.now = 100
+    assert budget.estimate_available() == 1000
+
+
+def test_settle_resyncs_with_throttle_status():
+    budget = GraphQLCostBudget(clock=FakeClock())
+    budget.reserve(100)
+    budget.reserve(300)
+
+    budget.settle(
+        100,
+        {"maximumAvailable": 2000.0, "currentlyAvailable": 1900, "restoreRate": 100.0},
+    )
+
+    assert budget.max_points == 2000
+    assert budget.restore_rate == 100
+    assert budget.in_flight == 300
+    assert budget.available == 1600
+
+
+def test_settle_without_throttle_status_refunds_the_reservation():
+    budget = GraphQLCostBudget(clock=FakeClock())
+    budget.reserve(250)
+
+    budget.settle(250)
+
+    assert budget.available == 1000
+    assert budget.in_flight == 0
+
+
+def test_reserve_waits_until_another_worker_settles():
+    budget = GraphQLCostBudget(max_points=1000, restore_rate=0.001)
+    budget.reserve(1000)
+    reserved = threading.Event()
+
+    def worker():
+        budget.reserve(500)
+        reserved.set()
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    assert not reserved.wait(0.05)
+
+    budget.settle(1000, {"currentlyAvailable": 1000})
+    thread.join(timeout=2)
+
+    assert reserved.is_set()
+    assert budget.in_flight == 500
+
+
+def test_budget_is_shared_per_shop():
+    assert get_cost_budget("test-shop") is get_cost_budget("test-shop")
+    assert get_cost_budget("test-shop") is not get_cost_budget("other-shop")
+
+
+def test_calibrate_applies_saved_parameters_until_shopify_reports_its_own():
+    budget = GraphQLCostBudget(clock=FakeClock())
+
+    budget.calibrate(max_points=2000, restore_rate=100)
+
+    assert budget.is_calibrated
+    assert budget.max_points == 2000
+    assert budget.available == 2000
+
+    budget.calibrate(max_points=20000, restore_rate=1000)
+
+    assert budget.max_points == 2000
+
+
+def test_settle_with_throttle_status_calibrates_the_budget():
+    budget = GraphQLCostBudget(clock=FakeClock())
+    budget.reserve(10)
+
+    budget.settle(10, {"maximumAvailable": 2000.0, "currentlyAvailable": 1990, "restoreRate": 100.0})
+    budget.calibrate(max_points=1000, restore_rate=50)
+
+    assert budget.is_calibrated
+    assert budget.max_points == 2000
+
+
+def test_rest_limiter_syncs_with_the_call_limit_header():
+    limiter = RestCallLimiter(clock=FakeClock())
+    limiter.reserve(1)
+
+    limiter.settle_response(1, 200, {"X-Shopify-Shop-Api-Call-Limit": "30/40"})
+
+    assert limiter.max_points == 38
+    assert limiter.available == 8
+    assert limiter.restore_rate == 2
+
+
+def test_rest_limiter_learns_plus_buckets():
+    limiter = RestCallLimiter(clock=FakeClock())
+    limiter.reserve(1)
+
+    limiter.settle_response(1, 200, {"X-Shopify-Shop-Api-Call-Limit": "1/400"})
+
+    assert limiter.max_points == 398
+    assert limiter.restore_rate == 20
+
+
+def test_rest_limiter_empties_the_bucket_on_429():
+    limiter = RestCallLimiter(clock=FakeClock())
+    limiter.reserve(1)
+
+    limiter.settle_response(1, 429, {})
+
+    assert limiter.available == 0
+
+
+def test_retry_after_pauses_every_reservation():
+    clock = FakeClock()
+    limiter = RestCallLimiter(clock=clock)
+    limiter.reserve(1)
+    limiter.settle_response(1, 429, {"Retry-After": "2.0"})
+    waits = []
+
+    def fake_wait(timeout):
+        waits.append(timeout)
+        clock.now += timeout
+
+    limiter._condition.wait = fake_wait
+    waited = limiter.reserve(1)
+
+    assert waits[0] == 2.0
+    assert waited >= 2.0
+
+
+def test_rest_limiter_is_shared_per_shop():
+    assert get_rest_call_limiter("test-shop") is get_rest_call_limiter("test-shop")
+
+
+def test_reserve_async_waits_in_the_event_loop_until_points_are_restored(monkeypatch):
+    clock = FakeClock()
+    budget = GraphQLCostBudget(max_points=1000, restore_rate=50, clock=clock)
+    budget.reserve(1000)
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+        clock.now += seconds
+
+    monkeypatch.setattr(cost_budget.asyncio, "sleep", fake_sleep)
+
+    waited = asyncio.run(budget.reserve_async(200))
+
+    assert sleeps == [4.0]
+    assert waited == 4.0
+    assert budget.in_flight == 1200
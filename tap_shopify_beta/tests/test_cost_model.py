@@ -0,0 +1,109 @@
+"""Tests for the per-stream query cost model."""
+
+from tap_shopify_beta.cost_model import QueryCostModel
+
+
+def test_cold_model_uses_single_node_pages():
+    model = QueryCostModel()
+
+    assert not model.is_warm
+    assert model.requested_cost(10) is None
+    assert model.best_page_size(1000, 1000, 50) == 1
+
+
+def test_observe_tracks_per_node_costs():
+    model = QueryCostModel()
+
+    model.observe(nodes=1, records=1, requested_cost=12, actual_cost=6, latency=0.4)
+
+    assert model.requested_per_node == 12
+    assert model.actual_per_node == 6
+    assert model.actual_ratio == 0.5
+    assert model.requested_cost(50) == 600
+
+
+def test_observe_weights_recent_pages():
+    model = QueryCostModel(alpha=0.5)
+    model.observe(nodes=10, records=10, requested_cost=100, actual_cost=50)
+
+    model.observe(nodes=10, records=10, requested_cost=60, actual_cost=30)
+
+    assert model.requested_per_node == 8
+    assert model.actual_per_node == 4
+
+
+def test_actual_cost_is_spread_over_returned_records():
+    model = QueryCostModel()
+
+    model.observe(nodes=100, records=10, requested_cost=500, actual_cost=50)
+
+    assert model.actual_per_node == 5
+
+
+def test_latency_is_fitted_from_page_sizes():
+    model = QueryCostModel(alpha=0.5)
+
+    model.observe(nodes=10, records=10, requested_cost=50, actual_cost=50, latency=1.1)
+    model.observe(nodes=50, records=50, requested_cost=250, actual_cost=250, latency=1.5)
+
+    assert round(model.latency(100), 3) == 2.0
+
+
+def test_best_page_size_stays_under_the_requested_cost_limit():
+    model = QueryCostModel()
+    model.observe(nodes=1, records=1, requested_cost=7, actual_cost=3, latency=0.5)
+
+    page_size = model.best_page_size(available=1000, max_points=1000, restore_rate=50)
+
+    assert page_size == 142
+    assert model.requested_cost(page_size) <= 1000
+
+
+def test_best_page_size_is_capped_by_max_page_size():
+    model = QueryCostModel()
+    model.observe(nodes=1, records=1, requested_cost=1, actual_cost=1, latency=0.5)
+
+    assert model.best_page_size(available=2000, max_points=2000, restore_rate=100) == 250
+
+
+def test_best_page_size_avoids_waiting_when_latency_dominates():
+    model = QueryCostModel(alpha=0.5)
+    # pages get much slower as they grow, so waiting for points is not worth it
+    model.observe(nodes=10, records=10, requested_cost=100, actual_cost=10, latency=1.0)
+    model.observe(nodes=50, records=50, requested_cost=500, actual_cost=50, latency=5.0)
+
+    assert model.best_page_size(available=200, max_points=1000, restore_rate=50) == 20
+
+
+def test_seeded_model_keeps_headroom_until_the_first_page():
+    model = QueryCostModel()
+    model.seed(10)
+
+    assert model.is_warm
+    assert model.best_page_size(available=1000, max_points=1000, restore_rate=50) == 80
+
+    model.observe(nodes=80, records=80, requested_cost=400, actual_cost=200, latency=1.0)
+
+    assert not model.is_estimate
+    assert model.requested_per_node == 5
+
+
+def test_restore_uses_parameters_saved_by_a_previous_run():
+    previous = QueryCostModel()
+    previous.observe(nodes=100, records=100, requested_cost=800, actual_cost=300)
+
+    model = QueryCostModel()
+    model.restore(previous.to_dict())
+
+    assert model.is_warm
+    assert not model.is_estimate
+    assert model.requested_per_node == 8
+    assert model.actual_per_node == 3
+
+
+def test_restore_ignores_empty_parameters():
+    model = QueryCostModel()
+
+    model.restore({})
+
+    assert not model.is_warm
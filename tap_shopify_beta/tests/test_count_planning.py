@@ -0,0 +1,55 @@
+"""Tests for planning concurrent partitions from record counts."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tap_shopify_beta.client_gql import shopifyGqlStream
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+END = START + timedelta(days=30)
+
+# one order an hour, except for a busy last day with one order a minute
+RECORD_DATES = [START + timedelta(hours=i) for i in range(24 * 29)]
+RECORD_DATES += [START + timedelta(days=29, minutes=i) for i in range(24 * 60)]
+
+
+class CountedOrders(shopifyGqlStream):
+    name = "orders"
+    query_name = "orders"
+    replication_key = "updatedAt"
+    count_query_name = "ordersCount"
+    schema = {"properties": {"updatedAt": {"type": "string", "format": "date-time"}}}
+
+    def get_window_end(self):
+        return END
+
+    def count_records(self, start_date, end_date):
+        self.counts.append((start_date, end_date))
+        return sum(1 for date in RECORD_DATES if start_date < date <= end_date)
+
+
+@pytest.fixture
+def stream(make_stream, monkeypatch):
+    stream = make_stream(CountedOrders, config={"start_date": START.isoformat()})
+    stream.counts = []
+    stream._write_starting_replication_value(None)
+    monkeypatch.setattr(CountedOrders, "max_requests", 2)
+    return stream
+
+
+# max_requests is 2, so at most 8 count queries are spent on planning
+@pytest.mark.parametrize("async_partitions, count_queries", [(2, 7), (8, 8), (50, 8)])
+def test_count_queries_are_capped_by_the_max_requests(stream, async_partitions, count_queries):
+    params = stream.get_concurrent_params(None, async_partitions)
+
+    assert len(stream.counts) == count_queries
+    assert len(params) == async_partitions
+    assert params[0]["date_range"]["start_date"] == START
+    assert params[-1]["date_range"]["end_date"] == END
+
+
+def test_count_balanced_partitions_follow_the_busy_day(stream):
+    params = stream.get_concurrent_params(None, 2)
+
+    assert params[0]["date_range"]["end_date"] > START + timedelta(days=29)
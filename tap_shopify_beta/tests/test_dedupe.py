@@ -0,0 +1,122 @@
+"""Tests for the de-duplication of records synced by concurrent partitions."""
+
+import json
+import re
+from datetime import datetime, timedelta, timezone
+
+from dateutil.parser import parse
+
+from tap_shopify_beta.client_gql import shopifyGqlStream
+from tap_shopify_beta.dedupe import CompactIdSet, PartitionDeduplicator, numeric_id
+
+BOUNDARY = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def test_compact_id_set_keeps_ids_across_merged_runs():
+    ids = CompactIdSet(buffer_size=4)
+    values = list(range(100, 0, -3))
+
+    assert all(ids.add(value) for value in values)
+    assert not any(ids.add(value) for value in values)
+    assert len(ids) == len(values)
+    assert 100 in ids and 99 not in ids
+    # runs of equal size are merged, leaving a logarithmic number of them
+    assert len(ids._runs) <= 3
+
+
+def test_numeric_id():
+    assert numeric_id("gid://shopify/Order/123") == 123
+    assert numeric_id("gid://shopify/Order/abc") is None
+
+
+def test_only_records_near_a_boundary_are_tracked():
+    deduplicator = PartitionDeduplicator(window=timedelta(minutes=5))
+    deduplicator.add_boundary(BOUNDARY)
+    far = BOUNDARY + timedelta(hours=1)
+    near = BOUNDARY - timedelta(minutes=1)
+
+    assert not deduplicator.is_duplicate("gid://shopify/Order/1", far)
+    assert not deduplicator.is_duplicate("gid://shopify/Order/1", far)
+    assert not deduplicator.is_duplicate("gid://shopify/Order/2", near)
+    assert deduplicator.is_duplicate("gid://shopify/Order/2", near)
+    assert len(deduplicator) == 1
+
+
+def test_every_record_is_tracked_without_boundaries():
+    deduplicator = PartitionDeduplicator()
+
+    assert not deduplicator.is_duplicate("gid://shopify/Order/1", BOUNDARY)
+    assert deduplicator.is_duplicate("gid://shopify/Order/1", BOUNDARY)
+    assert not deduplicator.is_duplicate("custom-id", BOUNDARY)
+    assert deduplicator.is_duplicate("custom-id", BOUNDARY)
+
+
+FILTER = re.compile(r"updated_at:>'([^']+)' AND updated_at:<='([^']+)'")
+
+
+def serve_overlapping(orders, returned):
+    """Answer order queries including the start of their range, as Shopify may at boundaries."""
+
+    def respond(request):
+        variables = json.loads(request.body)["variables"]
+        start, end = (parse(value) for value in FILTER.search(variables["filter"]).groups())
+        edges = [
+            {"cursor": order["id"], "node": order}
+            for order in orders
+            if start <= parse(order["updatedAt"]) <= end
+        ]
+        returned.extend(edge["node"]["id"] for edge in edges)
+        return {
+            "data": {"orders": {"edges": edges, "pageInfo": {"hasNextPage": False}}},
+            "extensions": {"cost": {"requestedQueryCost": 10, "actualQueryCost": 5}},
+        }
+
+    return respond
+
+
+class DedupedOrders(shopifyGqlStream):
+    name = "orders"
+    query_name = "orders"
+    replication_key = "updatedAt"
+    schema = {
+        "properties": {
+            "id": {"type": "string"},
+            "updatedAt": {"type": "string", "format": "date-time"},
+        }
+    }
+
+
+def order(number, updated_at):
+    return {"id": f"gid://shopify/Order/{number}", "updatedAt": updated_at.isoformat()}
+
+
+def test_concurrent_partitions_drop_duplicates_at_their_boundaries_only(make_stream):
+    start, end = BOUNDARY - timedelta(days=1), BOUNDARY + timedelta(days=1)
+    orders = [
+        order(1, start + timedelta(hours=2)),
+        # same order, updated again later in the window
+        order(1, end - timedelta(hours=2)),
+        order(2, BOUNDARY - timedelta(minutes=3)),
+        # on the boundary, returned by both partitions
+        order(3, BOUNDARY),
+        order(4, BOUNDARY + timedelta(hours=6)),
+    ]
+    returned = []
+    stream = make_stream(
+        DedupedOrders,
+        serve_overlapping(orders, returned),
+        {"start_date": (start - timedelta(days=1)).isoformat()},
+    )
+    stream.selected_properties = ["id", "updatedAt"]
+    stream._write_starting_replication_value(None)
+    partitions = [
+        {"date_range": {"start_date": start, "end_date": BOUNDARY}},
+        {"date_range": {"start_date": BOUNDARY, "end_date": end}},
+    ]
+
+    records = list(stream.get_concurrent_records(partitions, 2, None))
+
+    # order 3 was returned by both partitions and is synced once
+    assert returned.count("gid://shopify/Order/3") == 2
+    synced = sorted((record["id"][-1], record["updatedAt"]) for record in records)
+    assert synced == sorted((o["id"][-1], o["updatedAt"]) for o in orders)
@@ -0,0 +1,108 @@
+"""Tests for paging the inventory levels of every location."""
+
+import json
+
+import pytest
+
+COST = {
+    "requestedQueryCost": 12,
+    "actualQueryCost": 6,
+    "throttleStatus": {"maximumAvailable": 2000, "currentlyAvailable": 1990, "restoreRate": 100},
+}
+
+LOCATIONS = ["gid://shopify/Location/1", "gid://shopify/Location/2", "gid://shopify/Location/3"]
+
+LEVELS = {
+    "gid://shopify/Location/1": ["1-a", "1-b", "1-c"],
+    "gid://shopify/Location/2": [],
+    "gid://shopify/Location/3": ["3-a"],
+}
+
+# nodes Shopify returns per page in these tests, whatever `first` asks for
+SERVER_PAGE_SIZE = 2
+
+
+def page(nodes, after, make_node):
+    start = nodes.index(after) + 1 if after else 0
+    edges = [{"cursor": node, "node": make_node(node)} for node in nodes[start:start + SERVER_PAGE_SIZE]]
+    return {"edges": edges, "pageInfo": {"hasNextPage": start + SERVER_PAGE_SIZE < len(nodes)}}
+
+
+def respond(request):
+    """Answer the locations and location inventory levels queries."""
+    payload = json.loads(request.body)
+    variables = payload.get("variables") or {}
+    if "locations(" in payload["query"]:
+        data = {"locations": page(LOCATIONS, variables.get("after"), lambda gid: {"id": gid})}
+    else:
+        location_id = variables["locationId"]
+        data = {"location": {"inventoryLevels": page(
+            LEVELS[location_id],
+            variables.get("after"),
+            lambda level: {"id": level, "location": {"id": location_id}},
+        )}}
+    return {"data": data, "extensions": {"cost": COST}}
+
+
+@pytest.fixture
+def stream(streams, make_stream):
+    stream = make_stream(streams.InventoryLevelGqlStream, respond, {"apply_concurrency": False})
+    stream.selected_properties = ["id", "location"]
+    return stream
+
+
+def test_locations_are_listed_with_inactive_ones_across_pages(stream):
+    contexts = stream.get_location_contexts()
+
+    assert contexts == [{"location_id": gid} for gid in LOCATIONS]
+    payloads = stream.requests_session.payloads
+    assert [payload["variables"]["after"] for payload in payloads] == [None, LOCATIONS[1]]
+    assert "includeInactive: true" in payloads[0]["query"]
+
+
+def test_inventory_levels_of_every_location_are_paged(stream):
+    records = list(stream.get_records(None))
+
+    assert [record["id"] for record in records] == ["1-a", "1-b", "1-c", "3-a"]
+    level_requests = [
+        payload["variables"]
+        for payload in stream.requests_session.payloads
+        if "location(id:" in payload["query"]
+    ]
+    assert [(v["locationId"][-1], v.get("after")) for v in level_requests] == [
+        ("1", None),
+        ("1", "1-b"),
+        ("2", None),
+        ("3", None),
+    ]
+
+
+def test_a_location_context_pages_that_location_only(stream):
+    records = list(stream.get_records({"location_id": LOCATIONS[2]}))
+
+    assert [record["id"] for record in records] == ["3-a"]
+    assert all("locations(" not in p["query"] for p in stream.requests_session.payloads)
+
+
+@pytest.mark.parametrize(
+    "item_ids",
+    [
+        ["gid://shopify/InventoryItem/11", "gid://shopify/InventoryItem/12"],
+        "11, 12",
+        [11, 12],
+    ],
+)
+def test_inventory_item_ids_become_an_or_filter(stream, item_ids):
+    stream._config["inventory_item_ids"] = item_ids
+
+    params = stream.get_url_params({"location_id": LOCATIONS[0]}, None)
+
+    assert params["filter"] == "inventory_item_id:11 OR inventory_item_id:12"
+    assert params["locationId"] == LOCATIONS[0]
+
+
+def test_no_filter_without_inventory_item_ids(stream):
+    params = stream.get_url_params({"location_id": LOCATIONS[0]}, "cursor")
+
+    assert "filter" not in params
+    assert params["after"] == "cursor"
@@ -0,0 +1,169 @@
+"""Tests for continuing paginated connections of records through aliased node queries."""
+
+import json
+import logging
+import re
+
+import pytest
+
+from tap_shopify_beta.client import shopifyStream
+
+ALIAS = re.compile(r'(r\d+): node\(id: "([^"]+)"\).*?after: "([^"]+)"')
+
+
+def edge(cursor):
+    return {"cursor": cursor, "node": {"id": f"gid://shopify/Metafield/{cursor}"}}
+
+
+def connection(cursors, has_next):
+    return {"edges": [edge(cursor) for cursor in cursors], "pageInfo": {"hasNextPage": has_next}}
+
+
+def serve_connections(pages):
+    """Answer aliased node queries from pages keyed by record id and cursor."""
+
+    def respond(request):
+        data = {}
+        for alias, gid, cursor in ALIAS.findall(json.loads(request.body)["query"]):
+            page = pages.get((gid, cursor))
+            data[alias] = None if page is None else {"metafields": page}
+        return {"data": data}
+
+    return respond
+
+
+class ConnectionStream(shopifyStream):
+    name = "products"
+    schema = {"properties": {}}
+
+
+@pytest.fixture
+def connection_stream(make_stream):
+    return lambda pages: make_stream(ConnectionStream, serve_connections(pages))
+
+
+def queries(stream):
+    return [payload["query"] for payload in stream.requests_session.payloads]
+
+
+def product(number, cursors, has_next):
+    return {"id": f"gid://shopify/Product/{number}", "metafields": connection(cursors, has_next)}
+
+
+def metafield_ids(record):
+    return [node["id"].rsplit("/", 1)[-1] for node in record["metafields"]]
+
+
+def test_connections_with_more_pages_are_drained_into_their_record(connection_stream):
+    stream = connection_stream({
+        ("gid://shopify/Product/1", "m1"): connection(["m2", "m3"], True),
+        ("gid://shopify/Product/1", "m3"): connection(["m4"], False),
+    })
+    records = [product(1, ["m1"], True), product(2, ["n1"], False)]
+
+    stream._fetch_all_metafields(records)
+
+    assert metafield_ids(records[0]) == ["m1", "m2", "m3", "m4"]
+    assert metafield_ids(records[1]) == ["n1"]
+    assert len(queries(stream)) == 2
+    assert "Product/2" not in " ".join(queries(stream))
+
+
+def test_records_sharing_a_query_are_continued_separately(connection_stream):
+    stream = connection_stream({
+        ("gid://shopify/Product/1", "a1"): connection(["a2"], False),
+        ("gid://shopify/Product/2", "b1"): connection(["b2"], True),
+        ("gid://shopify/Product/2", "b2"): connection(["b3"], False),
+    })
+    records = [product(1, ["a1"], True), product(2, ["b1"], True)]
+
+    stream._fetch_all_metafields(records)
+
+    assert metafield_ids(records[0]) == ["a1", "a2"]
+    assert metafield_ids(records[1]) == ["b1", "b2", "b3"]
+    assert "Product/1" in queries(stream)[0]
+    assert "Product/2" in queries(stream)[0]
+
+
+def test_null_nodes_are_logged_and_keep_their_first_page(connection_stream, caplog):
+    stream = connection_stream({
+        ("gid://shopify/Product/1", "m1"): connection(["m2"], False),
+    })
+    records = [product(1, ["m1"], True), product(3, ["d1"], True)]
+
+    with caplog.at_level(logging.WARNING, logger="test"):
+        stream._fetch_all_metafields(records)
+
+    assert metafield_ids(records[0]) == ["m1", "m2"]
+    assert metafield_ids(records[1]) == ["d1"]
+    assert "gid://shopify/Product/3" in caplog.text
+    assert "node is null" in caplog.text
+
+
+PAGE = re.compile(r'(r\d+): node\(id: "([^"]+)"\).*?lineItems\(first: (\d+), after: "([^"]+)"\)')
+
+
+def serve_line_items(line_items, page_sizes):
+    """Serve the line items of orders after any cursor, `first` at a time."""
+
+    def respond(request):
+        data = {}
+        for alias, gid, first, after in PAGE.findall(json.loads(request.body)["query"]):
+            page_sizes.append(int(first))
+            cursors = line_items[gid]
+            start = cursors.index(after) + 1
+            page = cursors[start:start + int(first)]
+            data[alias] = {"lineItems": {
+                "edges": [{"cursor": cursor, "node": {"id": cursor}} for cursor in page],
+                "pageInfo": {"hasNextPage": start + int(first) < len(cursors)},
+            }}
+        return {"data": data}
+
+    return respond
+
+
+def test_orders_continue_line_items_past_the_first_page(streams, make_stream, make_response):
+    class Orders(streams.OrdersStream):
+        # line items selecting their id only, cheap enough for full pages
+        schema = {
+            "properties": {
+                **streams.OrdersStream.schema["properties"],
+                "lineItems": {"type": "array", "items": {"properties": {"id": {"type": "string"}}}},
+            }
+        }
+
+    line_items = {
+        "gid://shopify/Order/1": [f"a{i}" for i in range(600)],
+        "gid://shopify/Order/2": [f"b{i}" for i in range(30)],
+        "gid://shopify/Order/3": [f"c{i}" for i in range(3)],
+    }
+    first = Orders.first_line_item
+    orders = [
+        {
+            "id": gid,
+            "updatedAt": "2024-01-01T00:00:00Z",
+            "lineItems": {
+                "edges": [{"cursor": c, "node": {"id": c}} for c in cursors[:first]],
+                "pageInfo": {"hasNextPage": len(cursors) > first},
+            },
+        }
+        for gid, cursors in line_items.items()
+    ]
+    page_sizes = []
+    stream = make_stream(Orders, serve_line_items(line_items, page_sizes))
+    stream.selected_properties = ["id", "updatedAt", "lineItems"]
+    response = make_response(
+        {
+            "data": {"orders": {"edges": [{"node": order} for order in orders]}},
+            "extensions": {"cost": {"requestedQueryCost": 100, "actualQueryCost": 40}},
+        },
+        elapsed=0.2,
+    )
+
+    records = list(stream.parse_response(response))
+
+    for record in records:
+        assert [item["id"] for item in record["lineItems"]] == line_items[record["id"]]
+    assert "Order/3" not in " ".join(queries(stream))
+    assert max(page_sizes) == Orders.line_items_page_size
+    assert all(0 < request.estimated_cost <= 1000 for request in stream.requests_session.requests)
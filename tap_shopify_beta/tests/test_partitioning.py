@@ -0,0 +1,129 @@
+"""Tests for the date range partitions shared by concurrent workers."""
+
+import asyncio
+import threading
+from datetime import datetime, timedelta
+
+from tap_shopify_beta.partitioning import DateRangeQueue, plan_balanced_ranges, split_point
+
+
+def test_get_returns_none_once_every_partition_is_done():
+    partitions = DateRangeQueue([{"id": 1}])
+
+    assert partitions.get() == {"id": 1}
+    partitions.done()
+
+    assert partitions.get() is None
+    assert partitions.is_finished
+
+
+def test_idle_workers_wait_for_split_partitions():
+    partitions = DateRangeQueue([{"id": 1}])
+    partitions.get()
+    taken = []
+    worker = threading.Thread(target=lambda: taken.append(partitions.get()))
+    worker.start()
+
+    while not partitions.wants_work():
+        pass
+    partitions.put({"id": 2})
+    worker.join(timeout=1)
+
+    assert taken == [{"id": 2}]
+    assert not partitions.wants_work()
+
+
+def test_idle_workers_stop_when_the_last_busy_worker_finishes():
+    partitions = DateRangeQueue([{"id": 1}])
+    partitions.get()
+    taken = []
+    worker = threading.Thread(target=lambda: taken.append(partitions.get()))
+    worker.start()
+
+    while not partitions.wants_work():
+        pass
+    partitions.done()
+    worker.join(timeout=1)
+
+    assert taken == [None]
+
+
+def test_get_async_waits_for_split_partitions():
+    partitions = DateRangeQueue([{"id": 1}])
+    partitions.get()
+
+    async def split_later():
+        while not partitions.wants_work():
+            await asyncio.sleep(0)
+        partitions.put({"id": 2})
+
+    async def run():
+        taken, _ = await asyncio.gather(partitions.get_async(poll_interval=0), split_later())
+        return taken
+
+    assert asyncio.run(run()) == {"id": 2}
+
+
+def test_split_point_halves_the_unsynced_range():
+    last_synced = datetime(2024, 1, 1)
+
+    assert split_point(last_synced, datetime(2024, 1, 3), timedelta(hours=1)) == datetime(2024, 1, 2)
+
+
+def test_split_point_is_rounded_to_the_second():
+    last_synced = datetime(2024, 1, 1)
+    end_date = datetime(2024, 1, 1, 3, 0, 1)
+
+    assert split_point(last_synced, end_date, timedelta(hours=1)) == datetime(2024, 1, 1, 1, 30)
+
+
+def test_short_ranges_are_not_split():
+    last_synced = datetime(2024, 1, 1)
+
+    assert split_point(last_synced, datetime(2024, 1, 1, 1), timedelta(hours=1)) is None
+
+
+def make_counter(record_dates):
+    def count(start_date, end_date):
+        return sum(1 for date in record_dates if start_date < date <= end_date)
+
+    return count
+
+
+def test_balanced_ranges_follow_where_records_are():
+    start_date = datetime(2024, 1, 1)
+    end_date = datetime(2024, 1, 31)
+    # one record a day for 10 days, then two records an hour on the 30th
+    record_dates = [start_date + timedelta(days=i, hours=12) for i in range(10)]
+    record_dates += [datetime(2024, 1, 30, hour) for hour in range(1, 24)] * 2
+
+    ranges = plan_balanced_ranges(start_date, end_date, 4, make_counter(record_dates), max_counts=40)
+
+    assert ranges[0][0] == start_date
+    assert ranges[-1][1] == end_date
+    counts = [make_counter(record_dates)(start, end) for start, end in ranges]
+    assert max(counts) - min(counts) <= 4
+    assert sum(counts) == len(record_dates)
+
+
+def test_balanced_ranges_need_an_exact_count():
+    ranges = plan_balanced_ranges(
+        datetime(2024, 1, 1), datetime(2024, 2, 1), 4, lambda start, end: None
+    )
+
+    assert ranges is None
+
+
+def test_balanced_ranges_count_at_most_max_counts_times():
+    record_dates = [datetime(2024, 1, 1) + timedelta(hours=i) for i in range(24 * 30)]
+    counter = make_counter(record_dates)
+    calls = []
+
+    def count(start_date, end_date):
+        calls.append(end_date)
+        return counter(start_date, end_date)
+
+    ranges = plan_balanced_ranges(datetime(2024, 1, 1), datetime(2024, 1, 31), 20, count, max_counts=5)
+
+    assert len(calls) == 5
+    assert len(ranges) == 20
@@ -0,0 +1,163 @@
+"""Tests for the static GraphQL query cost estimator."""
+
+from tap_shopify_beta.query_cost import (
+    estimate_node_cost,
+    estimate_selection_cost,
+    fields_cost,
+    most_expensive_fields,
+    parse_selection,
+    plan_alias_batch,
+)
+
+# selections in the shape built by shopifyStream.gql_selected_fields/get_field_query
+PRODUCT_SELECTION = "\n".join([
+    "id",
+    "title",
+    "featuredImage {",
+    "id",
+    "altText",
+    "}",
+    "priceRangeV2 {",
+    "maxVariantPrice {",
+    "amount",
+    "currencyCode",
+    "}",
+    "minVariantPrice {",
+    "amount",
+    "currencyCode",
+    "}",
+    "}",
+    "metafields(first: 50) {",
+    "edges {",
+    "cursor",
+    "node {",
+    "id",
+    "key",
+    "value",
+    "}",
+    "}",
+    "pageInfo { hasNextPage }",
+    "}",
+    "tags",
+])
+
+REFUND_SELECTION = "\n".join([
+    "id",
+    "refundLineItems(first: 50) {",
+    "edges {",
+    "cursor",
+    "node {",
+    "id",
+    "lineItem {",
+    "id",
+    "}",
+    "priceSet {",
+    "shopMoney {",
+    "amount",
+    "}",
+    "}",
+    "}",
+    "}",
+    "pageInfo { hasNextPage }",
+    "}",
+])
+
+
+def test_parse_selection_builds_nested_fields():
+    fields = parse_selection(PRODUCT_SELECTION)
+
+    assert [field.name for field in fields] == [
+        "id", "title", "featuredImage", "priceRangeV2", "metafields", "tags",
+    ]
+    assert fields[4].arguments == "(first: 50)"
+    assert [child.name for child in fields[3].children] == ["maxVariantPrice", "minVariantPrice"]
+
+
+def test_scalars_are_free():
+    assert fields_cost(parse_selection("id\ntitle\ntags")) == 0
+    assert estimate_node_cost("id\ntitle") == 1
+
+
+def test_objects_cost_one_point_each():
+    # featuredImage + priceRangeV2 with its two money objects
+    assert estimate_node_cost(PRODUCT_SELECTION.split("metafields")[0]) == 1 + 1 + 3
+
+
+def test_connections_are_multiplied_by_their_page_size():
+    # product (1) + featuredImage (1) + priceRangeV2 (3) + metafields (2 + 50 * 1)
+    assert estimate_node_cost(PRODUCT_SELECTION) == 57
+
+
+def test_nested_connection_objects_are_counted_per_node():
+    # refund (1) + refundLineItems (2 + 50 * (1 + lineItem + priceSet + shopMoney))
+    assert estimate_node_cost(REFUND_SELECTION) == 1 + 2 + 50 * 4
+
+
+def test_page_size_variables_are_resolved():
+    selection = "orders(first: $first) { edges { node { id customer { id } } } }"
+
+    assert fields_cost(parse_selection(selection), {"first": 10}) == 2 + 10 * 2
+
+
+def test_after_cursor_does_not_change_the_cost():
+    selection = 'lineItems(first: 25, after: "abc=") { edges { cursor node { id } } }'
+
+    assert fields_cost(parse_selection(selection)) == 2 + 25
+
+
+def test_inline_fragments_are_merged_into_the_parent():
+    selection = 'node(id: "gid://shopify/Product/1") { ... on Product { id image { id } } }'
+
+    assert fields_cost(parse_selection(selection)) == 2
+
+
+def test_query_root_is_not_counted_as_an_object():
+    aliases = " ".join(
+        f'r{i}: node(id: "gid://shopify/Order/{i}") {{ ... on Order {{'
+        f' lineItems(first: 100, after: "c{i}") {{ edges {{ cursor node {{ id }} }}'
+        f" pageInfo {{ hasNextPage }} }} }} }}"
+        for i in range(3)
+    )
+
+    # one object per alias, plus its connection of 100 line items
+    assert estimate_selection_cost(aliases) == 3 * (1 + 2 + 100 * 1)
+    assert estimate_node_cost("id") == 1 + estimate_selection_cost("id")
+
+
+def test_alias_batch_fits_the_estimated_query_cost():
+    node_fields = "id quantity originalTotalSet { shopMoney { amount } }"
+    aliases, page_size = plan_alias_batch(
+        pending=10, node_cost=estimate_node_cost(node_fields), max_page_size=250, min_page_size=50
+    )
+    query = " ".join(
+        f'r{i}: node(id: "gid://shopify/Order/{i}") {{ ... on Order {{'
+        f' lineItems(first: {page_size}, after: "c{i}") {{ edges {{ cursor node {{ {node_fields} }} }}'
+        f" pageInfo {{ hasNextPage }} }} }} }}"
+        for i in range(aliases)
+    )
+
+    assert estimate_selection_cost(query) <= 1000
+
+
+def test_most_expensive_fields_are_reported_first():
+    assert most_expensive_fields(REFUND_SELECTION) == [("refundLineItems", 202)]
+    assert most_expensive_fields(PRODUCT_SELECTION, limit=2) == [
+        ("metafields", 52),
+        ("priceRangeV2", 3),
+    ]
+
+
+def test_alias_batch_uses_full_pages_for_a_few_connections():
+    assert plan_alias_batch(pending=2, node_cost=1, max_page_size=250, min_page_size=50) == (2, 250)
+
+
+def test_alias_batch_shrinks_pages_to_pack_more_connections():
+    aliases, page_size = plan_alias_batch(pending=40, node_cost=1, max_page_size=250, min_page_size=50)
+
+    assert aliases == 18
+    assert page_size >= 50
+    assert aliases * (3 + page_size) <= 1000
+
+
+def test_alias_batch_always_fetches_something():
+    assert plan_alias_batch(pending=5, node_cost=2000, max_page_size=250, min_page_size=50) == (1, 1)
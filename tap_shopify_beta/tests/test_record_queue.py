@@ -0,0 +1,55 @@
+"""Tests for the byte-bounded record queue."""
+
+import queue
+import threading
+
+import pytest
+
+from tap_shopify_beta.record_queue import ByteBudgetQueue, estimate_record_size
+
+
+def test_record_size_grows_with_nested_items():
+    small = {"id": "gid://shopify/ProductVariant/1"}
+    big = {"id": "gid://shopify/Order/1", "lineItems": [{"id": str(i), "name": "x" * 50} for i in range(100)]}
+
+    assert estimate_record_size(big) > 50 * estimate_record_size(small)
+
+
+def test_put_blocks_once_the_byte_budget_is_used():
+    records = ByteBudgetQueue(max_bytes=100, size_of=lambda item: 60)
+    records.put({"id": 1})
+
+    with pytest.raises(queue.Full):
+        records.put({"id": 2}, timeout=0.01)
+
+    assert records.get() == {"id": 1}
+    records.put({"id": 2}, timeout=0.01)
+    assert records.stats()["bytes"] == 60
+
+
+def test_an_empty_queue_accepts_records_bigger_than_the_budget():
+    records = ByteBudgetQueue(max_bytes=10, size_of=lambda item: 1000)
+
+    records.put({"id": 1}, timeout=0.01)
+
+    assert records.stats()["peak_bytes"] == 1000
+
+
+def test_markers_are_never_held_back():
+    records = ByteBudgetQueue(max_bytes=100, size_of=lambda item: 100)
+    records.put({"id": 1})
+
+    records.put(None, timeout=0.01)
+    records.put(("ERROR", "boom"), timeout=0.01)
+
+    assert records.stats()["records"] == 3
+
+
+def test_get_waits_for_producers():
+    records = ByteBudgetQueue(max_bytes=100)
+    producer = threading.Timer(0.01, records.put, args=({"id": 1},))
+    producer.start()
+
+    assert records.get(timeout=1) == {"id": 1}
+    with pytest.raises(queue.Empty):
+        records.get_nowait()
@@ -0,0 +1,149 @@
+"""Tests for resuming sequential syncs from a cursor saved in the state."""
+
+import logging
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from tap_shopify_beta import client
+from tap_shopify_beta.client_gql import GraphQLInvalidCursorError, shopifyGqlStream
+
+FILTER = {"filter": "updated_at:>'2024-01-01T00:00:00Z'"}
+
+PAGES = {
+    None: {"records": [{"id": 1}, {"id": 2}], "next": "c1"},
+    "c1": {"records": [{"id": 3}], "next": "c2"},
+    "c2": {"records": [{"id": 4}], "next": None},
+}
+
+
+class CursorStream(shopifyGqlStream):
+    name = "orders"
+    replication_key = "updatedAt"
+    logger = logging.getLogger("test")
+    config = {"resume_cursors": True}
+    stream_state = None
+    rejected_cursors = ()
+
+    def get_url_params(self, context, next_page_token):
+        return {"first": 2, "after": next_page_token, **FILTER}
+
+    def prepare_request(self, context, next_page_token):
+        return SimpleNamespace(cursor=next_page_token)
+
+    def request_decorator(self, func):
+        return func
+
+    def _request(self, prepared_request, context):
+        cursor = prepared_request.cursor
+        self.requested.append(cursor)
+        if cursor in self.rejected_cursors and prepared_request.resumes_cursor:
+            raise GraphQLInvalidCursorError("Shopify rejected the query cursor: Invalid cursor")
+        return PAGES[cursor]
+
+    def update_sync_costs(self, request, response, context):
+        self.costed.append(request.cursor)
+
+    def parse_response(self, response):
+        yield from response["records"]
+
+    def get_next_page_token(self, response, previous_token):
+        return response["next"]
+
+
+@pytest.fixture
+def stream():
+    stream = CursorStream.__new__(CursorStream)
+    stream.stream_state = {}
+    stream.requested = []
+    stream.costed = []
+    return stream
+
+
+def test_cursor_of_the_next_page_is_saved_until_the_sync_finishes(stream):
+    records = stream.request_records(None)
+
+    assert [next(records), next(records)] == [{"id": 1}, {"id": 2}]
+    assert "resume_cursor" not in stream.stream_state
+    assert next(records) == {"id": 3}
+    assert stream.stream_state["resume_cursor"] == {"cursor": "c1", "variables": FILTER}
+
+    assert list(records) == [{"id": 4}]
+    assert "resume_cursor" not in stream.stream_state
+
+
+def test_sync_resumes_from_the_saved_cursor(stream):
+    stream.stream_state["resume_cursor"] = {"cursor": "c2", "variables": FILTER}
+
+    assert list(stream.request_records(None)) == [{"id": 4}]
+    assert stream.requested == ["c2"]
+
+
+def test_cursor_saved_for_another_filter_is_ignored(stream):
+    stream.stream_state["resume_cursor"] = {"cursor": "c2", "variables": {"filter": "other"}}
+
+    assert len(list(stream.request_records(None))) == 4
+
+
+def test_rejected_cursor_restarts_from_the_first_page(stream):
+    stream.stream_state["resume_cursor"] = {"cursor": "expired", "variables": FILTER}
+    stream.rejected_cursors = ("expired",)
+
+    assert len(list(stream.request_records(None))) == 4
+    assert stream.requested == ["expired", None, "c1", "c2"]
+
+
+def test_sync_costs_are_updated_for_every_page(stream):
+    stream.stream_state["resume_cursor"] = {"cursor": "expired", "variables": FILTER}
+    stream.rejected_cursors = ("expired",)
+
+    list(stream.request_records(None))
+
+    assert stream.costed == [None, "c1", "c2"]
+
+
+class FakeResponse:
+    def __init__(self, payload, request):
+        self.payload = payload
+        self.request = request
+
+    def json(self):
+        return self.payload
+
+
+def make_request(after, resumes_cursor=True):
+    request = requests.Request(
+        "POST", "https://shop.myshopify.com", json={"query": "{}", "variables": {"after": after}}
+    ).prepare()
+    request.resumes_cursor = resumes_cursor
+    return request
+
+
+INVALID_CURSOR = {"errors": [{"message": "Invalid cursor for current pagination sort."}]}
+
+
+def test_rejected_resumed_cursors_are_not_retried(stream, monkeypatch):
+    monkeypatch.setattr(client.shopifyStream, "validate_response", lambda self, response: None)
+
+    with pytest.raises(GraphQLInvalidCursorError):
+        shopifyGqlStream.validate_response(stream, FakeResponse(INVALID_CURSOR, make_request("c1")))
+
+
+@pytest.mark.parametrize(
+    "payload, request_",
+    [
+        # a cursor of a request that can't restart without it
+        (INVALID_CURSOR, make_request("c1", resumes_cursor=False)),
+        # no cursor sent
+        (INVALID_CURSOR, make_request(None)),
+        # partial data alongside the error
+        ({**INVALID_CURSOR, "data": {"orders": {"edges": []}}}, make_request("c1")),
+        # other errors mentioning cursors
+        ({"errors": [{"message": "Field 'cursor' doesn't exist on type 'Order'"}]}, make_request("c1")),
+    ],
+)
+def test_other_cursor_errors_are_not_invalid_cursor_errors(stream, monkeypatch, payload, request_):
+    monkeypatch.setattr(client.shopifyStream, "validate_response", lambda self, response: None)
+
+    shopifyGqlStream.validate_response(stream, FakeResponse(payload, request_))
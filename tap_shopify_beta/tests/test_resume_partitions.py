@@ -0,0 +1,178 @@
+"""Tests for resuming the partitions of an interrupted concurrent sync."""
+
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from tap_shopify_beta.checkpoints import PartitionCheckpoints, PartitionProgress
+from tap_shopify_beta.client_gql import GraphQLInvalidCursorError, shopifyGqlStream
+from tap_shopify_beta.record_queue import ByteBudgetQueue
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+MIDDLE = START + timedelta(days=1)
+END = START + timedelta(days=2)
+
+INVALID_CURSOR = {"errors": [{"message": "Invalid cursor for current pagination sort."}]}
+
+PAGES = {
+    None: {"ids": [1, 2], "next": "p1"},
+    "p1": {"ids": [3], "next": None},
+}
+
+
+def serve_pages(rejected=()):
+    """Return a server of two pages of orders, rejecting the cursors listed in `rejected`."""
+
+    def respond(request):
+        after = json.loads(request.body)["variables"].get("after")
+        if after in rejected:
+            return INVALID_CURSOR
+        page = PAGES[after]
+        edges = [
+            {"cursor": f"c{i}", "node": {"id": f"gid://shopify/Order/{i}", "updatedAt": "2024-01-01T12:00:00Z"}}
+            for i in page["ids"]
+        ]
+        return {
+            "data": {"orders": {"edges": edges, "pageInfo": {"hasNextPage": bool(page["next"])}}},
+            "extensions": {"cost": {"requestedQueryCost": 10, "actualQueryCost": 5}},
+        }
+
+    return respond
+
+
+class ResumedOrders(shopifyGqlStream):
+    name = "orders"
+    query_name = "orders"
+    replication_key = "updatedAt"
+    schema = {
+        "properties": {
+            "id": {"type": "string"},
+            "updatedAt": {"type": "string", "format": "date-time"},
+        }
+    }
+
+    def get_next_page_token(self, response, previous_token):
+        return PAGES[previous_token]["next"]
+
+
+@pytest.fixture
+def stream(make_stream):
+    stream = make_stream(
+        ResumedOrders,
+        serve_pages(),
+        {"start_date": START.isoformat(), "end_date": END.isoformat()},
+    )
+    stream.selected_properties = ["id", "updatedAt"]
+    stream._write_starting_replication_value(None)
+    return stream
+
+
+def save_checkpoints(stream, cursor=None, replication_value=None, window_end=END):
+    checkpoints = PartitionCheckpoints(stream.get_starting_timestamp(None), window_end)
+    first = {"date_range": {"start_date": START, "end_date": MIDDLE}}
+    second = {"date_range": {"start_date": MIDDLE, "end_date": window_end}}
+    checkpoints.add(first)
+    checkpoints.add(second)
+    checkpoints.advance(PartitionProgress(first["partition_id"], cursor, replication_value))
+    stream.stream_state[stream.checkpoint_state_key] = checkpoints.to_dict()
+
+
+def test_nothing_is_resumed_without_checkpoints(stream):
+    assert stream.resume_partitions(None) is None
+
+
+def test_checkpoints_of_another_bookmark_are_ignored(stream):
+    save_checkpoints(stream, cursor="p1")
+    stream.stream_state[stream.checkpoint_state_key]["bookmark"] = MIDDLE.isoformat()
+
+    assert stream.resume_partitions(None) is None
+
+
+def test_unsorted_partitions_resume_from_their_cursor(stream):
+    save_checkpoints(stream, cursor="p1", replication_value="2024-01-01T12:00:00Z")
+
+    params = stream.resume_partitions(None)
+
+    assert [p.get("cursor") for p in params] == ["p1", None]
+    assert [p["date_range"]["start_date"] for p in params] == [START, MIDDLE]
+    assert stream.partition_checkpoints is not None
+
+
+def test_sorted_partitions_resume_from_their_last_replication_value(stream):
+    stream.sort_key = "UPDATED_AT"
+    save_checkpoints(stream, cursor="p1", replication_value="2024-01-01T12:00:00Z")
+
+    params = stream.resume_partitions(None)
+
+    assert "cursor" not in params[0]
+    assert params[0]["date_range"]["start_date"] == START + timedelta(hours=12, seconds=-1)
+
+
+def test_records_updated_since_the_window_get_a_tail_partition(stream):
+    save_checkpoints(stream, window_end=MIDDLE + timedelta(hours=6))
+
+    params = stream.resume_partitions(None)
+
+    assert params[-1]["date_range"] == {"start_date": MIDDLE + timedelta(hours=6), "end_date": END}
+    assert stream.partition_checkpoints.window_end == END
+
+
+def test_progress_is_saved_in_the_state_and_cleared_once_done(stream, monkeypatch):
+    written = []
+    monkeypatch.setattr(stream, "_write_state_message", lambda: written.append(True))
+    stream.checkpoint_interval = 0
+    partition = {"date_range": {"start_date": START, "end_date": END}}
+    stream.start_partition_checkpoints([partition], None)
+
+    stream.save_partition_progress(PartitionProgress(partition["partition_id"], "p1", "2024-01-01T12:00:00Z"), None)
+
+    saved = stream.stream_state[stream.checkpoint_state_key]["partitions"][partition["partition_id"]]
+    assert (saved["cursor"], saved["replication_value"]) == ("p1", "2024-01-01T12:00:00Z")
+    assert written
+
+    stream.clear_partition_checkpoints(None)
+    assert stream.checkpoint_state_key not in stream.stream_state
+    assert stream.partition_checkpoints is None
+
+
+def sync_partition(stream, context):
+    record_queue = ByteBudgetQueue(1024 * 1024)
+    stream.concurrent_request(context, record_queue)
+    items = []
+    while not record_queue.empty():
+        items.append(record_queue.get_nowait())
+    return items
+
+
+def test_rejected_resumed_cursor_restarts_the_partition(stream, fake_session, caplog):
+    stream._requests_session = fake_session(serve_pages(rejected=("expired",)))
+    stream.start_partition_checkpoints([{"date_range": {"start_date": START, "end_date": END}}], None)
+    context = {"partition_id": "0", "cursor": "expired", "date_range": {"start_date": START, "end_date": END}}
+
+    with caplog.at_level(logging.WARNING, logger="test"):
+        items = sync_partition(stream, context)
+
+    records = [item["id"][-1] for item in items if isinstance(item, dict)]
+    assert records == ["1", "2", "3"]
+    cursors = [payload["variables"].get("after") for payload in stream.requests_session.payloads]
+    assert cursors == ["expired", None, "p1"]
+    assert "cursor" not in context
+    assert "restarting partition 0" in caplog.text
+    assert items[-1] == PartitionProgress("0", None, "2024-01-01T12:00:00Z", True)
+
+
+def test_rejected_cursor_drops_the_checkpoints_when_it_escapes(stream, monkeypatch):
+    save_checkpoints(stream, cursor="p1")
+    monkeypatch.setattr(type(stream), "max_requests", 2)
+
+    def reject(params, workers, context):
+        raise GraphQLInvalidCursorError("Shopify rejected the query cursor: Invalid cursor")
+        yield
+
+    monkeypatch.setattr(stream, "get_concurrent_records", reject)
+
+    with pytest.raises(GraphQLInvalidCursorError):
+        list(stream.get_records(None))
+    assert stream.checkpoint_state_key not in stream.stream_state
@@ -0,0 +1,116 @@
+"""Tests for the parallel sync of top-level streams."""
+
+import logging
+import threading
+from types import SimpleNamespace
+
+import pytest
+from hotglue_singer_sdk import Stream
+
+from tap_shopify_beta import scheduler
+
+from tap_shopify_beta.scheduler import SerializedSyncMixin, sync_lock, sync_streams_in_parallel
+
+
+class FakeStream:
+    def __init__(self, name, barrier=None, error=None):
+        self.name = name
+        self.barrier = barrier
+        self.error = error
+        self.finalized = False
+
+    def sync(self):
+        if self.barrier:
+            self.barrier.wait(timeout=1)
+        if self.error:
+            raise self.error
+
+    def finalize_state_progress_markers(self):
+        self.finalized = True
+
+
+def test_streams_are_synced_concurrently():
+    # each stream waits for the other, so a sequential sync would time out
+    barrier = threading.Barrier(2)
+    streams = [FakeStream("products", barrier), FakeStream("customers", barrier)]
+
+    sync_streams_in_parallel(streams, 2, logging.getLogger("test"))
+
+    assert not barrier.broken
+    assert all(stream.finalized for stream in streams)
+
+
+def test_stream_errors_are_raised():
+    streams = [FakeStream("products", error=ValueError("boom")), FakeStream("customers")]
+
+    with pytest.raises(ValueError, match="boom"):
+        sync_streams_in_parallel(streams, 2, logging.getLogger("test"))
+
+
+class RecordingStream:
+    def __init__(self):
+        self.calls = []
+
+    def _write_record_message(self, record):
+        self.calls.append(("record", sync_lock._is_owned()))
+
+    def _increment_stream_state(self, record, *, context=None):
+        self.calls.append(("state", sync_lock._is_owned()))
+
+    def get_context_state(self, context):
+        self.calls.append(("context_state", sync_lock._is_owned()))
+        return {}
+
+    def _write_starting_replication_value(self, context):
+        self.calls.append(("starting_value", sync_lock._is_owned()))
+
+    def _increment_child_replication_state(self, record, *, context=None):
+        self.calls.append(("child_state", sync_lock._is_owned()))
+
+
+class SerializedStream(SerializedSyncMixin, RecordingStream):
+    pass
+
+
+def test_messages_and_state_updates_hold_the_sync_lock():
+    stream = SerializedStream()
+
+    stream._write_record_message({"id": 1})
+    stream._increment_stream_state({"id": 1}, context=None)
+    stream.get_context_state({"partition": 1})
+    stream._write_starting_replication_value(None)
+    stream._increment_child_replication_state({"id": 1}, context=None)
+
+    assert stream.calls == [
+        ("record", True),
+        ("state", True),
+        ("context_state", True),
+        ("starting_value", True),
+        ("child_state", True),
+    ]
+
+
+class SyncedStream(SerializedSyncMixin, Stream):
+    name = "synced"
+    schema = {"properties": {"id": {"type": "integer"}}}
+
+    def get_records(self, context):
+        yield {"id": 1}
+
+
+def test_synced_records_finalize_the_state_under_the_sync_lock(monkeypatch):
+    finalized = []
+    monkeypatch.setattr(
+        scheduler,
+        "finalize_state_progress_markers",
+        lambda state: finalized.append(sync_lock._is_owned()),
+    )
+    tap = SimpleNamespace(name="tap-shopify", logger=logging.getLogger("test"), config={}, state={})
+    stream = SyncedStream(tap=tap)
+    stream._stream_maps = [SimpleNamespace(get_filter_result=lambda record: True)]
+    monkeypatch.setattr(stream, "_write_record_message", lambda record: None)
+    monkeypatch.setattr(stream, "_write_state_message", lambda: None)
+
+    stream._sync_records()
+
+    assert finalized == [True, True]
@@ -0,0 +1,151 @@
+"""Tests for per-request telemetry."""
+
+import json
+
+import requests
+
+from tap_shopify_beta import telemetry
+from tap_shopify_beta.client import shopifyStream
+from tap_shopify_beta.client_rest import shopifyRestStream
+from tap_shopify_beta.telemetry import build_request_metrics
+
+
+COST = {
+    "requestedQueryCost": 502,
+    "actualQueryCost": 120,
+    "throttleStatus": {"maximumAvailable": 2000, "currentlyAvailable": 1880, "restoreRate": 100},
+}
+
+
+class MetricsStream(shopifyStream):
+    name = "orders"
+    config = None
+
+
+def metrics_stream(config):
+    stream = MetricsStream.__new__(MetricsStream)
+    stream.config = config
+    return stream
+
+
+def test_build_request_metrics_reads_the_response(make_response):
+    response = make_response({"data": {}})
+
+    metrics = build_request_metrics("orders", {"start_date": "2024-01-01"}, response, 50, 1.5)
+
+    assert metrics["partition"] == {"start_date": "2024-01-01"}
+    assert metrics["page_size"] == 50
+    assert metrics["budget_wait"] == 1.5
+    assert metrics["latency"] == 0.1
+    assert metrics["bytes"] == len(response.content)
+    assert metrics["status_code"] == 200
+
+
+def test_response_json_is_decoded_once_and_timed(make_response):
+    stream = metrics_stream({})
+    response = make_response({"data": {"orders": []}})
+
+    first = stream.get_response_json(response)
+
+    assert stream.get_response_json(response) is first
+    assert response.json_decode_time >= 0
+
+
+def test_metrics_are_written_once_records_are_counted(make_response, tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    stream = metrics_stream({"request_metrics_file": str(path)})
+    response = make_response({"data": {}, "extensions": {"cost": COST}})
+    request = requests.Request("POST", "https://shop.myshopify.com").prepare()
+    request.requested_nodes = 50
+    request.counts_records = True
+
+    stream.track_request(request, response, None, budget_wait=0.5, succeeded=True)
+    assert not path.exists() or not path.read_text()
+    stream.write_request_metrics(response, records=48)
+
+    metrics = json.loads(path.read_text())
+    assert metrics["stream"] == "orders"
+    assert metrics["page_size"] == 50
+    assert metrics["requested_cost"] == 502
+    assert metrics["actual_cost"] == 120
+    assert metrics["available_points"] == 1880
+    assert metrics["records"] == 48
+    assert metrics["json_decode_time"] is not None
+
+
+def test_failed_requests_are_written_immediately(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    stream = metrics_stream({"request_metrics_file": str(path)})
+    request = requests.Request("POST", "https://shop.myshopify.com").prepare()
+
+    stream.track_request(request, None, {"start_date": "2024-01-01"}, budget_wait=0, succeeded=False)
+
+    metrics = json.loads(path.read_text())
+    assert metrics["status_code"] is None
+    assert metrics["records"] == 0
+
+
+def test_requests_without_records_are_written_immediately(make_response, tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    stream = metrics_stream({"request_metrics_file": str(path)})
+    response = make_response({"data": {"locations": {}}, "extensions": {"cost": COST}})
+    request = requests.Request("POST", "https://shop.myshopify.com").prepare()
+
+    stream.track_request(request, response, None, budget_wait=0, succeeded=True)
+
+    metrics = json.loads(path.read_text())
+    assert metrics["status_code"] == 200
+    assert metrics["actual_cost"] == 120
+    assert metrics["records"] == 0
+
+
+def test_metrics_files_are_closed(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    writer = telemetry.get_metrics_writer(str(path))
+
+    telemetry.close_metrics_writers()
+
+    assert telemetry.get_metrics_writer(str(path)) is not writer
+    telemetry.close_metrics_writers()
+
+
+def test_metric_log_lines_are_emitted(make_response, monkeypatch):
+    stream = metrics_stream({"request_metrics": True})
+    logged = []
+    monkeypatch.setattr(
+        MetricsStream, "_write_metric_log", lambda self, metric, extra_tags: logged.append(metric)
+    )
+    response = make_response({"data": {}, "extensions": {"cost": COST}})
+    request = requests.Request("POST", "https://shop.myshopify.com").prepare()
+    request.counts_records = True
+
+    stream.track_request(request, response, None, budget_wait=0, succeeded=True)
+    stream.write_request_metrics(response, records=3)
+
+    assert logged[0]["metric"] == "shopify_request"
+    assert logged[0]["value"] == 0.1
+    assert logged[0]["tags"]["records"] == 3
+
+
+class LocationsRestStream(shopifyRestStream):
+    name = "locations"
+    path = "locations.json"
+    records_jsonpath = "$.locations[*]"
+    schema = {"properties": {"id": {"type": "integer"}}}
+
+
+def test_rest_metrics_time_the_json_decode(make_stream, tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    stream = make_stream(
+        LocationsRestStream,
+        lambda request: {"locations": [{"id": 1}, {"id": 2}]},
+        {"request_metrics_file": str(path)},
+    )
+
+    response = stream._request(stream.prepare_request(None, None), None)
+    records = list(stream.parse_response(response))
+
+    metrics = json.loads(path.read_text())
+    assert len(records) == 2
+    assert metrics["records"] == 2
+    assert metrics["json_decode_time"] is not None